@@ -0,0 +1,347 @@
+import time
+from datetime import datetime, timezone
+
+# Backups ficam em tabelas mensais (backups_pYYYYMM, mês UTC de end_time)
+# registradas em backup_partitions. A view "backups" une todas para as
+# consultas antigas; inserções, retenção e consultas recentes passam pelas
+# funções daqui, que só tocam as partições necessárias.
+
+PARTITION_PREFIX = 'backups_p'
+TEMPLATE_TABLE = 'backups_template'
+VIEW_NAME = 'backups'
+
+BACKUP_COLUMNS = (
+    'id', 'proxmox_host', 'company_name', 'vmid', 'vm_name', 'status',
+    'storage_target', 'start_time', 'end_time', 'total_size_bytes',
+    'written_size_bytes', 'duration_seconds', 'speed_mb_s',
+)
+
+_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        proxmox_host TEXT NOT NULL,
+        company_name TEXT,
+        vmid TEXT,
+        vm_name TEXT,
+        status TEXT NOT NULL,
+        storage_target TEXT,
+        start_time INTEGER NOT NULL,
+        end_time INTEGER NOT NULL,
+        total_size_bytes INTEGER,
+        written_size_bytes INTEGER,
+        duration_seconds INTEGER,
+        speed_mb_s REAL,
+        UNIQUE (proxmox_host, vmid, start_time, end_time)
+    )
+'''
+
+# id (rowid) entra implicitamente no fim de cada índice, então todos servem
+# ao ORDER BY end_time DESC, id DESC da paginação por keyset.
+_INDEX_DDL = (
+    'CREATE INDEX IF NOT EXISTS ix_{name}_company_end_status ON {name}(company_name, end_time, id, status)',
+    'CREATE INDEX IF NOT EXISTS ix_{name}_end ON {name}(end_time)',
+    'CREATE INDEX IF NOT EXISTS ix_{name}_company_status_end ON {name}(company_name, status, end_time)',
+    'CREATE INDEX IF NOT EXISTS ix_{name}_company_storage_end ON {name}(company_name, storage_target, end_time)',
+    'CREATE INDEX IF NOT EXISTS ix_{name}_vmid_end ON {name}(vmid, end_time)',
+    'CREATE INDEX IF NOT EXISTS ix_{name}_host_end ON {name}(proxmox_host, end_time)',
+    # NOCASE: o LIKE do prefixo de vm_name (sem distinção de maiúsculas) usa o índice
+    'CREATE INDEX IF NOT EXISTS ix_{name}_vmname_end ON {name}(vm_name COLLATE NOCASE, end_time)',
+)
+
+# índices substituídos por outros de _INDEX_DDL (removidos em upgrade_indexes)
+_OBSOLETE_INDEXES = ('ix_{name}_company_end',)
+
+
+def month_of(ts):
+    return datetime.fromtimestamp(int(ts or 0), tz=timezone.utc).strftime('%Y%m')
+
+
+def month_bounds(month):
+    """(início, fim exclusivo) do mês 'YYYYMM' em epoch UTC."""
+    y, m = int(month[:4]), int(month[4:6])
+    start = datetime(y, m, 1, tzinfo=timezone.utc)
+    end = datetime(y + (m == 12), m % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def partition_table(month):
+    if len(month) != 6 or not month.isdigit():
+        raise ValueError(f"invalid partition month: {month!r}")
+    return PARTITION_PREFIX + month
+
+
+def init_schema(cursor):
+    cursor.execute(_TABLE_DDL.format(name=TEMPLATE_TABLE))
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_partitions (
+            month       TEXT PRIMARY KEY,
+            table_name  TEXT NOT NULL,
+            start_ts    INTEGER NOT NULL,
+            end_ts      INTEGER NOT NULL,
+            created_at  INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS backup_seq (next_id INTEGER NOT NULL)')
+    if cursor.execute('SELECT 1 FROM backup_seq').fetchone() is None:
+        cursor.execute('INSERT INTO backup_seq (next_id) VALUES (1)')
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (VIEW_NAME,)).fetchone() is None:
+        rebuild_view(cursor)
+
+
+def upgrade_indexes(cursor):
+    """Aplica o conjunto atual de índices às partições existentes
+    (chamado pelas migrações quando _INDEX_DDL muda)."""
+    for part in list_partitions(cursor):
+        for ddl in _INDEX_DDL:
+            cursor.execute(ddl.format(name=part['table_name']))
+        for name in _OBSOLETE_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name.format(name=part['table_name'])}")
+
+
+def has_legacy_table(cursor):
+    """True se "backups" ainda for a tabela única das versões antigas."""
+    row = cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (VIEW_NAME,)).fetchone()
+    return bool(row) and row[0] == 'table'
+
+
+def rebuild_view(cursor):
+    parts = [r[0] for r in cursor.execute(
+        'SELECT table_name FROM backup_partitions ORDER BY month').fetchall()]
+    cols = ', '.join(BACKUP_COLUMNS)
+    selects = [f'SELECT {cols} FROM {TEMPLATE_TABLE}'] + [f'SELECT {cols} FROM {t}' for t in parts]
+    cursor.execute(f'DROP VIEW IF EXISTS {VIEW_NAME}')
+    cursor.execute(f'CREATE VIEW {VIEW_NAME} AS ' + ' UNION ALL '.join(selects))
+
+
+def ensure_partition(cursor, month):
+    table = partition_table(month)
+    if cursor.execute('SELECT 1 FROM backup_partitions WHERE month = ?', (month,)).fetchone():
+        return table
+    cursor.execute(_TABLE_DDL.format(name=table))
+    for ddl in _INDEX_DDL:
+        cursor.execute(ddl.format(name=table))
+    start_ts, end_ts = month_bounds(month)
+    cursor.execute('''
+        INSERT INTO backup_partitions (month, table_name, start_ts, end_ts, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (month, table, start_ts, end_ts, int(time.time())))
+    rebuild_view(cursor)
+    return table
+
+
+def list_partitions(cursor, since=None, until=None, newest_first=True):
+    """Partições cujo intervalo de end_time cruza [since, until]."""
+    sql = 'SELECT month, table_name, start_ts, end_ts, created_at FROM backup_partitions WHERE 1=1'
+    params = []
+    if since is not None:
+        sql += ' AND end_ts > ?'
+        params.append(int(since))
+    if until is not None:
+        sql += ' AND start_ts <= ?'
+        params.append(int(until))
+    sql += ' ORDER BY month ' + ('DESC' if newest_first else 'ASC')
+    return [dict(zip(('month', 'table_name', 'start_ts', 'end_ts', 'created_at'), r))
+            for r in cursor.execute(sql, params).fetchall()]
+
+
+def union_source(cursor, since=None, until=None, columns=BACKUP_COLUMNS):
+    """Subquery "(SELECT ... UNION ALL ...)" só com as partições do intervalo."""
+    cols = ', '.join(columns)
+    parts = [p['table_name'] for p in list_partitions(cursor, since, until, newest_first=False)]
+    selects = [f'SELECT {cols} FROM {TEMPLATE_TABLE}'] + [f'SELECT {cols} FROM {t}' for t in parts]
+    return '(' + ' UNION ALL '.join(selects) + ')'
+
+
+def next_id(cursor):
+    cursor.execute('UPDATE backup_seq SET next_id = next_id + 1')
+    return cursor.execute('SELECT next_id - 1 FROM backup_seq').fetchone()[0]
+
+
+def insert_backup(cursor, row):
+    """Insere (OR IGNORE) na partição do mês de end_time; devolve rowcount."""
+    table = ensure_partition(cursor, month_of(row['end_time']))
+    # empresa sem nome é '' (nunca NULL): o filtro vira igualdade no índice
+    values = dict(row, id=next_id(cursor), company_name=row.get('company_name') or '')
+    cols = [c for c in BACKUP_COLUMNS if c in values]
+    cursor.execute(
+        f'INSERT OR IGNORE INTO {table} ({", ".join(cols)}) '
+        f'VALUES ({", ".join("?" for _ in cols)})',
+        [values[c] for c in cols])
+    inserted = cursor.rowcount
+    if inserted:
+        cursor.execute('INSERT OR IGNORE INTO backup_companies (company_name) VALUES (?)',
+                       (values['company_name'],))
+    return inserted
+
+
+def init_company_catalog(cursor):
+    """Catálogo das empresas com backups: "SELECT DISTINCT company_name" na
+    view passaria por todas as partições. NULL é guardado como ''."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_companies (
+            company_name TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    for part in list_partitions(cursor):
+        cursor.execute(
+            f"INSERT OR IGNORE INTO backup_companies (company_name) "
+            f"SELECT DISTINCT COALESCE(company_name, '') FROM {part['table_name']}")
+
+
+def list_companies(cursor):
+    return [r[0] for r in cursor.execute(
+        'SELECT company_name FROM backup_companies ORDER BY company_name').fetchall()]
+
+
+def prune_companies(cursor):
+    """Tira do catálogo as empresas sem nenhuma linha nas partições que
+    restaram (depois de DROP/DELETE)."""
+    conds = [f'NOT EXISTS (SELECT 1 FROM {p["table_name"]} WHERE company_name = c.company_name)'
+             for p in list_partitions(cursor)]
+    cursor.execute('DELETE FROM backup_companies AS c WHERE ' + (' AND '.join(conds) or '1'))
+    return cursor.rowcount
+
+
+def normalize_null_companies(cursor):
+    """company_name NULL -> '' em todas as partições (bancos anteriores ao
+    insert_backup que já grava '')."""
+    for part in list_partitions(cursor):
+        cursor.execute(
+            f"UPDATE {part['table_name']} SET company_name = '' WHERE company_name IS NULL")
+
+
+def query_newest(cursor, where, params, limit, columns='*', since=None, until=None, offset=0):
+    """Linhas mais recentes (ORDER BY end_time DESC) percorrendo as
+    partições da mais nova para a mais antiga até completar `limit`.
+
+    Com offset, as partições que ficam inteiras antes da página são
+    puladas por COUNT(*) no índice, sem ler as linhas."""
+    out = []
+    for part in list_partitions(cursor, since=since, until=until):
+        remaining = limit - len(out)
+        if remaining <= 0:
+            break
+        if offset:
+            n = cursor.execute(
+                f'SELECT COUNT(*) FROM {part["table_name"]} WHERE {where}', list(params)
+            ).fetchone()[0]
+            if n <= offset:
+                offset -= n
+                continue
+        out.extend(cursor.execute(
+            f'SELECT {columns} FROM {part["table_name"]} WHERE {where} '
+            f'ORDER BY end_time DESC, id DESC LIMIT ? OFFSET ?',
+            list(params) + [remaining, offset]).fetchall())
+        offset = 0
+    return out
+
+
+def count(cursor, where, params, since=None, until=None):
+    """COUNT(*) somado só sobre as partições do intervalo."""
+    total = 0
+    for part in list_partitions(cursor, since, until):
+        total += cursor.execute(
+            f'SELECT COUNT(*) FROM {part["table_name"]} WHERE {where}', list(params)
+        ).fetchone()[0]
+    return total
+
+
+def iter_chunks(cursor, where, params, since=None, until=None, chunk_size=1000,
+                columns=BACKUP_COLUMNS):
+    """Listas de até chunk_size linhas em ordem crescente de (end_time, id),
+    uma partição por vez; a memória não cresce com o tamanho do resultado."""
+    cols = ', '.join(columns)
+    for part in list_partitions(cursor, since, until, newest_first=False):
+        cur = cursor.connection.execute(
+            f'SELECT {cols} FROM {part["table_name"]} WHERE {where} '
+            f'ORDER BY end_time, id', list(params))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def drop_partition(cursor, month):
+    """Remove a partição inteira (DROP TABLE, sem DELETE linha a linha)."""
+    rows = _drop_partition(cursor, month)
+    prune_companies(cursor)
+    return rows
+
+
+def _drop_partition(cursor, month):
+    table = partition_table(month)
+    if not cursor.execute('SELECT 1 FROM backup_partitions WHERE month = ?', (month,)).fetchone():
+        return 0
+    rows = cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    cursor.execute('DELETE FROM backup_partitions WHERE month = ?', (month,))
+    rebuild_view(cursor)
+    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    return rows
+
+
+def delete_range(cursor, start_ts, end_ts):
+    """Apaga backups com end_time em [start_ts, end_ts]. Partições cobertas
+    por inteiro são descartadas; só as das pontas sofrem DELETE."""
+    deleted = 0
+    for part in list_partitions(cursor, since=start_ts, until=end_ts):
+        if start_ts <= part['start_ts'] and part['end_ts'] - 1 <= end_ts:
+            deleted += _drop_partition(cursor, part['month'])
+        else:
+            cursor.execute(
+                f'DELETE FROM {part["table_name"]} WHERE end_time >= ? AND end_time <= ?',
+                (start_ts, end_ts))
+            deleted += cursor.rowcount
+    if deleted:
+        prune_companies(cursor)
+    return deleted
+
+
+def drop_older_than(cursor, cutoff_ts):
+    """Retenção por idade: descarta partições cujo mês acabou antes de cutoff_ts."""
+    dropped = []
+    for part in list_partitions(cursor, newest_first=False):
+        if part['end_ts'] <= cutoff_ts:
+            _drop_partition(cursor, part['month'])
+            dropped.append(part['month'])
+    if dropped:
+        prune_companies(cursor)
+    return dropped
+
+
+def partition_stats(cursor):
+    out = []
+    for part in list_partitions(cursor):
+        r = cursor.execute(
+            f'SELECT COUNT(*), MIN(end_time), MAX(end_time) FROM {part["table_name"]}'
+        ).fetchone()
+        out.append(dict(part, rows=r[0], min_end_time=r[1], max_end_time=r[2]))
+    return out
+
+
+def migrate_legacy_table(cursor):
+    """Converte a tabela única "backups" antiga nas partições mensais,
+    preservando os ids. Não faz nada se "backups" já for a view."""
+    if not has_legacy_table(cursor):
+        return 0
+    legacy = 'backups_legacy'
+    cursor.execute(f'ALTER TABLE {VIEW_NAME} RENAME TO {legacy}')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS ix_{legacy}_end ON {legacy}(end_time)')
+    cols = ', '.join(BACKUP_COLUMNS)
+    moved = 0
+    months = [r[0] for r in cursor.execute(
+        f"SELECT DISTINCT strftime('%Y%m', end_time, 'unixepoch') FROM {legacy}").fetchall()]
+    for month in months:
+        if not month:
+            continue
+        table = ensure_partition(cursor, month)
+        start_ts, end_ts = month_bounds(month)
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {table} ({cols}) SELECT {cols} FROM {legacy} '
+            f'WHERE end_time >= ? AND end_time < ?', (start_ts, end_ts))
+        moved += cursor.rowcount
+    max_id = cursor.execute(f'SELECT MAX(id) FROM {legacy}').fetchone()[0] or 0
+    cursor.execute('UPDATE backup_seq SET next_id = MAX(next_id, ?)', (max_id + 1,))
+    cursor.execute(f'DROP TABLE {legacy}')
+    rebuild_view(cursor)
+    return moved
@@ -1,4 +1,5 @@
 import functools
+import threading
 import time
 from flask import request, make_response, jsonify
 
@@ -22,4 +23,23 @@ def cache_with_timeout(timeout_seconds):
             return result
         return wrapper
     return decorator
-    
\ No newline at end of file
+    
+_value_cache = {}
+_value_cache_lock = threading.Lock()
+
+def cached_value(key, timeout_seconds, compute):
+    """Devolve (valor, em_cache) guardando compute() por timeout_seconds.
+    Usado para totais caros (COUNT) que podem ficar levemente defasados."""
+    now = time.time()
+    with _value_cache_lock:
+        hit = _value_cache.get(key)
+        if hit and now - hit[0] < timeout_seconds:
+            return hit[1], True
+    value = compute()
+    with _value_cache_lock:
+        _value_cache[key] = (now, value)
+        if len(_value_cache) > 1024:
+            for k, (t, _) in list(_value_cache.items()):
+                if now - t >= timeout_seconds:
+                    del _value_cache[k]
+    return value, False
@@ -0,0 +1,3 @@
+"""Coletor unificado (backup, replicação e saúde) para hosts Proxmox."""
+
+__version__ = "2.0"
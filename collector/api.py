@@ -0,0 +1,83 @@
+import http.client
+import json
+import logging
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+log = logging.getLogger('collector.http')
+
+
+class ApiSession:
+    """Conexão HTTP(S) keep-alive única com o servidor do monitor.
+
+    Todas as fontes e o uploader do spool compartilham a mesma instância;
+    o lock serializa as requisições na conexão.
+    """
+
+    def __init__(self, base_url, token='', user_agent='proxmox-collector', timeout=60):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.token = token
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def host_key(self):
+        return f"{self.host}:{self.port or ''}"
+
+    def _connect(self):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout,
+                context=ssl.create_default_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Envia a requisição; devolve (status, corpo_bytes).
+
+        Status 0 indica falha de rede. Uma conexão reaproveitada que o
+        servidor já fechou é reaberta uma vez antes de desistir.
+        """
+        hdrs = {'User-Agent': self.user_agent, 'Connection': 'keep-alive'}
+        if self.token:
+            hdrs['Authorization'] = f"Bearer {self.token}"
+        hdrs.update(headers or {})
+
+        with self._lock:
+            for attempt in (1, 2):
+                reused = self._conn is not None
+                if self._conn is None:
+                    self._conn = self._connect()
+                try:
+                    self._conn.request(method, self.base_path + path, body=body, headers=hdrs)
+                    resp = self._conn.getresponse()
+                    data = resp.read()
+                    if resp.will_close:
+                        self._conn.close()
+                        self._conn = None
+                    return resp.status, data
+                except (OSError, http.client.HTTPException) as e:
+                    self._conn.close()
+                    self._conn = None
+                    if reused and attempt == 1:
+                        continue
+                    log.warning("%s %s falhou: %s", method, path, e)
+                    return 0, b''
+        return 0, b''
+
+    def post_json(self, path, payload, headers=None):
+        hdrs = {'Content-Type': 'application/json'}
+        hdrs.update(headers or {})
+        return self.request('POST', path, json.dumps(payload).encode('utf-8'), hdrs)
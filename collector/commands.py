@@ -0,0 +1,55 @@
+import json
+import logging
+import shutil
+import subprocess
+
+log = logging.getLogger('collector.commands')
+
+
+class CommandRunner:
+    """Executa os comandos externos (pvesh, pvesr, zpool, smartctl).
+
+    Os caminhos vêm da seção [commands]; apontá-los para executáveis
+    substitutos é o jeito de testar as fontes fora de um host Proxmox.
+    """
+
+    def __init__(self, paths, timeout=120):
+        self.paths = dict(paths)
+        self.timeout = timeout
+
+    def available(self, name):
+        return shutil.which(self.paths.get(name, name)) is not None
+
+    def run(self, name, *args, any_exit=False):
+        """Devolve o stdout (str) ou None se o comando falhar.
+
+        any_exit=True aceita códigos de saída != 0 (smartctl usa o código
+        como bitmask de avisos).
+        """
+        exe = self.paths.get(name, name)
+        try:
+            proc = subprocess.run(
+                [exe] + [str(a) for a in args],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.timeout,
+                check=False,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log.warning("%s %s falhou: %s", name, ' '.join(map(str, args)), e)
+            return None
+        if proc.returncode != 0 and not any_exit:
+            log.debug("%s %s saiu com %s: %s", name, ' '.join(map(str, args)),
+                      proc.returncode, proc.stderr.decode('utf-8', 'replace').strip())
+            return None
+        return proc.stdout.decode('utf-8', 'replace')
+
+    def run_json(self, name, *args, any_exit=False):
+        out = self.run(name, *args, any_exit=any_exit)
+        if out is None:
+            return None
+        try:
+            return json.loads(out)
+        except ValueError:
+            log.warning("%s %s: saída não é JSON", name, ' '.join(map(str, args)))
+            return None
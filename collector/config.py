@@ -0,0 +1,76 @@
+import configparser
+import os
+import socket
+
+CONFIG_FILE = os.getenv('COLLECTOR_CFG', '/etc/proxmox-monitor/collector.ini')
+
+DEFAULTS = {
+    'collector': {
+        'company_name': '',
+        'proxmox_host': '',
+        'api_url': 'http://127.0.0.1:5000',
+        'api_token': '',
+        'state_dir': '/var/lib/proxmox-monitor',
+        'spool_dir': '/var/spool/proxmox-monitor',
+        'cache_dir': '/var/cache/proxmox-monitor',
+        'user_agent': 'proxmox-collector',
+        'heartbeat_interval': '300',
+    },
+    'upload': {
+        'interval': '30',
+        'batch_lines': '500',
+        'max_batches_per_run': '20',
+        'min_interval': '30',
+        'backoff_base': '30',
+        'backoff_max': '3600',
+        'max_spool_bytes': str(100 * 1024 * 1024),
+        'timeout': '60',
+    },
+    'inventory': {
+        'ttl': '600',
+        'config_jobs': '4',
+    },
+    'source:backup': {
+        'enabled': 'true',
+        'log_dir': '/var/log/pve/tasks',
+        'interval': '300',
+        'watch': 'true',
+        'max_age_days': '0',
+    },
+    'source:replication': {
+        'enabled': 'true',
+        'interval': '300',
+    },
+    'source:health': {
+        'enabled': 'true',
+        'interval': '120',
+        'smart': 'true',
+    },
+    'commands': {
+        'pvesh': 'pvesh',
+        'pvesr': 'pvesr',
+        'zpool': 'zpool',
+        'smartctl': 'smartctl',
+    },
+}
+
+
+def load_config(path=None):
+    """Lê o arquivo de configuração do coletor sobre os DEFAULTS.
+
+    Variáveis COLLECTOR_API_URL / COLLECTOR_API_TOKEN / MONITOR_API_TOKEN
+    sobrescrevem o arquivo (útil em systemd e testes).
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict(DEFAULTS)
+    config.read(path or CONFIG_FILE)
+
+    col = config['collector']
+    if os.getenv('COLLECTOR_API_URL'):
+        col['api_url'] = os.environ['COLLECTOR_API_URL']
+    token = os.getenv('COLLECTOR_API_TOKEN') or os.getenv('MONITOR_API_TOKEN')
+    if token:
+        col['api_token'] = token
+    if not col.get('proxmox_host', '').strip():
+        col['proxmox_host'] = socket.gethostname().split('.')[0]
+    return config
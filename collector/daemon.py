@@ -0,0 +1,239 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import signal
+import time
+
+from . import __version__
+from .api import ApiSession
+from .commands import CommandRunner
+from .config import load_config
+from .inventory import Inventory
+from .sources import SOURCES, BackupLogSource
+from .spool import Spool
+from .watch import DirWatcher
+
+log = logging.getLogger('collector')
+
+
+class _Stop(Exception):
+    pass
+
+
+class Context:
+    """Estado compartilhado entre as fontes: config, sessão HTTP, spool,
+    inventário e executor de comandos."""
+
+    def __init__(self, config):
+        col = config['collector']
+        up = config['upload']
+        self.config = config
+        self.company_name = col.get('company_name', '').strip()
+        self.proxmox_host = col.get('proxmox_host', '').strip()
+        self.state_dir = col.get('state_dir')
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        self.commands = CommandRunner(config['commands'])
+        self.session = ApiSession(
+            col.get('api_url'),
+            token=col.get('api_token', '').strip(),
+            user_agent=f"{col.get('user_agent')}/{__version__}",
+            timeout=up.getint('timeout', 60),
+        )
+        self.spool = Spool(
+            col.get('spool_dir'), self.session,
+            batch_lines=up.getint('batch_lines', 500),
+            max_batches_per_run=up.getint('max_batches_per_run', 20),
+            min_interval=up.getint('min_interval', 30),
+            backoff_base=up.getint('backoff_base', 30),
+            backoff_max=up.getint('backoff_max', 3600),
+            max_bytes=up.getint('max_spool_bytes', 100 * 1024 * 1024),
+        )
+        inv = config['inventory']
+        self.inventory = Inventory(
+            self.commands, col.get('cache_dir'),
+            ttl=inv.getint('ttl', 600),
+            config_jobs=inv.getint('config_jobs', 4),
+        )
+
+    def sync_inventory(self):
+        self.inventory.load()
+        self.inventory.publish(self.session, self.company_name, self.proxmox_host)
+
+
+def build_sources(ctx):
+    sources = []
+    for name, cls in SOURCES.items():
+        section_name = f'source:{name}'
+        if section_name not in ctx.config:
+            continue
+        section = ctx.config[section_name]
+        if not section.getboolean('enabled', True):
+            continue
+        sources.append(cls(ctx, section))
+    return sources
+
+
+class Scheduler:
+    """Fila de prioridade por horário de execução; cada tick só roda o
+    que venceu."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def add(self, when, name, func, interval):
+        heapq.heappush(self._heap, (when, next(self._seq), name, func, interval))
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def reschedule(self, name, when):
+        """Antecipa um job (usado para enviar o spool logo após um evento)."""
+        for i, (due, seq, n, func, interval) in enumerate(self._heap):
+            if n == name and when < due:
+                self._heap[i] = (when, seq, n, func, interval)
+                heapq.heapify(self._heap)
+                return
+
+    def run_due(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            _due, _seq, name, func, interval = heapq.heappop(self._heap)
+            try:
+                func()
+            except Exception:
+                log.exception("job %s falhou", name)
+            self.add(time.time() + interval, name, func, interval)
+
+
+def run(ctx, once=False):
+    sources = build_sources(ctx)
+    if not sources:
+        log.error("nenhuma fonte habilitada")
+        return 1
+
+    ctx.sync_inventory()
+
+    def enqueue(records):
+        if records:
+            ctx.spool.append(records)
+            log.info("%d registro(s) no spool", len(records))
+
+    def upload():
+        ctx.spool.flush()
+
+    health = next((s for s in sources if s.name == 'health'), None)
+
+    def heartbeat():
+        status, body = ctx.session.post_json('/api/heartbeat', {
+            'proxmox_host': ctx.proxmox_host,
+            'company_name': ctx.company_name,
+            'health_hash': health.last_hash if health else None,
+        })
+        if not 200 <= status < 300:
+            log.warning("heartbeat falhou (HTTP %s)", status)
+            return
+        try:
+            resend = json.loads(body or b'{}').get('resend_health')
+        except ValueError:
+            resend = False
+        if resend and health:
+            log.info("servidor pediu o snapshot de saúde completo")
+            health.force()
+            health.collect()
+
+    if once:
+        for src in sources:
+            enqueue(src.collect())
+        upload()
+        heartbeat()
+        return 0
+
+    sched = Scheduler()
+    now = time.time()
+    for src in sources:
+        sched.add(now, src.name, (lambda s=src: enqueue(s.collect())), src.interval)
+    upload_interval = ctx.config['upload'].getint('interval', 30)
+    sched.add(now + 1, 'upload', upload, upload_interval)
+    sched.add(now + ctx.inventory.ttl, 'inventory', ctx.sync_inventory, ctx.inventory.ttl)
+    hb_interval = ctx.config['collector'].getint('heartbeat_interval', 300)
+    sched.add(now + 2, 'heartbeat', heartbeat, hb_interval)
+
+    watcher = DirWatcher()
+    watched = {}
+    for src in sources:
+        for d in src.watch_dirs():
+            watcher.add_tree(d)
+            watched[d] = src
+    if watched and watcher.fileno() is not None:
+        log.info("observando %s via inotify", ', '.join(watched))
+
+    # Sinal durante a espera interrompe na hora; durante um job, só marca
+    # a parada para não cortar uma escrita no spool pela metade.
+    state = {'stop': False, 'waiting': False}
+
+    def on_signal(*_):
+        state['stop'] = True
+        if state['waiting']:
+            raise _Stop()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    while not state['stop']:
+        sched.run_due(time.time())
+        timeout = max(0.0, (sched.next_due() or time.time() + 60) - time.time())
+        state['waiting'] = True
+        try:
+            if watcher.fileno() is None:
+                time.sleep(timeout)
+                continue
+            ready = watcher.wait(timeout)
+        except _Stop:
+            break
+        finally:
+            state['waiting'] = False
+        if not ready:
+            continue
+        changed = watcher.read_events()
+        got = 0
+        for root, src in watched.items():
+            mine = [p for p in changed if p.startswith(root.rstrip('/') + '/')]
+            if mine:
+                records = src.on_change(mine)
+                enqueue(records)
+                got += len(records)
+        if got:
+            # envia assim que o limite de taxa/backoff permitir
+            sched.reschedule('upload', ctx.spool.next_upload_at())
+
+    log.info("encerrando")
+    watcher.close()
+    ctx.session.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Coletor do Proxmox Monitor')
+    parser.add_argument('-c', '--config', help='arquivo de configuração (padrão: $COLLECTOR_CFG)')
+    parser.add_argument('--once', action='store_true', help='coleta tudo uma vez, envia e sai')
+    parser.add_argument('--rescan', action='store_true', help='reprocessa todos os logs de backup')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format='[%(name)s] %(levelname)s %(message)s',
+    )
+
+    config = load_config(args.config)
+    ctx = Context(config)
+    if args.rescan:
+        state = os.path.join(ctx.state_dir, BackupLogSource.STATE_FILE)
+        if os.path.exists(state):
+            os.unlink(state)
+    log.info("Empresa: %s | Host: %s", ctx.company_name, ctx.proxmox_host)
+    return run(ctx, once=args.once)
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('collector.inventory')
+
+
+class Inventory:
+    """Cache de VMs/CTs (vmid -> node, type, tags, name) compartilhado
+    pelas fontes.
+
+    O snapshot em disco tem o mesmo formato TSV de scripts/inventory-lib.sh.
+    Um snapshot vencido continua valendo enquanto o refresh roda numa
+    thread; as configs das VMs sem tags são buscadas em lote, uma vez por
+    refresh.
+    """
+
+    def __init__(self, commands, cache_dir, ttl=600, config_jobs=4):
+        self.commands = commands
+        self.path = os.path.join(cache_dir, 'inventory.tsv')
+        self.ttl = ttl
+        self.config_jobs = config_jobs
+        self.items = {}
+        self.hash = None
+        self.published_hash = None
+        self._loaded_mtime = None
+        self._refreshing = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---- snapshot ----
+    def _fetch(self):
+        resources = self.commands.run_json('pvesh', 'get', '/cluster/resources',
+                                           '--output-format', 'json')
+        if not isinstance(resources, list):
+            return None
+        rows = []
+        for r in resources:
+            if not isinstance(r, dict) or r.get('type') not in ('qemu', 'lxc'):
+                continue
+            rows.append([str(r.get('vmid', '')), str(r.get('node') or ''),
+                         r['type'], str(r.get('tags') or ''), str(r.get('name') or '')])
+
+        missing = [row for row in rows if row[3] in ('', 'n/a', 'null')]
+        if missing:
+            def fetch_tags(row):
+                cfg = self.commands.run_json(
+                    'pvesh', 'get', f"/nodes/{row[1]}/{row[2]}/{row[0]}/config",
+                    '--output-format', 'json')
+                return (cfg or {}).get('tags') if isinstance(cfg, dict) else None
+
+            with ThreadPoolExecutor(max_workers=max(1, self.config_jobs)) as pool:
+                for row, tags in zip(missing, pool.map(fetch_tags, missing)):
+                    if tags:
+                        row[3] = str(tags)
+        return rows
+
+    def refresh(self):
+        with self._refreshing:
+            rows = self._fetch()
+            if rows is None:
+                log.warning("pvesh falhou; mantendo snapshot anterior")
+                return False
+            tmp = f"{self.path}.tmp.{os.getpid()}"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write('\t'.join(re.sub(r'[\t\n]', ' ', v) for v in row) + '\n')
+            os.rename(tmp, self.path)
+        self.load(refresh=False)
+        return True
+
+    def load(self, refresh=True):
+        """Carrega o snapshot em memória (só se mudou no disco)."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+
+        if mtime is None:
+            if refresh:
+                self.refresh()
+            return
+        if refresh and time.time() - mtime > self.ttl and not self._refreshing.locked():
+            threading.Thread(target=self.refresh, name='inventory-refresh', daemon=True).start()
+        if mtime == self._loaded_mtime:
+            return
+
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        items = {}
+        for line in raw.decode('utf-8', 'replace').splitlines():
+            cols = (line.split('\t') + [''] * 5)[:5]
+            if not cols[0]:
+                continue
+            tags = '' if cols[3] in ('n/a', 'null') else cols[3]
+            items[cols[0]] = {'node': cols[1], 'type': cols[2], 'tags': tags, 'name': cols[4]}
+        self.items = items
+        self.hash = hashlib.sha256(raw).hexdigest()
+        self._loaded_mtime = mtime
+
+    # ---- consultas ----
+    def name(self, vmid):
+        return (self.items.get(str(vmid)) or {}).get('name', '')
+
+    def display_name(self, vmid):
+        it = self.items.get(str(vmid)) or {}
+        return it.get('tags') or it.get('name') or ''
+
+    @property
+    def published(self):
+        return self.hash is not None and self.hash == self.published_hash
+
+    # ---- publicação ----
+    def publish(self, session, company_name, proxmox_host):
+        """Envia o inventário ao servidor quando o hash muda."""
+        if self.hash is None or self.published:
+            return self.published
+        payload = {
+            'proxmox_host': proxmox_host,
+            'company_name': company_name,
+            'hash': self.hash,
+            'items': [dict(vmid=vmid, **it) for vmid, it in self.items.items()],
+        }
+        status, _ = session.post_json('/api/inventory', payload)
+        if 200 <= status < 300:
+            self.published_hash = self.hash
+        else:
+            log.warning("publicação do inventário falhou (HTTP %s)", status)
+        return self.published
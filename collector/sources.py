@@ -0,0 +1,460 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+log = logging.getLogger('collector.sources')
+
+SOURCES = {}
+
+
+def register(cls):
+    SOURCES[cls.name] = cls
+    return cls
+
+
+class Source:
+    """Fonte de dados do coletor.
+
+    collect() é chamado pelo agendador a cada `interval` segundos e devolve
+    a lista de registros a enfileirar no spool. Fontes com watch_dirs()
+    também recebem on_change(paths) quando o inotify vê arquivos novos.
+    """
+    name = None
+
+    def __init__(self, ctx, section):
+        self.ctx = ctx
+        self.section = section
+        self.interval = section.getint('interval', 300)
+
+    def collect(self):
+        return []
+
+    def watch_dirs(self):
+        return []
+
+    def on_change(self, paths):
+        return []
+
+
+# ----------------------- helpers de parsing -----------------------
+_UNITS = {
+    'B': 1, 'BYTES': 1,
+    'KIB': 1024, 'MIB': 1024 ** 2, 'GIB': 1024 ** 3, 'TIB': 1024 ** 4, 'PIB': 1024 ** 5,
+    'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'TB': 1000 ** 4, 'PB': 1000 ** 5,
+    'K': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3, 'T': 1000 ** 4, 'P': 1000 ** 5,
+}
+
+
+def to_bytes(num, unit):
+    try:
+        n = float(str(num).replace(',', '.'))
+    except ValueError:
+        return 0
+    return int(round(n * _UNITS.get((unit or '').upper(), 1)))
+
+
+def hms_to_seconds(hms):
+    parts = [int(p) for p in hms.split(':')]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    h, m, s = parts[-3:]
+    return h * 3600 + m * 60 + s
+
+
+def parse_local_datetime(text, formats=('%Y-%m-%d %H:%M:%S', '%a %b %d %H:%M:%S %Y')):
+    text = (text or '').strip()
+    for fmt in formats:
+        try:
+            return int(time.mktime(datetime.strptime(text, fmt).timetuple()))
+        except ValueError:
+            continue
+    return None
+
+
+# ----------------------- BACKUP (logs do vzdump) -----------------------
+_START_RE = re.compile(r'^INFO: Starting Backup of (VM|CT) ([0-9]+)')
+_STATUS_ERR_RE = re.compile(
+    r'(^| )TASK ERROR|^ERROR: Backup of (VM|CT) [0-9]+ failed|backup write data failed'
+    r'|protocol canceled|^ERROR:', re.M)
+_TRANSFERRED_RE = re.compile(r'transferred\s+([0-9.]+)\s+(KiB|MiB|GiB|TiB|KB|MB|GB|TB|Bytes)')
+_ARCHIVE_RE = re.compile(r'archive file size:\s*([0-9.]+)([KMGTP]i?B|[KMGTP]B)')
+_HAD_TO_BACKUP_RE = re.compile(r'had to backup\s+([0-9.]+)\s+([KMGTP]i?B|[KMGTP]B)')
+_HAD_TO_BACKUP_TOTAL_RE = re.compile(
+    r'had to backup [0-9.]+ (?:[KMGT]i?B|[KMGT]B) of ([0-9.]+) ([KMGT]i?B|[KMGT]B)')
+_INCLUDE_DISK_SIZE_RE = re.compile(r'^([0-9.]+)(KiB|MiB|GiB|TiB|KB|MB|GB|TB|K|M|G|T)$')
+_STORAGE_RE = re.compile(r'--storage\s+(\S+)')
+
+
+def block_for_vmid(content, vmid):
+    """Recorta do log do vzdump o trecho de uma VM (Starting ... Finished/failed)."""
+    end_re = re.compile(rf'^(INFO: Finished Backup of (VM|CT) {vmid}\b|ERROR: Backup of (VM|CT) {vmid} failed)')
+    out = []
+    inside = False
+    for line in content.splitlines():
+        m = _START_RE.match(line)
+        if m:
+            if inside and m.group(2) != vmid:
+                break
+            if m.group(2) == vmid:
+                inside = True
+                out.append(line)
+                continue
+        if inside:
+            out.append(line)
+            if end_re.match(line):
+                break
+    return '\n'.join(out)
+
+
+def extract_times(block):
+    start = end = None
+    for line in block.splitlines():
+        if line.startswith('INFO: Backup started at '):
+            start = parse_local_datetime(line[len('INFO: Backup started at '):])
+        elif line.startswith('INFO: Backup finished at '):
+            end = parse_local_datetime(line[len('INFO: Backup finished at '):])
+        elif line.startswith('INFO: Failed at '):
+            end = parse_local_datetime(line[len('INFO: Failed at '):])
+
+    if end is None and start:
+        m = re.search(r'^INFO: Finished Backup of (VM|CT) .*?\((([0-9]+:)?[0-9]{1,2}:[0-9]{2})\)', block, re.M)
+        if m:
+            end = start + hms_to_seconds(m.group(2))
+
+    start = start or 0
+    end = end if end is not None else start
+    return start, max(start, end)
+
+
+def extract_written_bytes(block):
+    m = _TRANSFERRED_RE.findall(block)
+    if m:
+        return to_bytes(*m[-1])
+    m = _ARCHIVE_RE.findall(block)
+    if m:
+        return to_bytes(*m[-1])
+    m = _HAD_TO_BACKUP_RE.search(block)
+    if m:
+        return to_bytes(m.group(1), m.group(2))
+    return 0
+
+
+def extract_total_bytes(block):
+    lines = [ln for ln in block.splitlines() if ' include disk' in ln]
+    if lines:
+        m = _INCLUDE_DISK_SIZE_RE.match(lines[-1].split()[-1])
+        if m:
+            return to_bytes(m.group(1), m.group(2))
+    m = _HAD_TO_BACKUP_TOTAL_RE.search(block)
+    if m:
+        return to_bytes(m.group(1), m.group(2))
+    return 0
+
+
+def extract_status(block):
+    return 'ERROR' if _STATUS_ERR_RE.search(block) else 'SUCCESS'
+
+
+def extract_storage(content):
+    m = _STORAGE_RE.findall(content)
+    return m[-1] if m else 'UNKNOWN'
+
+
+def extract_vm_name(block):
+    for prefix in ('INFO: VM Name:', 'INFO: CT Name:'):
+        names = [ln[len(prefix):].strip() for ln in block.splitlines() if ln.startswith(prefix)]
+        if names and names[-1]:
+            return names[-1]
+    return ''
+
+
+def _task_finished(content):
+    tail = content.rstrip().rsplit('\n', 1)[-1]
+    return tail.startswith('TASK OK') or 'TASK ERROR' in tail or 'TASK WARNINGS' in tail
+
+
+@register
+class BackupLogSource(Source):
+    """Registros de backup a partir dos logs de tarefa do vzdump."""
+    name = 'backup'
+    STATE_FILE = 'backup_last_timestamp.state'
+
+    def __init__(self, ctx, section):
+        super().__init__(ctx, section)
+        self.log_dir = section.get('log_dir', '/var/log/pve/tasks')
+        self.watch = section.getboolean('watch', True)
+        self.max_age_days = section.getint('max_age_days', 0)
+        self.state_file = os.path.join(ctx.state_dir, self.STATE_FILE)
+        self.last_ts = self._read_state()
+
+    def _read_state(self):
+        try:
+            with open(self.state_file) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_state(self):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(f"{self.last_ts}\n")
+        os.rename(tmp, self.state_file)
+
+    @staticmethod
+    def is_backup_log(path):
+        base = os.path.basename(path)
+        return 'vzdump' in base or 'backup' in base
+
+    def _candidates(self):
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else 0
+        for root, _dirs, files in os.walk(self.log_dir):
+            for fname in files:
+                if not self.is_backup_log(fname):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    mtime = int(os.path.getmtime(path))
+                except OSError:
+                    continue
+                if mtime > self.last_ts and mtime >= cutoff:
+                    yield mtime, path
+
+    def parse_file(self, path):
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        except OSError as e:
+            log.warning("não foi possível ler %s: %s", path, e)
+            return None
+        if not _task_finished(content):
+            return None
+
+        ctx = self.ctx
+        storage = extract_storage(content)
+        vmids = sorted(set(m.group(2) for m in map(_START_RE.match, content.splitlines()) if m))
+        records = []
+        for vmid in vmids:
+            block = block_for_vmid(content, vmid)
+            if not block:
+                continue
+            vm_name = ctx.inventory.display_name(vmid)
+            if not vm_name or vm_name == vmid:
+                vm_name = extract_vm_name(block) or vm_name
+            elif ctx.inventory.published:
+                # inventário já publicado: o servidor resolve o nome
+                vm_name = ''
+            start, end = extract_times(block)
+            rec = {
+                'kind': 'backup',
+                'proxmox_host': ctx.proxmox_host,
+                'company_name': ctx.company_name,
+                'vmid': vmid,
+                'status': extract_status(block),
+                'storage_target': storage,
+                'start_time': start,
+                'end_time': end,
+                'total_size_bytes': extract_total_bytes(block),
+                'written_size_bytes': extract_written_bytes(block),
+            }
+            if vm_name:
+                rec['vm_name'] = vm_name
+            records.append(rec)
+        return records
+
+    def _process(self, items):
+        records = []
+        for mtime, path in sorted(items):
+            recs = self.parse_file(path)
+            if recs is None:
+                continue
+            records.extend(recs)
+            self.last_ts = max(self.last_ts, mtime)
+        if records or items:
+            self._write_state()
+        return records
+
+    def collect(self):
+        return self._process(list(self._candidates()))
+
+    def watch_dirs(self):
+        return [self.log_dir] if self.watch else []
+
+    def on_change(self, paths):
+        items = []
+        for path in paths:
+            if not self.is_backup_log(path):
+                continue
+            try:
+                items.append((int(os.path.getmtime(path)), path))
+            except OSError:
+                continue
+        return self._process(items)
+
+
+# ----------------------- REPLICAÇÃO (pvesr status) -----------------------
+@register
+class ReplicationSource(Source):
+    name = 'replication'
+
+    def _schedules(self):
+        """job id -> schedule, de /cluster/replication (o pvesr status não
+        mostra o schedule). Sem o pvesh, os registros seguem com ''."""
+        jobs = self.ctx.commands.run_json('pvesh', 'get', '/cluster/replication',
+                                          '--output-format', 'json')
+        if not isinstance(jobs, list):
+            return {}
+        # job sem schedule explícito usa o padrão do Proxmox
+        return {str(j.get('id')): j.get('schedule') or '*/15'
+                for j in jobs if isinstance(j, dict) and j.get('id')}
+
+    def collect(self):
+        out = self.ctx.commands.run('pvesr', 'status')
+        if out is None:
+            return []
+        ctx = self.ctx
+        schedules = self._schedules()
+        records = []
+        for line in out.splitlines()[1:]:
+            cols = line.split()
+            if len(cols) < 8:
+                continue
+            job, _enabled, target, last_sync, _next, duration, fail_count, state = cols[:8]
+            vmid = job.split('-', 1)[0]
+            last_epoch = 0 if last_sync == '-' else (parse_local_datetime(last_sync.replace('_', ' ')) or 0)
+            try:
+                dur = int(round(float(duration)))
+            except ValueError:
+                dur = 0
+            try:
+                fails = int(fail_count)
+            except ValueError:
+                fails = 0
+            rec = {
+                'kind': 'replication',
+                'proxmox_host': ctx.proxmox_host,
+                'company_name': ctx.company_name,
+                'vmid': vmid,
+                'source_node': ctx.proxmox_host,
+                'target_node': target.split('/', 1)[-1],
+                'state': state,
+                'status': 'SUCCESS' if state.upper() in ('OK', 'READY', 'SYNCED') else 'ERROR',
+                'schedule': schedules.get(job, ''),
+                'last_sync': last_epoch,
+                'duration_sec': dur,
+                'fail_count': fails,
+            }
+            if not ctx.inventory.published and ctx.inventory.name(vmid):
+                rec['vm_name'] = ctx.inventory.name(vmid)
+            records.append(rec)
+        return records
+
+
+# ----------------------- SAÚDE (zpool / SMART) -----------------------
+def parse_zpool_status(out):
+    pools = []
+    name = None
+    for line in (out or '').splitlines():
+        m = re.match(r'^\s*pool:\s*(\S+)', line)
+        if m:
+            name = m.group(1)
+            continue
+        m = re.match(r'^\s*state:\s*(\S+)', line)
+        if m and name:
+            pools.append({'name': name, 'status': m.group(1).upper()})
+            name = None
+    return pools
+
+
+def health_fingerprint(payload):
+    """Hash do estado de saúde (pools e SMART, sem temperatura).
+
+    Mesmo algoritmo de _health_fingerprint no servidor: o heartbeat envia
+    este hash e o servidor pede o snapshot completo se divergir.
+    """
+    state = {
+        'pools': sorted([str(p.get('name', '')), str(p.get('status', '')).upper()]
+                        for p in payload.get('pools') or []),
+        'disks': sorted([str(d.get('name', '')), bool(d.get('smart_ok', True))]
+                        for d in payload.get('disks') or []),
+    }
+    return hashlib.sha256(json.dumps(state, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+@register
+class HealthSource(Source):
+    """Estado dos pools ZFS e, se houver smartctl, SMART dos discos.
+
+    Só envia o snapshot (direto para /api/health, sem spool) quando o
+    estado muda ou quando o servidor pede via heartbeat; o resto do tempo
+    o heartbeat do daemon basta.
+    """
+    name = 'health'
+    STATE_FILE = 'health_last_hash.state'
+
+    def __init__(self, ctx, section):
+        super().__init__(ctx, section)
+        self.smart = section.getboolean('smart', True)
+        self.state_file = os.path.join(ctx.state_dir, self.STATE_FILE)
+        self._force = False
+        try:
+            with open(self.state_file) as f:
+                self.last_hash = f.read().strip() or None
+        except OSError:
+            self.last_hash = None
+
+    def force(self):
+        self._force = True
+
+    def _smart_disks(self):
+        cmds = self.ctx.commands
+        if not self.smart or not cmds.available('smartctl'):
+            return []
+        scan = cmds.run_json('smartctl', '--scan', '-j', any_exit=True) or {}
+        disks = []
+        for dev in scan.get('devices') or []:
+            path = dev.get('name')
+            if not path:
+                continue
+            info = cmds.run_json('smartctl', '-H', '-A', '-j', path, any_exit=True) or {}
+            passed = (info.get('smart_status') or {}).get('passed')
+            disks.append({
+                'name': os.path.basename(path),
+                'smart_ok': True if passed is None else bool(passed),
+                'temp': (info.get('temperature') or {}).get('current'),
+            })
+        return disks
+
+    def snapshot(self):
+        cmds = self.ctx.commands
+        pools = parse_zpool_status(cmds.run('zpool', 'status')) if cmds.available('zpool') else []
+        disks = self._smart_disks()
+        if not pools and not disks:
+            return None
+        return {
+            'company_name': self.ctx.company_name,
+            'proxmox_host': self.ctx.proxmox_host,
+            'pools': pools,
+            'disks': disks,
+        }
+
+    def collect(self):
+        payload = self.snapshot()
+        if payload is None:
+            return []
+        fp = health_fingerprint(payload)
+        if fp == self.last_hash and not self._force:
+            return []
+        status, body = self.ctx.session.post_json('/api/health', payload)
+        if not 200 <= status < 300:
+            log.warning("envio de health falhou (HTTP %s): %s", status, body[:200])
+            return []
+        log.info("estado de saúde mudou; snapshot enviado")
+        self.last_hash = fp
+        self._force = False
+        with open(self.state_file, 'w') as f:
+            f.write(f"{fp}\n")
+        return []
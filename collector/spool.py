@@ -0,0 +1,188 @@
+import fcntl
+import glob
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import time
+
+log = logging.getLogger('collector.spool')
+
+
+class Spool:
+    """Spool durável em NDJSON com envio em lotes gzip.
+
+    Usa o mesmo layout de scripts/spool-lib.sh (pending.ndjson + outbox/
+    batch-*.ndjson.gz + backoff.<host> / last_upload.<host>), então sobras
+    deixadas pelos scripts antigos são enviadas pelo coletor.
+    """
+
+    def __init__(self, spool_dir, session, batch_lines=500, max_batches_per_run=20,
+                 min_interval=30, backoff_base=30, backoff_max=3600,
+                 max_bytes=100 * 1024 * 1024):
+        self.dir = spool_dir
+        self.outbox = os.path.join(spool_dir, 'outbox')
+        self.pending = os.path.join(spool_dir, 'pending.ndjson')
+        self.session = session
+        self.batch_lines = batch_lines
+        self.max_batches_per_run = max_batches_per_run
+        self.min_interval = min_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_bytes = max_bytes
+        os.makedirs(self.outbox, exist_ok=True)
+        host_key = re.sub(r'[^A-Za-z0-9._-]', '_', session.host_key.rstrip(':'))
+        self._backoff_file = os.path.join(spool_dir, f'backoff.{host_key}')
+        self._rate_file = os.path.join(spool_dir, f'last_upload.{host_key}')
+
+    def _lock(self, name='.lock', blocking=True):
+        fd = os.open(os.path.join(self.dir, name), os.O_CREAT | os.O_WRONLY, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _unlock(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def append(self, records):
+        """Grava registros (dicts) no spool e faz fsync. Nunca acessa a rede."""
+        if not records:
+            return
+        data = ''.join(json.dumps(r, separators=(',', ':'), ensure_ascii=False) + '\n'
+                       for r in records).encode('utf-8')
+        fd = self._lock()
+        try:
+            with open(self.pending, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            self._unlock(fd)
+
+    def _seal_pending(self):
+        if not os.path.exists(self.pending) or os.path.getsize(self.pending) == 0:
+            return
+        stamp = f"{int(time.time())}-{os.getpid()}"
+        sealing = os.path.join(self.outbox, f'.sealing-{stamp}')
+        os.rename(self.pending, sealing)
+        with open(sealing, 'rb') as src:
+            part = 0
+            while True:
+                lines = [ln for _, ln in zip(range(self.batch_lines), src)]
+                if not lines:
+                    break
+                final = os.path.join(self.outbox, f'batch-{stamp}-{part:05d}.ndjson.gz')
+                tmp = final + '.tmp'
+                with open(tmp, 'wb') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                        gz.writelines(lines)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                os.rename(tmp, final)
+                part += 1
+        os.unlink(sealing)
+
+    def _batches(self):
+        return sorted(glob.glob(os.path.join(self.outbox, 'batch-*.ndjson.gz')))
+
+    def _enforce_cap(self):
+        batches = self._batches()
+        total = sum(os.path.getsize(b) for b in batches)
+        for b in batches:
+            if total <= self.max_bytes:
+                break
+            log.warning("spool cheio; descartando lote antigo %s", os.path.basename(b))
+            total -= os.path.getsize(b)
+            os.unlink(b)
+
+    def _read_backoff(self):
+        try:
+            with open(self._backoff_file) as f:
+                fails, next_ts = f.read().split()[:2]
+            return int(fails), int(next_ts)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _write_backoff(self, fails, now):
+        delay = min(self.backoff_base * (2 ** min(fails - 1, 16)), self.backoff_max)
+        delay += random.randint(0, delay // 4)
+        with open(self._backoff_file, 'w') as f:
+            f.write(f"{fails} {now + delay}\n")
+        return delay
+
+    def next_upload_at(self):
+        """Epoch a partir do qual flush() pode enviar (backoff e limite de taxa)."""
+        _, next_ts = self._read_backoff()
+        try:
+            with open(self._rate_file) as f:
+                last = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            last = 0
+        return max(next_ts, last + self.min_interval)
+
+    def flush(self):
+        """Sela o pendente e envia até max_batches_per_run lotes.
+
+        Devolve o número de lotes enviados; em falha mantém os lotes e
+        agenda o backoff.
+        """
+        fd = self._lock()
+        try:
+            self._seal_pending()
+            self._enforce_cap()
+        finally:
+            self._unlock(fd)
+
+        up = self._lock('.upload.lock', blocking=False)
+        if up is None:
+            return 0
+        try:
+            return self._upload()
+        finally:
+            self._unlock(up)
+
+    def _upload(self):
+        now = int(time.time())
+        if now < self.next_upload_at():
+            return 0
+        batches = self._batches()[:self.max_batches_per_run]
+        if not batches:
+            return 0
+
+        with open(self._rate_file, 'w') as f:
+            f.write(f"{now}\n")
+
+        fails, _ = self._read_backoff()
+        sent = 0
+        for path in batches:
+            with open(path, 'rb') as f:
+                body = f.read()
+            status, _ = self.session.request('POST', '/api/ingest', body, {
+                'Content-Type': 'application/x-ndjson',
+                'Content-Encoding': 'gzip',
+            })
+            if 200 <= status < 300:
+                os.unlink(path)
+                sent += 1
+            elif status == 400:
+                # lote que o servidor rejeita nunca vai passar: não travar a fila
+                log.warning("lote rejeitado (HTTP 400), descartando %s", os.path.basename(path))
+                os.unlink(path)
+            else:
+                delay = self._write_backoff(fails + 1, now)
+                log.warning("envio falhou (HTTP %s); %d lote(s) enviados, nova tentativa em %ds",
+                            status, sent, delay)
+                return sent
+
+        try:
+            os.unlink(self._backoff_file)
+        except FileNotFoundError:
+            pass
+        log.info("%d lote(s) enviados", sent)
+        return sent
@@ -0,0 +1,105 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+
+log = logging.getLogger('collector.watch')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')
+
+
+class DirWatcher:
+    """Observa diretórios (e subdiretórios) via inotify.
+
+    Sem inotify disponível (outro SO, libc sem suporte) fileno() devolve
+    None e o agendador cai para a varredura periódica da fonte.
+    """
+
+    def __init__(self):
+        self.fd = None
+        self._wd_paths = {}
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            log.info("inotify indisponível (%s); usando só varredura periódica", e)
+            return
+        if fd < 0:
+            log.info("inotify_init1 falhou (errno %s)", ctypes.get_errno())
+            return
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def _add(self, path):
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            log.warning("inotify_add_watch(%s) falhou (errno %s)", path, ctypes.get_errno())
+            return
+        self._wd_paths[wd] = path
+
+    def add_tree(self, root):
+        if self.fd is None or not os.path.isdir(root):
+            return
+        self._add(root)
+        for dirpath, dirnames, _files in os.walk(root):
+            for d in dirnames:
+                self._add(os.path.join(dirpath, d))
+
+    def read_events(self):
+        """Devolve os caminhos de arquivos fechados/movidos desde a última leitura."""
+        if self.fd is None:
+            return []
+        paths = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not buf:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+                offset += _EVENT.size
+                name = buf[offset:offset + length].rstrip(b'\0')
+                offset += length
+                base = self._wd_paths.get(wd)
+                if base is None or not name:
+                    continue
+                path = os.path.join(base, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add(path)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    paths.append(path)
+        return paths
+
+    def wait(self, timeout):
+        """Espera por eventos até `timeout` segundos; True se houver algo a ler."""
+        if self.fd is None:
+            return False
+        r, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        return bool(r)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,381 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+import backup_partitions as partitions
+import sla_engine
+
+# Migrações de schema versionadas por PRAGMA user_version.
+#
+# Cada migração roda uma única vez, em transação, e grava o número da versão
+# ao terminar. Com o banco já na última versão, migrate() lê só o
+# user_version: nada de PRAGMA table_info nem CREATE ... IF NOT EXISTS a cada
+# boot. Para mudar o schema, acrescente uma função @migration(N) no fim;
+# nunca edite uma migração que já foi publicada.
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, log=print):
+    """Aplica as migrações pendentes. Devolve as versões aplicadas.
+
+    Toda saída (inclusive a de dentro das migrações, que recebem
+    (cursor, log)) passa por log."""
+    if current_version(conn) >= latest_version():
+        return []
+    applied = []
+    old_isolation = conn.isolation_level
+    conn.isolation_level = None  # BEGIN/COMMIT explícitos: DDL também é transacional
+    try:
+        for version, description, func in MIGRATIONS:
+            cur = conn.cursor()
+            # IMMEDIATE: outro worker subindo ao mesmo tempo espera aqui e
+            # depois encontra a versão já aplicada
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                if current_version(conn) >= version:
+                    cur.execute('COMMIT')
+                    continue
+                log(f"[INFO] Migração {version}: {description}")
+                func(cur, log)
+                cur.execute(f'PRAGMA user_version = {int(version)}')
+                cur.execute('COMMIT')
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = old_isolation
+    return applied
+
+
+def _table_columns(cursor, table):
+    rows = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+    return {r[1] for r in rows}
+
+
+def _ensure_column(cursor, table, col_name, col_def):
+    if col_name not in _table_columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_def};")
+
+
+# ----------------------------------------------------------------------------
+
+@migration(1, "schema base (tabelas, colunas legadas, partições de backups)")
+def _m001_baseline(c, log):
+    # Bancos anteriores ao controle de versão chegam aqui com user_version 0;
+    # tudo é IF NOT EXISTS / _ensure_column para aceitar qualquer estado antigo.
+
+    # -------- BACKUPS --------
+    partitions.init_schema(c)
+    if partitions.has_legacy_table(c):
+        _ensure_column(c, "backups", "vmid", "TEXT")
+        _ensure_column(c, "backups", "vm_name", "TEXT")
+        moved = partitions.migrate_legacy_table(c)
+        log(f"[INFO] Tabela backups convertida em partições mensais ({moved} registros)")
+
+    # -------- HEALTH --------
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS health (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            proxmox_host TEXT NOT NULL,
+            company_name  TEXT,
+            payload_json  TEXT NOT NULL,
+            received_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+    # Estado atual por host: /api/health só grava histórico quando muda
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS health_state (
+            proxmox_host  TEXT PRIMARY KEY,
+            company_name  TEXT,
+            payload_json  TEXT NOT NULL,
+            state_hash    TEXT NOT NULL,
+            changed_at    INTEGER NOT NULL,
+            last_seen     INTEGER NOT NULL
+        );
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS health_events (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            proxmox_host  TEXT NOT NULL,
+            company_name  TEXT,
+            component     TEXT NOT NULL,
+            name          TEXT,
+            old_status    TEXT,
+            new_status    TEXT,
+            at            INTEGER NOT NULL
+        );
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_health_events_host_at ON health_events(proxmox_host, at);')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_health_events_at ON health_events(at);')
+
+    # Último contato de cada agente (heartbeat ou health)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS host_status (
+            proxmox_host  TEXT PRIMARY KEY,
+            company_name  TEXT,
+            last_seen     INTEGER NOT NULL,
+            stale         INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+
+    # -------- REPLICATION --------
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS replication (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            proxmox_host   TEXT NOT NULL,
+            company_name   TEXT,
+            vmid           TEXT,
+            vm_name        TEXT,
+            source_node    TEXT,
+            target_node    TEXT,
+            state          TEXT,
+            status         TEXT,
+            schedule       TEXT,
+            last_sync      INTEGER,
+            duration_sec   INTEGER,
+            fail_count     INTEGER,
+            received_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    for col, col_def in (("vmid", "TEXT"), ("vm_name", "TEXT"), ("source_node", "TEXT"),
+                         ("target_node", "TEXT"), ("state", "TEXT"), ("status", "TEXT"),
+                         ("schedule", "TEXT"), ("last_sync", "INTEGER"),
+                         ("duration_sec", "INTEGER"), ("fail_count", "INTEGER")):
+        _ensure_column(c, "replication", col, col_def)
+
+    # -------- INVENTÁRIO (nomes/tags enviados pelos agentes) --------
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_hosts (
+            proxmox_host  TEXT PRIMARY KEY,
+            company_name  TEXT,
+            hash          TEXT,
+            item_count    INTEGER,
+            updated_at    INTEGER
+        );
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            proxmox_host  TEXT NOT NULL,
+            vmid          TEXT NOT NULL,
+            node          TEXT,
+            vm_type       TEXT,
+            name          TEXT,
+            tags          TEXT,
+            PRIMARY KEY (proxmox_host, vmid)
+        ) WITHOUT ROWID;
+    ''')
+
+
+@migration(2, "remove duplicatas legadas de replicação e cria índices das consultas quentes")
+def _m002_dedup_and_indexes(c, log):
+    # Antes o índice único falhava em silêncio se houvesse duplicatas; aqui
+    # elas são removidas (fica a mais recente) e o índice passa a existir
+    # sempre. Linhas com chave incompleta (NULL) não colidem no índice e
+    # ficam intactas. Backups já foram deduplicados na conversão para
+    # partições (UNIQUE em cada partição).
+    c.execute('''
+        DELETE FROM replication
+        WHERE vmid IS NOT NULL AND source_node IS NOT NULL
+          AND target_node IS NOT NULL AND last_sync IS NOT NULL
+          AND id NOT IN (
+            SELECT MAX(id) FROM replication
+            GROUP BY proxmox_host, vmid, source_node, target_node, last_sync
+          )
+    ''')
+    if c.rowcount > 0:
+        log(f"[INFO] {c.rowcount} registro(s) de replicação duplicados removidos")
+    c.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_replication_unique
+        ON replication(proxmox_host, vmid, source_node, target_node, last_sync)
+    ''')
+    # "último job" por (empresa, vmid, origem, destino): GROUP BY + MAX(id)
+    # resolvido só no índice (id é o rowid, incluso em todo índice)
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_replication_latest
+        ON replication(company_name, vmid, source_node, target_node)
+    ''')
+    # último snapshot por host na tabela health (backfill e página /health)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_health_host ON health(proxmox_host)')
+    # partições: (company_name, end_time) vira (company_name, end_time, id,
+    # status), que cobre também as estatísticas por status numa janela de
+    # tempo; id explícito antes de status mantém o ORDER BY end_time, id
+    partitions.upgrade_indexes(c)
+
+
+@migration(3, "estado do último backup/replicação e violações de SLA")
+def _m003_sla_state(c, log):
+    # Uma linha por VM / job com o último resultado; o motor de SLA
+    # (sla_engine.py) consulta só isso, nunca o histórico.
+    c.execute('''
+        CREATE TABLE backup_last (
+            proxmox_host  TEXT NOT NULL,
+            vmid          TEXT NOT NULL,
+            company_name  TEXT,
+            vm_name       TEXT,
+            last_end      INTEGER NOT NULL,
+            last_status   TEXT,
+            last_success  INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (proxmox_host, vmid)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX idx_backup_last_success ON backup_last(last_success)')
+    c.execute('CREATE INDEX idx_backup_last_company ON backup_last(company_name, last_success)')
+    c.execute('''
+        INSERT INTO backup_last
+          (proxmox_host, vmid, company_name, vm_name, last_end, last_status)
+        SELECT proxmox_host, vmid, company_name, vm_name, MAX(end_time), status
+        FROM backups WHERE vmid IS NOT NULL AND vmid != ''
+        GROUP BY proxmox_host, vmid
+    ''')
+    c.execute('''
+        UPDATE backup_last SET last_success = IFNULL((
+            SELECT MAX(end_time) FROM backups b
+            WHERE b.proxmox_host = backup_last.proxmox_host
+              AND b.vmid = backup_last.vmid AND b.status = 'SUCCESS'), 0)
+    ''')
+
+    c.execute('''
+        CREATE TABLE replication_last (
+            proxmox_host  TEXT NOT NULL,
+            vmid          TEXT NOT NULL,
+            source_node   TEXT NOT NULL,
+            target_node   TEXT NOT NULL,
+            company_name  TEXT,
+            vm_name       TEXT,
+            status        TEXT,
+            schedule      TEXT,
+            interval_sec  INTEGER,
+            last_sync     INTEGER NOT NULL DEFAULT 0,
+            fail_count    INTEGER,
+            PRIMARY KEY (proxmox_host, vmid, source_node, target_node)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX idx_replication_last_company ON replication_last(company_name)')
+    rows = c.execute('''
+        SELECT r.* FROM replication r
+        JOIN (SELECT MAX(id) AS max_id FROM replication
+              WHERE vmid != ''
+              GROUP BY proxmox_host, vmid, source_node, target_node) x
+          ON x.max_id = r.id
+    ''').fetchall()
+    for r in rows:
+        r = dict(zip([d[0] for d in c.description], r))
+        sla_engine.record_replication(
+            c, r['proxmox_host'], r['company_name'], r['vmid'], r['vm_name'],
+            r['source_node'] or '', r['target_node'] or '', r['status'], r['schedule'],
+            r['last_sync'] or 0, r['fail_count'])
+
+    # violações abertas (resolved_at NULL) e histórico
+    c.execute('''
+        CREATE TABLE sla_violations (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule          TEXT NOT NULL,
+            rule_type     TEXT NOT NULL,
+            subject       TEXT NOT NULL,
+            company_name  TEXT,
+            proxmox_host  TEXT,
+            vmid          TEXT,
+            vm_name       TEXT,
+            detail        TEXT,
+            last_ok       INTEGER,
+            opened_at     INTEGER NOT NULL,
+            checked_at    INTEGER NOT NULL,
+            resolved_at   INTEGER
+        )
+    ''')
+    c.execute('''
+        CREATE UNIQUE INDEX ux_sla_violations_open
+        ON sla_violations(rule, subject) WHERE resolved_at IS NULL
+    ''')
+    c.execute('CREATE INDEX idx_sla_violations_opened ON sla_violations(opened_at)')
+
+
+@migration(4, "intervalo de envio observado por host (limiar de STALE)")
+def _m004_host_report_interval(c, log):
+    # Média móvel do intervalo entre contatos: hosts no cron legado
+    # (health-monitor.sh de hora em hora) não podem ser julgados pelo
+    # stale_after_minutes pensado para o heartbeat do coletor.
+    c.execute('ALTER TABLE host_status ADD COLUMN report_interval INTEGER')
+
+
+@migration(5, "catálogo de empresas com backups (backup_companies)")
+def _m005_company_catalog(c, log):
+    partitions.init_company_catalog(c)
+
+
+@migration(6, "índice (proxmox_host, end_time) nas partições para a busca por host")
+def _m006_host_index(c, log):
+    partitions.upgrade_indexes(c)
+
+
+@migration(7, "company_name NULL vira '' nas partições; índice das violações abertas")
+def _m007_company_and_open_violations(c, log):
+    # Com '' no lugar de NULL o filtro da empresa sem nome é uma igualdade
+    # simples e usa o índice (company_name, end_time, ...) sem ordenar;
+    # o "= '' OR IS NULL" virava MULTI-INDEX OR + B-tree temporária.
+    partitions.normalize_null_companies(c)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sla_violations_open_company ON sla_violations(company_name, rule, subject) "
+        "WHERE resolved_at IS NULL")
+
+
+
+@migration(8, "índice (vm_name NOCASE, end_time) nas partições para o prefixo de vm_name")
+def _m008_vm_name_index(c, log):
+    partitions.upgrade_indexes(c)
+
+
+
+@migration(9, "deadline indexado em replication_last; intervalo dos schedules recalculado")
+def _m009_replication_deadline(c, log):
+    # Coluna gerada: record_replication não precisa mantê-la e a migração 3
+    # (que já a chama) continua válida em bancos novos.
+    c.execute("ALTER TABLE replication_last ADD COLUMN deadline INTEGER "
+              "GENERATED ALWAYS AS (last_sync + IFNULL(interval_sec, 0)) VIRTUAL")
+    c.execute('DROP INDEX IF EXISTS idx_replication_last_company')
+    c.execute('CREATE INDEX idx_replication_last_deadline ON replication_last(deadline)')
+    c.execute('CREATE INDEX idx_replication_last_company_deadline '
+              'ON replication_last(company_name, deadline)')
+    # dias da semana e passos de hora antes davam 1 dia ou None
+    schedules = [r[0] for r in c.execute('SELECT DISTINCT schedule FROM replication_last')]
+    for schedule in schedules:
+        c.execute('UPDATE replication_last SET interval_sec = ? WHERE schedule IS ?',
+                  (sla_engine.schedule_interval_seconds(schedule), schedule))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrações do banco do Proxmox Monitor')
+    parser.add_argument('--db', default=os.getenv('MONITOR_DB', '/opt/proxmox-monitor/backups.db'))
+    parser.add_argument('--status', action='store_true', help='mostra a versão do schema e sai')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    if args.status:
+        print(f"user_version={current_version(conn)} última={latest_version()}")
+        return 0
+    migrate(conn)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import json
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class IngestError(ValueError):
+    pass
+
+
+def _new_decoder(encoding):
+    if encoding in ('gzip', 'x-gzip'):
+        # 16 + MAX_WBITS => aceita cabeçalho gzip
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return zlib.decompressobj()
+
+
+def _iter_raw_chunks(stream, content_encoding):
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        decoder = None
+    elif encoding in ('gzip', 'x-gzip', 'deflate'):
+        decoder = _new_decoder(encoding)
+    else:
+        raise IngestError(f"unsupported Content-Encoding: {content_encoding}")
+
+    seen_input = False
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if decoder is None:
+            yield chunk
+            continue
+        seen_input = True
+        try:
+            while chunk:
+                # limita a saída por chamada para não inflar tudo de uma vez
+                out = decoder.decompress(chunk, CHUNK_SIZE)
+                while out:
+                    yield out
+                    out = decoder.decompress(decoder.unconsumed_tail, CHUNK_SIZE)
+                chunk = decoder.unused_data if decoder.eof else b''
+                if chunk:
+                    if encoding == 'deflate':
+                        raise IngestError("trailing data after deflate stream")
+                    # corpo com vários membros gzip (cat a.gz b.gz, pigz):
+                    # cada membro precisa de um descompressor novo
+                    decoder = _new_decoder(encoding)
+        except zlib.error as e:
+            raise IngestError(f"invalid compressed body: {e}")
+
+    if decoder is not None and seen_input:
+        if not decoder.eof:
+            # sem o rodapé o lote está truncado; aceitar perderia registros
+            raise IngestError("truncated compressed body")
+        tail = decoder.flush()
+        if tail:
+            yield tail
+
+
+def iter_ndjson(stream, content_encoding=None):
+    """Decodifica um corpo NDJSON (opcionalmente gzip) em streaming.
+
+    Gera tuplas (lineno, objeto, erro); linhas vazias são ignoradas e
+    linhas inválidas vêm com objeto None e a mensagem de erro.
+    """
+    buf = b''
+    lineno = 0
+
+    def parse(raw):
+        raw = raw.strip()
+        if not raw:
+            return None
+        try:
+            return json.loads(raw.decode('utf-8')), None
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return None, str(e)
+
+    for chunk in _iter_raw_chunks(stream, content_encoding):
+        lines = (buf + chunk).split(b'\n')
+        buf = lines.pop()
+        for line in lines:
+            lineno += 1
+            parsed = parse(line)
+            if parsed is not None:
+                yield (lineno,) + parsed
+        if len(buf) > MAX_LINE_BYTES:
+            raise IngestError(f"line {lineno + 1} exceeds {MAX_LINE_BYTES} bytes")
+
+    if buf.strip():
+        lineno += 1
+        parsed = parse(buf)
+        if parsed is not None:
+            yield (lineno,) + parsed
+
+
+def read_json_body(stream, content_encoding=None, max_bytes=32 * 1024 * 1024):
+    """Lê um corpo JSON único, descomprimindo gzip/deflate se indicado."""
+    parts = []
+    size = 0
+    for chunk in _iter_raw_chunks(stream, content_encoding):
+        size += len(chunk)
+        if size > max_bytes:
+            raise IngestError(f"body exceeds {max_bytes} bytes")
+        parts.append(chunk)
+    try:
+        return json.loads(b''.join(parts).decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise IngestError(f"invalid JSON: {e}")
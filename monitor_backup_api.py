@@ -4,18 +4,27 @@ import configparser
 import smtplib
 import json
 import os
+import hashlib
+import threading
+import csv
+import io
+import zlib
 from functools import wraps
 from email.message import EmailMessage
-from flask import Flask, request, jsonify, render_template
-from datetime import datetime, time as dtime, timedelta
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
+from datetime import datetime, time as dtime
 import time
-from collections import defaultdict
-from cache_utils import cache_with_timeout
+from cache_utils import cache_with_timeout, cached_value
+from ingest_utils import iter_ndjson, read_json_body, IngestError
+import backup_partitions as partitions
+import db_migrations
+import sla_engine
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 DATABASE = os.getenv('MONITOR_DB', '/opt/proxmox-monitor/backups.db')
 CONFIG_FILE = os.getenv('MONITOR_CFG', '/opt/proxmox-monitor/config.ini')
 RETENTION_LIMIT = 30 
+COUNT_CACHE_SECONDS = 60  # totais de paginação podem atrasar até 1 min
 
 API_TOKEN = os.getenv('MONITOR_API_TOKEN', '').strip()
 
@@ -52,104 +61,54 @@ def get_db():
     db.execute('PRAGMA synchronous=NORMAL')  # Compromisso entre segurança e performance
     return db
 
-def _table_columns(cursor, table):
-    rows = cursor.execute(f"PRAGMA table_info({table})").fetchall()
-    return { (r["name"] if isinstance(r, sqlite3.Row) else r[1]) for r in rows }
-
-def _ensure_column(cursor, table, col_name, col_def):
-    cols = _table_columns(cursor, table)
-    if col_name not in cols:
-        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_def};")
-
 def init_db():
     with app.app_context():
         db = get_db()
-        c = db.cursor()
-
-        # -------- BACKUPS --------
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS backups (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                proxmox_host TEXT NOT NULL,
-                company_name TEXT,
-                vmid TEXT,
-                vm_name TEXT,
-                status TEXT NOT NULL,
-                storage_target TEXT,
-                start_time INTEGER NOT NULL,
-                end_time INTEGER NOT NULL,
-                total_size_bytes INTEGER,
-                written_size_bytes INTEGER,
-                duration_seconds INTEGER,
-                speed_mb_s REAL
-            );
-        ''')
-        
-        c.execute('CREATE INDEX IF NOT EXISTS idx_backups_company ON backups(company_name);')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_backups_start_time ON backups(start_time);')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_backups_company_time ON backups(company_name, start_time);')
-
-        _ensure_column(c, "backups", "vmid", "TEXT")
-        _ensure_column(c, "backups", "vm_name", "TEXT")
-
-        try:
-            c.execute('''
-                CREATE UNIQUE INDEX IF NOT EXISTS ux_backups_unique
-                ON backups(proxmox_host, vmid, start_time, end_time);
-            ''')
-        except sqlite3.OperationalError as e:
-            print(f"[WARN] Não foi possível criar ux_backups_unique: {e}")
-
-        # -------- HEALTH --------
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS health (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                proxmox_host TEXT NOT NULL,
-                company_name  TEXT,
-                payload_json  TEXT NOT NULL,
-                received_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        ''')
-
-        # -------- REPLICATION --------
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS replication (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                proxmox_host   TEXT NOT NULL,
-                company_name   TEXT,
-                vmid           TEXT,
-                vm_name        TEXT,
-                source_node    TEXT,
-                target_node    TEXT,
-                state          TEXT,
-                status         TEXT,
-                schedule       TEXT,
-                last_sync      INTEGER,
-                duration_sec   INTEGER,
-                fail_count     INTEGER,
-                received_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        ''')
-        _ensure_column(c, "replication", "vmid", "TEXT")
-        _ensure_column(c, "replication", "vm_name", "TEXT")
-        _ensure_column(c, "replication", "source_node", "TEXT")
-        _ensure_column(c, "replication", "target_node", "TEXT")
-        _ensure_column(c, "replication", "state", "TEXT")
-        _ensure_column(c, "replication", "status", "TEXT")
-        _ensure_column(c, "replication", "schedule", "TEXT")
-        _ensure_column(c, "replication", "last_sync", "INTEGER")
-        _ensure_column(c, "replication", "duration_sec", "INTEGER")
-        _ensure_column(c, "replication", "fail_count", "INTEGER")
-
+        applied = db_migrations.migrate(db)
+        # schema base recém-aplicado: bancos anteriores ao envio só-mudanças
+        # ainda não têm health_state
+        if 1 in applied and db.execute("SELECT 1 FROM health_state LIMIT 1").fetchone() is None:
+            _backfill_health_state(db.cursor())
+            db.commit()
+
+def _backfill_health_state(cursor):
+    """Preenche health_state a partir do último snapshot de cada host na
+    tabela health (bancos anteriores ao envio só-mudanças)."""
+    rows = cursor.execute("""
+        SELECT h1.proxmox_host, h1.company_name, h1.payload_json,
+               CAST(strftime('%s', h1.received_at) AS INTEGER) AS seen
+        FROM health h1
+        JOIN (SELECT proxmox_host, MAX(id) AS max_id FROM health GROUP BY proxmox_host) x
+          ON x.max_id = h1.id
+    """).fetchall()
+    recent_cutoff = int(time.time()) - _stale_after_seconds()
+    for r in rows:
         try:
-            c.execute('''
-                CREATE UNIQUE INDEX IF NOT EXISTS ux_replication_unique
-                ON replication(proxmox_host, vmid, source_node, target_node, last_sync);
-            ''')
-        except sqlite3.OperationalError as e:
-            print(f"[WARN] Não foi possível criar ux_replication_unique: {e}")
-
-        db.commit()
+            canonical = _normalize_health(json.loads(r["payload_json"] or "{}"))
+        except ValueError:
+            continue
+        seen = r["seen"] or int(time.time())
+        cursor.execute("""
+            INSERT OR IGNORE INTO health_state
+              (proxmox_host, company_name, payload_json, state_hash, changed_at, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (r["proxmox_host"], r["company_name"],
+              json.dumps(canonical, ensure_ascii=False),
+              _health_fingerprint(canonical), seen, seen))
+        if seen < recent_cutoff:
+            # host desativado há tempo: semear host_status geraria um
+            # alerta STALE por host antigo na primeira checagem
+            continue
+        last_two = cursor.execute("""
+            SELECT CAST(strftime('%s', received_at) AS INTEGER) FROM health
+            WHERE proxmox_host = ? ORDER BY id DESC LIMIT 2
+        """, (r["proxmox_host"],)).fetchall()
+        interval = last_two[0][0] - last_two[1][0] if len(last_two) == 2 else None
+        cursor.execute("""
+            INSERT OR IGNORE INTO host_status (proxmox_host, company_name, last_seen, report_interval)
+            VALUES (?, ?, ?, ?)
+        """, (r["proxmox_host"], r["company_name"], seen,
+              interval if interval and interval > 0 else None))
 
 def prune_old_backups(db, company_name):
     if not company_name:
@@ -164,24 +123,60 @@ def prune_old_backups(db, company_name):
             retention_rules = {k.lower(): v for k, v in config.items('retention')}
 
         cursor = db.cursor()
-        cursor.execute("SELECT DISTINCT storage_target FROM backups WHERE company_name = ?", (company_name,))
-        targets = [row['storage_target'] for row in cursor.fetchall() if row['storage_target']]
+        parts = partitions.list_partitions(cursor)
+        # DISTINCT por partição (índice company_storage_end), sem a view
+        targets = sorted({
+            row['storage_target']
+            for part in parts
+            for row in cursor.execute(
+                f"SELECT DISTINCT storage_target FROM {part['table_name']} WHERE company_name = ?",
+                (company_name,))
+            if row['storage_target']
+        })
         for target in targets:
             limit = int(retention_rules.get(target.lower(), str(default_retention)))
-            sql_prune = """
-                DELETE FROM backups
-                WHERE id IN (
-                    SELECT id FROM backups
-                    WHERE company_name = ? AND storage_target = ?
-                    ORDER BY end_time DESC
-                    LIMIT -1 OFFSET ?
-                )
-            """
-            cursor.execute(sql_prune, (company_name, target, limit))
+            # Mais nova -> mais antiga: só a partição onde o limite é
+            # atingido (e as anteriores) precisam de DELETE.
+            remaining = limit
+            for part in parts:
+                table = part['table_name']
+                if remaining > 0:
+                    n = cursor.execute(
+                        f"SELECT COUNT(*) FROM {table} WHERE company_name = ? AND storage_target = ?",
+                        (company_name, target)).fetchone()[0]
+                    if n <= remaining:
+                        remaining -= n
+                        continue
+                cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE company_name = ? AND storage_target = ?
+                        ORDER BY end_time DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                """, (company_name, target, remaining))
+                remaining = 0
         db.commit()
     except Exception:
         db.rollback()
 
+def apply_age_retention(db, now=None):
+    """[retention] max_age_days: descarta partições mensais inteiras que
+    ficaram mais velhas que o limite (0 desliga). Devolve os meses removidos."""
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    days = config['retention'].getint('max_age_days', 0) if 'retention' in config else 0
+    if days <= 0:
+        return []
+    cutoff = (now or int(time.time())) - days * 86400
+    c = db.cursor()
+    dropped = partitions.drop_older_than(c, cutoff)
+    db.commit()
+    if dropped:
+        print(f"[INFO] Retenção: partições removidas {', '.join(dropped)}")
+    return dropped
+
 def send_alert_email(subject, body):
     try:
         config = configparser.ConfigParser()
@@ -217,44 +212,33 @@ def get_summaries_v2():
         db = get_db()
         cursor = db.cursor()
         
-        # Obtém o total de registros para paginação
-        cursor.execute('SELECT COUNT(DISTINCT company_name) as total FROM backups')
-        total_records = cursor.fetchone()['total']
-        
-        # Consulta paginada
-        cursor.execute('''
-            WITH ranked_backups AS (
-                SELECT 
-                    company_name,
-                    MAX(end_time) as last_backup,
-                    COUNT(*) as total_backups,
-                    SUM(CASE WHEN status = 'SUCCESS' THEN 1 ELSE 0 END) as successful_backups
-                FROM backups 
-                GROUP BY company_name
-                ORDER BY company_name
-                LIMIT ? OFFSET ?
-            )
-            SELECT * FROM ranked_backups
-        ''', (per_page, offset))
-        
-        companies = cursor.fetchall()
+        # Empresas vêm do catálogo (backup_companies), não de um GROUP BY
+        # sobre todas as partições
+        total_records, _ = cached_value(
+            ('distinct_companies',), COUNT_CACHE_SECONDS,
+            lambda: db.execute(
+                "SELECT COUNT(*) FROM backup_companies WHERE company_name != ''").fetchone()[0])
+
+        names = [r[0] for r in cursor.execute("""
+            SELECT company_name FROM backup_companies
+            WHERE company_name != ''
+            ORDER BY company_name
+            LIMIT ? OFFSET ?
+        """, (per_page, offset)).fetchall()]
+
         results = []
-        
-        for company in companies:
-            company_name = company['company_name']
-            if not company_name:
-                continue
-                
-            # Obtém últimos backups da empresa (limitado a 10)
-            cursor.execute('''
-                SELECT * FROM backups 
-                WHERE company_name = ? 
-                ORDER BY end_time DESC 
-                LIMIT 10
-            ''', (company_name,))
-            
-            recent_backups = cursor.fetchall()
-            
+
+        for company_name in names:
+            # Últimos backups (limitado a 10), da partição mais nova para a mais antiga
+            recent_backups = partitions.query_newest(
+                cursor, "company_name = ?", (company_name,), 10)
+            company = {
+                'last_backup': recent_backups[0]['end_time'] if recent_backups else None,
+                'total_backups': partitions.count(cursor, "company_name = ?", (company_name,)),
+                'successful_backups': partitions.count(
+                    cursor, "company_name = ? AND status = 'SUCCESS'", (company_name,)),
+            }
+
             results.append({
                 'company_name': company_name,
                 'last_backup': company['last_backup'],
@@ -285,6 +269,89 @@ def get_summaries_v2():
         print(f"Error in get_summaries_v2: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _to_int(x, default=0):
+    try:
+        return int(x)
+    except (TypeError, ValueError):
+        return default
+
+def _inventory_lookup(cursor, host, vmid):
+    if not host or vmid in (None, ''):
+        return None
+    return cursor.execute(
+        "SELECT name, tags FROM inventory WHERE proxmox_host = ? AND vmid = ?",
+        (host, str(vmid))
+    ).fetchone()
+
+def _store_backup(cursor, data):
+    """Normaliza e insere um registro de backup.
+
+    Devolve (resultado, registro, erro) onde resultado é 'inserted',
+    'duplicate' ou 'ignored' (SUCCESS com duração zero), ou None com o erro
+    quando falta campo obrigatório.
+    """
+    # valida antes: o INSERT OR IGNORE engoliria o NOT NULL como "duplicata"
+    if not str(data.get('proxmox_host') or '').strip():
+        return None, None, "Missing 'proxmox_host'"
+    if _to_int(data.get('end_time')) <= 0:
+        return None, None, "Missing 'end_time'"
+
+    start_time = _to_int(data.get('start_time'))
+    end_time   = _to_int(data.get('end_time'))
+    written_size = data.get('written_size_bytes')
+    total_size   = data.get('total_size_bytes')
+
+    duration = end_time - start_time if end_time > start_time else 0
+    try:
+        w = float(written_size) if written_size is not None else 0.0
+    except (TypeError, ValueError):
+        w = 0.0
+    speed_mb_s = (w / 1024.0 / 1024.0) / duration if duration > 0 else 0.0
+
+    record = {
+        "status":  (data.get('status') or '').upper(),
+        "company": data.get('company_name'),
+        "vmid":    data.get('vmid'),
+        "vm_name": data.get('vm_name'),
+        "host":    data.get('proxmox_host'),
+        "storage": data.get('storage_target'),
+    }
+
+    if record["status"] == 'SUCCESS' and duration <= 0:
+        return 'ignored', record, None
+
+    if not record["vm_name"]:
+        inv = _inventory_lookup(cursor, record["host"], record["vmid"])
+        if inv:
+            record["vm_name"] = inv["tags"] or inv["name"]
+
+    # OR IGNORE: reenvios do spool do agente não podem duplicar linhas
+    inserted = partitions.insert_backup(cursor, {
+        "proxmox_host": record["host"], "company_name": record["company"],
+        "vmid": record["vmid"], "vm_name": record["vm_name"],
+        "status": record["status"], "storage_target": record["storage"],
+        "start_time": start_time, "end_time": end_time,
+        "total_size_bytes": total_size, "written_size_bytes": written_size,
+        "duration_seconds": duration, "speed_mb_s": speed_mb_s,
+    })
+    if inserted > 0:
+        sla_engine.record_backup(cursor, record["host"], record["vmid"], record["company"],
+                                 record["vm_name"], record["status"], end_time)
+    return ('inserted' if inserted > 0 else 'duplicate'), record, None
+
+def _alert_backup_failure(record):
+    if record["status"] == 'SUCCESS':
+        return
+    subject = f"Alerta de Backup: {record['status']} no cliente {record['company']}"
+    body = (
+        "Um backup necessita de atenção.\n\n"
+        f"- Cliente: {record['company']}\n"
+        f"- Host: {record['host']}\n"
+        f"- VM: {record['vm_name']} ({record['vmid']})\n"
+        f"- Status: {record['status']}"
+    )
+    send_alert_email(subject, body)
+
 @app.route('/api/backup', methods=['POST'])
 @require_api_token
 def receive_backup_data():
@@ -297,68 +364,29 @@ def receive_backup_data():
 
     db = None
     try:
-        def to_int(x, default=0):
-            try:
-                return int(x)
-            except (TypeError, ValueError):
-                return default
-
-        start_time = to_int(data.get('start_time'))
-        end_time   = to_int(data.get('end_time'))
-        written_size = data.get('written_size_bytes')
-        total_size   = data.get('total_size_bytes')
-
-        duration = end_time - start_time if end_time > start_time else 0
-        try:
-            w = float(written_size) if written_size is not None else 0.0
-        except (TypeError, ValueError):
-            w = 0.0
-        speed_mb_s = (w / 1024.0 / 1024.0) / duration if duration > 0 else 0.0
-
-        status   = (data.get('status') or '').upper()
-        company  = data.get('company_name')
-        vmid     = data.get('vmid')
-        vm_name  = data.get('vm_name')
-        host     = data.get('proxmox_host')
-        storage  = data.get('storage_target')
-
-        if status == 'SUCCESS' and duration <= 0:
-            print(f"[DEBUG] Ignored zero-duration SUCCESS (host={host}, vmid={vmid})")
-            return jsonify({"ignored": "zero-duration-success"}), 200
-
         db = get_db()
         cursor = db.cursor()
 
         print("[DEBUG] Attempting to INSERT data into the database...")
-        cursor.execute(
-            '''
-            INSERT INTO backups
-              (proxmox_host, company_name, vmid, vm_name, status, storage_target,
-               start_time, end_time, total_size_bytes, written_size_bytes,
-               duration_seconds, speed_mb_s)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''',
-            (host, company, vmid, vm_name, status, storage,
-             start_time, end_time, total_size, written_size, duration, speed_mb_s)
-        )
+        result, record, err = _store_backup(cursor, data)
+        if err:
+            return jsonify({"error": err}), 400
+        if result == 'ignored':
+            print(f"[DEBUG] Ignored zero-duration SUCCESS (host={record['host']}, vmid={record['vmid']})")
+            return jsonify({"ignored": "zero-duration-success"}), 200
+        if result == 'duplicate':
+            print(f"[DEBUG] Ignored duplicate (host={record['host']}, vmid={record['vmid']})")
+            db.rollback()  # nada a gravar; não deixa a transação aberta
+            return jsonify({"ignored": "duplicate"}), 200
         print("[DEBUG] INSERT executed. Committing...")
         db.commit()
         print("[DEBUG] Commit OK.")
 
         print("[DEBUG] Pruning old backups...")
-        prune_old_backups(db, company)
+        prune_old_backups(db, record["company"])
         print("[DEBUG] Pruning finished.")
 
-        if status != 'SUCCESS':
-            subject = f"Alerta de Backup: {status} no cliente {company}"
-            body = (
-                "Um backup necessita de atenção.\n\n"
-                f"- Cliente: {company}\n"
-                f"- Host: {host}\n"
-                f"- VM: {vm_name} ({vmid})\n"
-                f"- Status: {status}"
-            )
-            send_alert_email(subject, body)
+        _alert_backup_failure(record)
 
         print("--- [DEBUG] Returning 201. ---\n")
         return jsonify({"message": "Data received"}), 201
@@ -369,64 +397,412 @@ def receive_backup_data():
             db.rollback()
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
+# ----------------------- INGESTÃO EM LOTE -----------------------
+@app.route('/api/ingest', methods=['POST'])
+@require_api_token
+def ingest_bulk():
+    """Recebe NDJSON (um registro por linha, opcionalmente com
+    Content-Encoding: gzip) vindo do spool dos agentes.
+
+    Cada linha traz "kind": "backup" (padrão) ou "replication". O lote
+    inteiro é gravado numa única transação; linhas inválidas são contadas
+    e descartadas para não travar o spool do agente.
+    """
+    counts = {"inserted": 0, "duplicate": 0, "ignored": 0, "invalid": 0}
+    errors = []
+    companies = set()
+    failures = []
+
+    db = get_db()
+    c = db.cursor()
+    try:
+        for lineno, rec, err in iter_ndjson(request.stream, request.headers.get('Content-Encoding')):
+            if err is None and not isinstance(rec, dict):
+                err = "record must be a JSON object"
+            if err is None:
+                kind = str(rec.get('kind') or 'backup').lower()
+                if kind == 'backup':
+                    result, record, err = _store_backup(c, rec)
+                    if result == 'inserted':
+                        companies.add(record["company"])
+                        if record["status"] != 'SUCCESS':
+                            failures.append(record)
+                elif kind == 'replication':
+                    result, err = _store_replication(c, rec)
+                else:
+                    err = f"unknown kind: {kind}"
+            if err is not None:
+                counts["invalid"] += 1
+                if len(errors) < 20:
+                    errors.append({"line": lineno, "error": err})
+                continue
+            counts[result] += 1
+        db.commit()
+    except IngestError as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+
+    for company in companies:
+        prune_old_backups(db, company)
+    for record in failures:
+        _alert_backup_failure(record)
+
+    return jsonify({"status": "ok", "counts": counts, "errors": errors}), 200
+
 
 # ----------------------- HEALTH API -----------------------
+HEALTH_OK = {"ONLINE", "OK"}
+
+def _normalize_health(data):
+    raw_pools = data.get('pools') or data.get('zfs_pools') or []
+    raw_disks = data.get('disks') or data.get('smart') or []
+
+    pools = []
+    if isinstance(raw_pools, list):
+        for p in raw_pools:
+            if isinstance(p, dict):
+                pools.append({
+                    "name":   str(p.get("name", "")),
+                    "status": str(p.get("status", "")).upper()
+                })
+
+    disks = []
+    if isinstance(raw_disks, list):
+        for d in raw_disks:
+            if isinstance(d, dict):
+                disks.append({
+                    "name":     str(d.get("name", "")),
+                    "smart_ok": bool(d.get("smart_ok", True)),
+                    "temp":     d.get("temp")
+                })
+
+    return {
+        "proxmox_host": str(data.get('proxmox_host') or '').strip(),
+        "company_name": str(data.get('company_name') or '').strip(),
+        "pools": pools,
+        "disks": disks
+    }
+
+def _health_components(canonical):
+    """{(componente, nome): status}; temperatura fica de fora de propósito."""
+    comps = {("pool", p["name"]): p["status"] for p in canonical["pools"]}
+    comps.update({("disk", d["name"]): ("OK" if d["smart_ok"] else "FAILED")
+                  for d in canonical["disks"]})
+    return comps
+
+def _health_fingerprint(canonical):
+    # Mesmo algoritmo de collector/sources.py (health_fingerprint)
+    state = {
+        "pools": sorted([p["name"], p["status"]] for p in canonical["pools"]),
+        "disks": sorted([d["name"], bool(d["smart_ok"])] for d in canonical["disks"]),
+    }
+    return hashlib.sha256(json.dumps(state, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def _health_transitions(old_canonical, new_canonical):
+    old = _health_components(old_canonical) if old_canonical else {}
+    new = _health_components(new_canonical)
+    out = []
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key, "MISSING")
+        if before != after:
+            out.append((key[0], key[1], before, after))
+    return out
+
+def _touch_host(cursor, proxmox_host, company_name, now):
+    """Atualiza o último contato; devolve True se o host estava marcado
+    como sem heartbeat (para registrar a recuperação)."""
+    row = cursor.execute(
+        "SELECT stale, company_name, last_seen, report_interval FROM host_status WHERE proxmox_host = ?",
+        (proxmox_host,)
+    ).fetchone()
+    interval = row["report_interval"] if row else None
+    gap = now - row["last_seen"] if row else 0
+    if gap > 0:
+        # média móvel: uma falha isolada não dobra o limiar de uma vez. Conta
+        # também na recuperação: um host novo no cron de hora em hora fica
+        # STALE antes do segundo contato e só aprende o intervalo aqui
+        interval = gap if not interval else (3 * interval + gap) // 4
+    cursor.execute("""
+        INSERT INTO host_status (proxmox_host, company_name, last_seen, stale, report_interval)
+        VALUES (?, ?, ?, 0, ?)
+        ON CONFLICT(proxmox_host) DO UPDATE SET
+          company_name = COALESCE(NULLIF(excluded.company_name, ''), company_name),
+          last_seen = excluded.last_seen,
+          stale = 0,
+          report_interval = excluded.report_interval
+    """, (proxmox_host, company_name, now, interval))
+    recovered = bool(row and row["stale"])
+    if recovered:
+        cursor.execute("""
+            INSERT INTO health_events
+              (proxmox_host, company_name, component, name, old_status, new_status, at)
+            VALUES (?, ?, 'host', ?, 'STALE', 'ONLINE', ?)
+        """, (proxmox_host, company_name or row["company_name"], proxmox_host, now))
+    return recovered
+
+def _alert_health_transitions(proxmox_host, company_name, transitions):
+    if not transitions:
+        return
+    lines = [f"- {comp} {name}: {before or '(novo)'} -> {after}"
+             for comp, name, before, after in transitions]
+    bad = any(after not in HEALTH_OK for _c, _n, _b, after in transitions)
+    subject = (f"Alerta de Saúde: {company_name or proxmox_host}" if bad
+               else f"Saúde normalizada: {company_name or proxmox_host}")
+    body = (
+        "Mudança de estado do armazenamento.\n\n"
+        f"- Cliente: {company_name}\n"
+        f"- Host: {proxmox_host}\n\n" + "\n".join(lines)
+    )
+    send_alert_email(subject, body)
+
 @app.route('/api/health', methods=['POST'])
 @require_api_token
 def api_health():
+    """Recebe o snapshot de pools/discos. Snapshot igual ao atual só
+    atualiza o último contato; mudanças viram eventos e uma linha no
+    histórico (tabela health)."""
     try:
         if not request.is_json:
             return jsonify({"error": "Content-Type must be application/json"}), 400
 
         data = request.get_json(silent=True, force=True) or {}
-        proxmox_host = str(data.get('proxmox_host') or '').strip()
-        company_name = str(data.get('company_name') or '').strip()
+        canonical = _normalize_health(data)
+        proxmox_host = canonical["proxmox_host"]
+        company_name = canonical["company_name"]
         if not proxmox_host:
             return jsonify({"error": "Missing 'proxmox_host' in payload"}), 400
 
-        raw_pools = data.get('pools') or data.get('zfs_pools') or []
-        raw_disks = data.get('disks') or data.get('smart') or []
-
-        pools = []
-        if isinstance(raw_pools, list):
-            for p in raw_pools:
-                if isinstance(p, dict):
-                    pools.append({
-                        "name":   str(p.get("name", "")),
-                        "status": str(p.get("status", "")).upper()
-                    })
-
-        disks = []
-        if isinstance(raw_disks, list):
-            for d in raw_disks:
-                if isinstance(d, dict):
-                    disks.append({
-                        "name":     str(d.get("name", "")),
-                        "smart_ok": bool(d.get("smart_ok", True)),
-                        "temp":     d.get("temp")
-                    })
-
-        canonical = {
-            "proxmox_host": proxmox_host,
-            "company_name": company_name,
-            "pools": pools,
-            "disks": disks
-        }
+        state_hash = _health_fingerprint(canonical)
         payload_json = json.dumps(canonical, ensure_ascii=False)
+        now = int(time.time())
 
         db = get_db()
         c = db.cursor()
+        current = c.execute(
+            "SELECT payload_json, state_hash FROM health_state WHERE proxmox_host = ?",
+            (proxmox_host,)
+        ).fetchone()
+        _touch_host(c, proxmox_host, company_name, now)
+
+        if current and current["state_hash"] == state_hash:
+            c.execute("""
+                UPDATE health_state SET last_seen = ?, payload_json = ?
+                WHERE proxmox_host = ?
+            """, (now, payload_json, proxmox_host))
+            db.commit()
+            return jsonify({"status": "ok", "changed": False, "state_hash": state_hash}), 200
+
+        old_canonical = json.loads(current["payload_json"]) if current else None
+        transitions = _health_transitions(old_canonical, canonical)
+        c.executemany("""
+            INSERT INTO health_events
+              (proxmox_host, company_name, component, name, old_status, new_status, at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(proxmox_host, company_name, comp, name, before, after, now)
+              for comp, name, before, after in transitions])
         c.execute("""
             INSERT INTO health (proxmox_host, company_name, payload_json)
             VALUES (?, ?, ?)
         """, (proxmox_host, company_name, payload_json))
+        row_id = c.lastrowid
+        c.execute("""
+            INSERT OR REPLACE INTO health_state
+              (proxmox_host, company_name, payload_json, state_hash, changed_at, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (proxmox_host, company_name, payload_json, state_hash, now, now))
         db.commit()
 
-        return jsonify({"status": "ok", "id": c.lastrowid}), 201
+        # primeiro snapshot de um host não é "mudança"
+        if old_canonical is not None:
+            _alert_health_transitions(proxmox_host, company_name, transitions)
+
+        return jsonify({"status": "ok", "changed": True, "id": row_id,
+                        "state_hash": state_hash}), 201
 
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
+@app.route('/api/heartbeat', methods=['POST'])
+@require_api_token
+def api_heartbeat():
+    """Sinal de vida leve do coletor. Se o hash de saúde do agente não
+    bater com o do servidor, pede o snapshot completo (resend_health)."""
+    data = request.get_json(silent=True, force=True) or {}
+    proxmox_host = str(data.get('proxmox_host') or '').strip()
+    company_name = str(data.get('company_name') or '').strip()
+    health_hash = str(data.get('health_hash') or '').strip()
+    if not proxmox_host:
+        return jsonify({"error": "Missing 'proxmox_host'"}), 400
+
+    db = get_db()
+    c = db.cursor()
+    try:
+        now = int(time.time())
+        recovered = _touch_host(c, proxmox_host, company_name, now)
+        row = c.execute(
+            "SELECT state_hash FROM health_state WHERE proxmox_host = ?", (proxmox_host,)
+        ).fetchone()
+        if row:
+            c.execute("UPDATE health_state SET last_seen = ? WHERE proxmox_host = ?",
+                      (now, proxmox_host))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+
+    if recovered:
+        send_alert_email(
+            f"Host voltou a responder: {proxmox_host}",
+            f"O coletor voltou a enviar heartbeat.\n\n- Cliente: {company_name}\n- Host: {proxmox_host}"
+        )
+
+    resend = bool(health_hash) and (row is None or row["state_hash"] != health_hash)
+    return jsonify({"status": "ok", "resend_health": resend}), 200
+
+def _stale_after_seconds():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    minutes = 15
+    if 'heartbeat' in config:
+        minutes = config['heartbeat'].getint('stale_after_minutes', 15)
+    return max(1, minutes) * 60
+
+# Host é considerado calado após max(stale_after, N x intervalo observado)
+STALE_INTERVAL_FACTOR = 3
+
+def check_stale_hosts(db, now=None):
+    """Marca como sem heartbeat os hosts calados há mais que o seu limiar
+    (ver STALE_INTERVAL_FACTOR) e alerta uma única vez por queda. Devolve
+    os hosts marcados."""
+    now = now or int(time.time())
+    c = db.cursor()
+    rows = c.execute("""
+        SELECT proxmox_host, company_name, last_seen FROM host_status
+        WHERE stale = 0
+          AND last_seen + MAX(?, ? * COALESCE(report_interval, 0)) < ?
+    """, (_stale_after_seconds(), STALE_INTERVAL_FACTOR, now)).fetchall()
+    for r in rows:
+        c.execute("UPDATE host_status SET stale = 1 WHERE proxmox_host = ?", (r["proxmox_host"],))
+        c.execute("""
+            INSERT INTO health_events
+              (proxmox_host, company_name, component, name, old_status, new_status, at)
+            VALUES (?, ?, 'host', ?, 'ONLINE', 'STALE', ?)
+        """, (r["proxmox_host"], r["company_name"], r["proxmox_host"], now))
+    db.commit()
+    for r in rows:
+        last = datetime.fromtimestamp(r["last_seen"]).strftime('%Y-%m-%d %H:%M:%S')
+        send_alert_email(
+            f"Alerta: host sem heartbeat ({r['proxmox_host']})",
+            "O coletor parou de enviar heartbeat.\n\n"
+            f"- Cliente: {r['company_name']}\n"
+            f"- Host: {r['proxmox_host']}\n"
+            f"- Último contato: {last}"
+        )
+    return [r["proxmox_host"] for r in rows]
+
+def _retention_loop(interval=3600):
+    while True:
+        try:
+            apply_age_retention(get_db())
+        except Exception as e:
+            print(f"[WARN] apply_age_retention falhou: {e}")
+        time.sleep(interval)
+
+# Regras [sla:*] do config + checagem de hosts sem heartbeat na mesma fila
+sla = sla_engine.SlaEngine(get_db, CONFIG_FILE, alert=send_alert_email)
+sla.add_job('stale-hosts', 60, lambda: check_stale_hosts(get_db()))
+
+def _sla_loop():
+    while True:
+        wait = sla_engine.MAX_SLEEP
+        try:
+            sla.tick()
+            wait = (sla.next_due() or time.time() + sla_engine.MAX_SLEEP) - time.time()
+        except Exception as e:
+            print(f"[WARN] SLA tick falhou: {e}")
+        time.sleep(min(sla_engine.MAX_SLEEP, max(1, wait)))
+
+def start_background_jobs():
+    threading.Thread(target=_sla_loop, name='sla', daemon=True).start()
+    threading.Thread(target=_retention_loop, name='retention', daemon=True).start()
+
+@app.route('/api/hosts', methods=['GET'])
+def api_hosts():
+    now = int(time.time())
+    stale_after = _stale_after_seconds()
+    rows = get_db().execute("""
+        SELECT s.proxmox_host, s.company_name, s.last_seen, s.stale, s.report_interval,
+               h.state_hash, h.changed_at
+        FROM host_status s
+        LEFT JOIN health_state h ON h.proxmox_host = s.proxmox_host
+        ORDER BY s.company_name, s.proxmox_host
+    """).fetchall()
+    return jsonify([{
+        "proxmox_host": r["proxmox_host"],
+        "company_name": r["company_name"],
+        "last_seen": r["last_seen"],
+        "seconds_since_seen": now - r["last_seen"],
+        "report_interval": r["report_interval"],
+        "stale": bool(r["stale"]) or (now - r["last_seen"] > max(
+            stale_after, STALE_INTERVAL_FACTOR * (r["report_interval"] or 0))),
+        "health_hash": r["state_hash"],
+        "health_changed_at": r["changed_at"],
+    } for r in rows]), 200
+
+@app.route('/api/health/events', methods=['GET'])
+def api_health_events():
+    limit = max(1, min(500, request.args.get('limit', 100, type=int)))
+    since = request.args.get('since', 0, type=int)
+    host = (request.args.get('host') or '').strip()
+    sql = "SELECT * FROM health_events WHERE at >= ?"
+    params = [since]
+    if host:
+        sql += " AND proxmox_host = ?"
+        params.append(host)
+    sql += " ORDER BY at DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return jsonify([dict(r) for r in get_db().execute(sql, params).fetchall()]), 200
+
+# ----------------------- SLA -----------------------
+@app.route('/api/sla', methods=['GET'])
+def api_sla():
+    """Regras configuradas (com próximo vencimento) e violações abertas."""
+    rows = get_db().execute("""
+        SELECT * FROM sla_violations WHERE resolved_at IS NULL
+        ORDER BY company_name, rule, subject
+    """).fetchall()
+    return jsonify({
+        "rules": sla.describe(),
+        "open": [dict(r) for r in rows],
+    }), 200
+
+@app.route('/api/sla/violations', methods=['GET'])
+def api_sla_violations():
+    limit = max(1, min(1000, request.args.get('limit', 100, type=int)))
+    since = request.args.get('since', 0, type=int)
+    sql = "SELECT * FROM sla_violations WHERE opened_at >= ?"
+    params = [since]
+    for arg, col in (('rule', 'rule'), ('company', 'company_name'), ('host', 'proxmox_host')):
+        if request.args.get(arg):
+            sql += f" AND {col} = ?"
+            params.append(request.args[arg])
+    if request.args.get('open') == '1':
+        sql += " AND resolved_at IS NULL"
+    sql += " ORDER BY opened_at DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return jsonify([dict(r) for r in get_db().execute(sql, params).fetchall()]), 200
+
+@app.route('/api/sla/run', methods=['POST'])
+@require_api_token
+def api_sla_run():
+    """Avalia agora uma regra (?rule=nome) ou todas."""
+    rule = request.args.get('rule')
+    sla.run_now(rule)
+    return jsonify({"status": "ok", "rules": sla.describe()}), 200
+
 @app.route('/health', methods=['GET'])
 def health_list_page():
     db = get_db()
@@ -466,6 +842,52 @@ def health_list_page():
     return "\n".join(html), 200
 
 # ----------------------- REPLICATION API -----------------------
+def _store_replication(cursor, data):
+    """Insere um registro de replicação; devolve (resultado, erro)."""
+    proxmox_host = str(data.get('proxmox_host') or '').strip()
+    if not proxmox_host:
+        return None, "Missing 'proxmox_host'"
+
+    vmid    = str(data.get('vmid') or '').strip()
+    vm_name = str(data.get('vm_name') or '').strip()
+    if not vm_name:
+        inv = _inventory_lookup(cursor, proxmox_host, vmid)
+        if inv:
+            vm_name = inv["name"] or ''
+
+    row = {
+        "company_name": str(data.get('company_name') or '').strip(),
+        "source_node":  str(data.get('source_node') or '').strip(),
+        "target_node":  str(data.get('target_node') or '').strip(),
+        "status":       (data.get('status') or '').upper().strip(),
+        "schedule":     str(data.get('schedule') or '').strip(),
+        "last_sync":    _to_int(data.get('last_sync'), 0),
+        "fail_count":   _to_int(data.get('fail_count'), 0),
+    }
+    cursor.execute("""
+        INSERT OR IGNORE INTO replication
+          (proxmox_host, company_name, vmid, vm_name, source_node, target_node,
+           state, status, schedule, last_sync, duration_sec, fail_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (proxmox_host,
+          row["company_name"],
+          vmid,
+          vm_name,
+          row["source_node"],
+          row["target_node"],
+          str(data.get('state') or '').strip(),
+          row["status"],
+          row["schedule"],
+          row["last_sync"],
+          _to_int(data.get('duration_sec'), 0),
+          row["fail_count"]))
+    if cursor.rowcount == 0:
+        return 'duplicate', None
+    sla_engine.record_replication(
+        cursor, proxmox_host, row["company_name"], vmid, vm_name, row["source_node"],
+        row["target_node"], row["status"], row["schedule"], row["last_sync"], row["fail_count"])
+    return 'inserted', None
+
 @app.route('/api/replication', methods=['POST'])
 @require_api_token
 def api_replication():
@@ -474,44 +896,122 @@ def api_replication():
 
     data = request.get_json(silent=True, force=True) or {}
 
-    def to_int(x, default=0):
-        try:
-            return int(x)
-        except (TypeError, ValueError):
-            return default
+    db = get_db()
+    c = db.cursor()
+    try:
+        result, err = _store_replication(c, data)
+        if err:
+            return jsonify({"error": err}), 400
+        db.commit()
+        return jsonify({"status": "ok"}), 201
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+
+
+# ----------------------- INVENTÁRIO -----------------------
+@app.route('/api/inventory', methods=['POST'])
+@require_api_token
+def api_inventory_update():
+    """Substitui o inventário de um host. O agente só envia quando o hash
+    do snapshot muda, então os registros podem omitir vm_name."""
+    try:
+        data = read_json_body(request.stream, request.headers.get('Content-Encoding'))
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "invalid JSON"}), 400
 
     proxmox_host = str(data.get('proxmox_host') or '').strip()
     company_name = str(data.get('company_name') or '').strip()
-    vmid         = str(data.get('vmid') or '').strip()
-    vm_name      = str(data.get('vm_name') or '').strip()
-    source_node  = str(data.get('source_node') or '').strip()
-    target_node  = str(data.get('target_node') or '').strip()
-    state        = str(data.get('state') or '').strip()
-    status       = (data.get('status') or '').upper().strip()
-    schedule     = str(data.get('schedule') or '').strip()
-    last_sync    = to_int(data.get('last_sync'), 0)
-    duration_sec = to_int(data.get('duration_sec'), 0)
-    fail_count   = to_int(data.get('fail_count'), 0)
-
+    inv_hash     = str(data.get('hash') or '').strip()
+    items        = data.get('items')
     if not proxmox_host:
         return jsonify({"error": "Missing 'proxmox_host'"}), 400
+    if not isinstance(items, list):
+        return jsonify({"error": "Missing 'items' list"}), 400
+
+    rows = []
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        vmid = str(it.get('vmid') or '').strip()
+        if not vmid:
+            continue
+        tags = str(it.get('tags') or '').strip()
+        if tags in ('n/a', 'null'):
+            tags = ''
+        rows.append((proxmox_host, vmid,
+                     str(it.get('node') or '').strip(),
+                     str(it.get('type') or '').strip(),
+                     str(it.get('name') or '').strip(),
+                     tags))
 
     db = get_db()
     c = db.cursor()
     try:
+        current = c.execute(
+            "SELECT hash FROM inventory_hosts WHERE proxmox_host = ?", (proxmox_host,)
+        ).fetchone()
+        if inv_hash and current and current["hash"] == inv_hash:
+            return jsonify({"status": "ok", "changed": False}), 200
+
+        c.execute("DELETE FROM inventory WHERE proxmox_host = ?", (proxmox_host,))
+        c.executemany("""
+            INSERT OR REPLACE INTO inventory (proxmox_host, vmid, node, vm_type, name, tags)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
         c.execute("""
-            INSERT OR IGNORE INTO replication
-              (proxmox_host, company_name, vmid, vm_name, source_node, target_node,
-               state, status, schedule, last_sync, duration_sec, fail_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (proxmox_host, company_name, vmid, vm_name, source_node, target_node,
-              state, status, schedule, last_sync, duration_sec, fail_count))
+            INSERT OR REPLACE INTO inventory_hosts
+              (proxmox_host, company_name, hash, item_count, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (proxmox_host, company_name, inv_hash, len(rows), int(time.time())))
         db.commit()
-        return jsonify({"status": "ok"}), 201
+        return jsonify({"status": "ok", "changed": True, "items": len(rows)}), 200
     except Exception as e:
         db.rollback()
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
+@app.route('/api/inventory', methods=['GET'])
+def api_inventory_list():
+    host = (request.args.get('host') or '').strip()
+    company = request.args.get('company')
+
+    db = get_db()
+    sql = """
+        SELECT h.proxmox_host, h.company_name, h.hash, h.updated_at,
+               i.vmid, i.node, i.vm_type, i.name, i.tags
+        FROM inventory_hosts h
+        JOIN inventory i ON i.proxmox_host = h.proxmox_host
+        WHERE 1=1
+    """
+    params = []
+    if host:
+        sql += " AND h.proxmox_host = ?"
+        params.append(host)
+    if company is not None:
+        sql += " AND IFNULL(h.company_name,'') = ?"
+        params.append(company.strip())
+    sql += " ORDER BY h.proxmox_host, CAST(i.vmid AS INTEGER)"
+
+    hosts = {}
+    for r in db.execute(sql, params).fetchall():
+        h = hosts.setdefault(r["proxmox_host"], {
+            "proxmox_host": r["proxmox_host"],
+            "company_name": r["company_name"],
+            "hash": r["hash"],
+            "updated_at": r["updated_at"],
+            "items": [],
+        })
+        h["items"].append({
+            "vmid": r["vmid"],
+            "node": r["node"],
+            "type": r["vm_type"],
+            "name": r["name"],
+            "tags": r["tags"],
+        })
+    return jsonify(list(hosts.values())), 200
+
 
 # ----------------------- LIMPEZA/VIEW -----------------------
 @app.route('/api/clear_logs', methods=['POST'])
@@ -528,8 +1028,8 @@ def clear_logs():
         end_ts = int(end_dt.timestamp())
         db = get_db()
         c = db.cursor()
-        c.execute("DELETE FROM backups WHERE end_time >= ? AND end_time <= ?", (start_ts, end_ts))
-        deleted_rows = c.rowcount
+        # meses inteiros no intervalo viram DROP TABLE; só as pontas levam DELETE
+        deleted_rows = partitions.delete_range(c, start_ts, end_ts)
         db.commit()
         message = f"{deleted_rows} registro(s) foram excluídos." if deleted_rows > 0 else "Nenhum log encontrado para excluir."
         return jsonify({"message": message}), 200
@@ -542,95 +1042,56 @@ def clear_all_logs():
     try:
         db = get_db()
         c = db.cursor()
-        c.execute("DELETE FROM backups")
-        deleted_rows = c.rowcount
+        deleted_rows = 0
+        for part in partitions.list_partitions(c):
+            deleted_rows += partitions.drop_partition(c, part['month'])
         db.commit()
         message = f"Histórico completo ({deleted_rows} registros) excluído." if deleted_rows > 0 else "O dashboard já estava limpo."
         return jsonify({"message": message}), 200
     except Exception as e:
         return jsonify({"error": f"Ocorreu um erro: {e}"}), 500
 
-@app.route('/', methods=['GET'])
-@app.route('/backups', methods=['GET'])
-def view_backups():
+# ----------------------- PARTIÇÕES (admin) -----------------------
+@app.route('/api/admin/partitions', methods=['GET'])
+@require_api_token
+def admin_partitions():
     db = get_db()
-    c = db.cursor()
-    c.execute('SELECT * FROM backups ORDER BY end_time DESC')
-    backups_by_company = defaultdict(list)
-    all_companies = set()
-
-    for row in c.fetchall():
-        b = dict(row)
-        b['start_time_str'] = datetime.fromtimestamp(b['start_time']).strftime('%Y-%m-%d %H:%M:%S') if b.get('start_time') else 'N/A'
-        b['end_time_str']   = datetime.fromtimestamp(b['end_time']).strftime('%Y-%m-%d %H:%M:%S') if b.get('end_time') else 'N/A'
-        b['duration_str']   = str(timedelta(seconds=b['duration_seconds'])) if b.get('duration_seconds') else '0:00:00'
-        company_name = (b.get('company_name') or '').strip() or "Cliente Indefinido"
-        backups_by_company[company_name].append(b)
-        all_companies.add(company_name)
-
-    sorted_companies = sorted(list(all_companies))
-
-    # Health mais recente
-    health_by_company = defaultdict(dict)
-    rows = db.execute("""
-        SELECT h1.*
-        FROM health h1
-        JOIN (
-          SELECT proxmox_host, MAX(id) AS max_id
-          FROM health
-          GROUP BY proxmox_host
-        ) x ON x.max_id = h1.id
-        ORDER BY h1.company_name, h1.proxmox_host
-    """).fetchall()
-
-    for r in rows:
-        comp = (r['company_name'] or '').strip() or "Cliente Indefinido"
-        try:
-            raw = json.loads(r['payload_json'])
-        except Exception:
-            raw = {}
-
-        raw_pools = raw.get('pools') or raw.get('zfs_pools') or []
-        raw_disks = raw.get('disks') or raw.get('smart') or []
-
-        norm_pools = []
-        for p in raw_pools:
-            if isinstance(p, dict):
-                norm_pools.append({
-                    "name": str(p.get("name", "")),
-                    "status": str(p.get("status", "")).upper()
-                })
+    parts = partitions.partition_stats(db.cursor())
+    return jsonify({
+        "partitions": parts,
+        "total_rows": sum(p["rows"] for p in parts),
+    }), 200
 
-        norm_disks = []
-        for d in raw_disks:
-            if isinstance(d, dict):
-                norm_disks.append({
-                    "name": str(d.get("name", "")),
-                    "smart_ok": bool(d.get("smart_ok", True)),
-                    "temp": d.get("temp")
-                })
+@app.route('/api/admin/partitions/<month>', methods=['DELETE'])
+@require_api_token
+def admin_drop_partition(month):
+    try:
+        partitions.partition_table(month)
+    except ValueError:
+        return jsonify({"error": "month deve ser YYYYMM"}), 400
+    db = get_db()
+    c = db.cursor()
+    if not any(p["month"] == month for p in partitions.list_partitions(c)):
+        return jsonify({"error": "partição não encontrada"}), 404
+    rows = partitions.drop_partition(c, month)
+    db.commit()
+    print(f"[INFO] Partição {month} removida ({rows} registros)")
+    return jsonify({"dropped": month, "rows": rows}), 200
 
-        payload = {
-            "proxmox_host": raw.get("proxmox_host"),
-            "company_name": raw.get("company_name"),
-            "pools": norm_pools,
-            "disks": norm_disks,
-            "zfs_pools": norm_pools,
-            "smart": norm_disks
-        }
+@app.route('/', methods=['GET'])
+@app.route('/backups', methods=['GET'])
+def view_backups():
+    # Só a casca: cards e modal vêm de /api/companies e /api/backups/search
+    return render_template('dashboard.html')
 
-        health_by_company[comp][r['proxmox_host']] = {
-            "received_at": r['received_at'],
-            "payload": payload
-        }
+@app.route('/benchmark', methods=['GET'])
+def benchmark_page():
+    return render_template('benchmark.html')
 
-    return render_template(
-        'dashboard.html',
-        backups=[],
-        all_companies=sorted_companies,
-        backups_by_company=backups_by_company,
-        health_by_company=health_by_company
-    )
+def _company_clause(company):
+    """Filtro por empresa que usa os índices (company_name, ...). Empresa
+    sem nome é gravada como '' (nunca NULL), então basta a igualdade."""
+    return "company_name = ?", (company or '',)
 
 def _row_to_dict(row):
     r = dict(row)
@@ -663,13 +1124,8 @@ def list_companies():
     db.row_factory = sqlite3.Row
     cur = db.cursor()
 
-    # 1) Empresas 
-    companies = [
-        ((r["company_name"] or "").strip())
-        for r in cur.execute(
-            "SELECT DISTINCT company_name FROM backups ORDER BY company_name ASC"
-        ).fetchall()
-    ]
+    # 1) Empresas (catálogo mantido por partitions.insert_backup)
+    companies = [(name or "").strip() for name in partitions.list_companies(cur)]
 
     now = int(time.time())
     since_24h = now - 24 * 3600
@@ -677,13 +1133,9 @@ def list_companies():
     # 2) Health (snapshot) 
     health_rows = cur.execute(
         """
-        SELECT h1.*
-        FROM health h1
-        JOIN (
-          SELECT company_name, proxmox_host, MAX(id) AS max_id
-          FROM health
-          GROUP BY company_name, proxmox_host
-        ) x ON x.max_id = h1.id
+        SELECT proxmox_host, company_name, payload_json,
+               datetime(last_seen, 'unixepoch') AS received_at
+        FROM health_state
         """
     ).fetchall()
 
@@ -727,42 +1179,33 @@ def list_companies():
 
     payload = []
 
+    # fonte das stats 24h: só as partições que cobrem as últimas 24h
+    recent_source = partitions.union_source(cur, since=since_24h)
+
     for c in companies:
-        # 4) Último update 
-        last = cur.execute(
-            "SELECT end_time FROM backups WHERE IFNULL(company_name,'')=? ORDER BY end_time DESC LIMIT 1",
-            (c,),
-        ).fetchone()
+        # 4) Recentes (limit), da partição mais nova para a mais antiga
+        company_sql, company_params = _company_clause(c)
+        rows = partitions.query_newest(cur, company_sql, company_params, limit)
+        recent = [_row_to_dict(r) for r in rows]
 
-        last_update = int(last["end_time"]) if last and last["end_time"] is not None else None
+        # 5) Último update
+        last_update = int(rows[0]["end_time"]) if rows and rows[0]["end_time"] is not None else None
         last_update_str = (
             datetime.fromtimestamp(last_update).strftime("%Y-%m-%d %H:%M:%S")
             if last_update else None
         )
 
-        # 5) Recentes (limit)
-        rows = cur.execute(
-            """
-            SELECT * FROM backups
-            WHERE IFNULL(company_name,'')=?
-            ORDER BY end_time DESC
-            LIMIT ?
-            """,
-            (c, limit),
-        ).fetchall()
-        recent = [_row_to_dict(r) for r in rows]
-
         # 6) Stats 24h
         s24 = cur.execute(
-            """
+            f"""
             SELECT
                SUM(CASE WHEN status='SUCCESS' THEN 1 ELSE 0 END) AS ok,
                SUM(CASE WHEN status!='SUCCESS' THEN 1 ELSE 0 END) AS fail,
                COUNT(*) AS total
-            FROM backups
-            WHERE IFNULL(company_name,'')=? AND end_time>=?
+            FROM {recent_source}
+            WHERE {company_sql} AND end_time>=?
             """,
-            (c, since_24h),
+            (*company_params, since_24h),
         ).fetchone()
 
         stats_24h = {
@@ -838,20 +1281,16 @@ def company_recent(company):
     db = get_db()
     db.row_factory = sqlite3.Row
     
-    # Obter o total de backups para o cliente para calcular o número total de páginas
-    total_backups_cursor = db.execute(
-        "SELECT COUNT(*) FROM backups WHERE company_name=?",
-        (company,)
-    )
-    total_backups = total_backups_cursor.fetchone()[0]
-
-    rows = db.execute(
-        """SELECT * FROM backups
-           WHERE company_name=?
-           ORDER BY end_time DESC
-           LIMIT ? OFFSET ?""",
-        (company, per_page, offset)
-    ).fetchall()
+    # Total em cache: não refaz o COUNT(*) a cada página
+    company_sql, company_params = _company_clause(company)
+    total_backups, _ = cached_value(
+        ('company_total', company), COUNT_CACHE_SECONDS,
+        lambda: partitions.count(db.cursor(), company_sql, company_params))
+
+    # da partição mais nova para a mais antiga; as inteiras antes da página
+    # são puladas pelo COUNT(*) no índice
+    rows = partitions.query_newest(
+        db.cursor(), company_sql, company_params, per_page, offset=offset)
     
     backups_data = [_row_to_dict(r) for r in rows]
 
@@ -865,6 +1304,171 @@ def company_recent(company):
         }
     }), 200
 
+# ----------------------- BUSCA -----------------------
+SEARCH_MAX_LIMIT = 200
+
+@app.route("/api/backups/search", methods=["GET"])
+def search_backups():
+    """Busca paginada por keyset em (end_time, id), do mais recente ao mais antigo.
+
+    Filtros iguais aos da exportação (company, vmid, host, vm_name
+    (prefixo), status, storage, since/until/days). A próxima página vem de
+    cursor=<next_cursor>; o total é contado por partição e fica em cache
+    por COUNT_CACHE_SECONDS (total_cached indica se veio do cache).
+    """
+    args = request.args
+    limit = max(1, min(args.get("limit", 20, type=int), SEARCH_MAX_LIMIT))
+    try:
+        where, params, since, until = _backup_filters(args)
+    except ValueError:
+        return jsonify({"error": "since/until devem ser epoch ou YYYY-MM-DD; days inteiro"}), 400
+
+    # página: o prefixo de vm_name é testado na varredura por end_time, que
+    # para no LIMIT ("+" tira o índice de vm_name do plano, que ordenaria
+    # todas as linhas do prefixo); o total usa o índice
+    page_where = where.replace(_VM_NAME_PREFIX_SQL, "+" + _VM_NAME_PREFIX_SQL)
+    page_params, page_until = list(params), until
+    cursor_arg = args.get("cursor")
+    if cursor_arg:
+        try:
+            c_end, c_id = (int(x) for x in cursor_arg.split(":", 1))
+        except ValueError:
+            return jsonify({"error": "cursor inválido"}), 400
+        page_where += " AND (end_time, id) < (?, ?)"
+        page_params += [c_end, c_id]
+        page_until = c_end if until is None else min(until, c_end)
+
+    db = get_db()
+    cur = db.cursor()
+    rows = partitions.query_newest(cur, page_where, page_params, limit + 1,
+                                   since=since, until=page_until)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f"{rows[-1]['end_time']}:{rows[-1]['id']}" if has_more else None
+
+    total, total_cached = None, False
+    if args.get("with_total", "1") != "0":
+        total, total_cached = cached_value(
+            ('search_total', where, tuple(params)), COUNT_CACHE_SECONDS,
+            lambda: partitions.count(cur, where, params, since, until))
+
+    return jsonify({
+        "backups": [_row_to_dict(r) for r in rows],
+        "next_cursor": next_cursor,
+        "limit": limit,
+        "total": total,
+        "total_cached": total_cached,
+    }), 200
+
+# ----------------------- EXPORTAÇÃO -----------------------
+EXPORT_CHUNK_ROWS = 1000
+
+def _parse_ts(value, end_of_day=False):
+    """Epoch ou YYYY-MM-DD (hora local, como em clear_logs); None se vazio."""
+    if value in (None, ''):
+        return None
+    if str(value).isdigit():
+        return int(value)
+    d = datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        d = datetime.combine(d.date(), dtime.max)
+    return int(d.timestamp())
+
+_VM_NAME_PREFIX_SQL = "vm_name LIKE ? ESCAPE '\\'"
+
+def _backup_filters(args):
+    """Filtros comuns de exportação/busca -> (where, params, since, until).
+    ValueError se since/until/days forem inválidos."""
+    since = _parse_ts(args.get('since'))
+    until = _parse_ts(args.get('until'), end_of_day=True)
+    if args.get('days'):
+        # alinhado ao bucket do cache: a chave do total em cache inclui since
+        now = int(time.time())
+        since = now - now % COUNT_CACHE_SECONDS - int(args['days']) * 86400
+
+    where, params = ["1=1"], []
+    if args.get('company') is not None:
+        company_sql, company_params = _company_clause(args['company'])
+        where.append(company_sql)
+        params.extend(company_params)
+    for arg, col in (('host', 'proxmox_host'), ('vmid', 'vmid'), ('storage', 'storage_target')):
+        if args.get(arg):
+            where.append(f"{col} = ?")
+            params.append(args[arg])
+    if args.get('status'):
+        where.append("status = ?")
+        params.append(args['status'].upper())
+    if args.get('vm_name'):
+        prefix = args['vm_name'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where.append(_VM_NAME_PREFIX_SQL)
+        params.append(prefix + '%')
+    if since is not None:
+        where.append("end_time >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("end_time <= ?")
+        params.append(until)
+    return ' AND '.join(where), params, since, until
+
+@app.route('/api/export/backups', methods=['GET'])
+@require_api_token
+def export_backups():
+    """Exporta o histórico filtrado em NDJSON (padrão) ou CSV, em streaming.
+
+    Filtros: company, host, vmid, vm_name (prefixo), status, storage,
+    since/until (epoch ou YYYY-MM-DD) ou days. gzip=1 devolve o arquivo comprimido.
+    """
+    args = request.args
+    fmt = (args.get('format') or 'ndjson').lower()
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format deve ser ndjson ou csv"}), 400
+    try:
+        where, params, since, until = _backup_filters(args)
+    except ValueError:
+        return jsonify({"error": "since/until devem ser epoch ou YYYY-MM-DD; days inteiro"}), 400
+    use_gzip = args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    def encode(rows):
+        if fmt == 'csv':
+            buf = io.StringIO()
+            csv.writer(buf).writerows(tuple(r) for r in rows)
+            return buf.getvalue().encode('utf-8')
+        return ''.join(json.dumps(dict(r), ensure_ascii=False, separators=(',', ':')) + '\n'
+                       for r in rows).encode('utf-8')
+
+    def generate():
+        db = get_db()
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        try:
+            out = []
+            if fmt == 'csv':
+                out.append((','.join(partitions.BACKUP_COLUMNS) + '\r\n').encode())
+            for rows in partitions.iter_chunks(db.cursor(), where, params,
+                                               since, until, EXPORT_CHUNK_ROWS):
+                out.append(encode(rows))
+                data = b''.join(out)
+                out = []
+                if gz:
+                    data = gz.compress(data)
+                if data:
+                    yield data
+            data = b''.join(out)
+            if gz:
+                data = gz.compress(data) + gz.flush()
+            if data:
+                yield data
+        finally:
+            db.close()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"backups-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    if use_gzip:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    })
+
 if __name__ == '__main__':
     init_db()
+    start_background_jobs()
     app.run(host='0.0.0.0', port=5000)
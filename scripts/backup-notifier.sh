@@ -1,4 +1,6 @@
 #!/usr/bin/env bash
+# Legado (cron). Instalações novas usam o coletor unificado: python3 -m collector
+# (ver collector/ e config/collector.ini.example).
 set -euo pipefail
 
 ################################
@@ -6,12 +8,14 @@ set -euo pipefail
 ################################
 NOME_EMPRESA="Proxmox Matheus"
 DEBIAN_API_URL="http://192.168.1.52:5000/api/backup"
+INGEST_URL="${DEBIAN_API_URL%/api/*}/api/ingest"
+INVENTORY_URL="${DEBIAN_API_URL%/api/*}/api/inventory"
 PROXMOX_HOST="$(hostname -s)"
 
 LOG_DIR="/var/log/pve/tasks"
 STATE_FILE="/var/tmp/backup_notifier_last_timestamp.state"
 CURL_TIMEOUT=15
-USER_AGENT="backup-notifier/1.3-universal"
+USER_AGENT="backup-notifier/1.4-spool"
 
 DEBUG="${DEBUG:-0}"
 FORCE_RESCAN="${FORCE_RESCAN:-0}"
@@ -27,6 +31,9 @@ for arg in "${@:-}"; do
   esac
 done
 
+source "$(dirname "$(readlink -f "$0")")/spool-lib.sh"
+source "$(dirname "$(readlink -f "$0")")/inventory-lib.sh"
+
 info(){ printf "[backup-notifier] %s\n" "$*" ; }
 dbg(){ [[ "$DEBUG" -eq 1 ]] && printf "[debug] %s\n" "$*" || true; }
 
@@ -45,56 +52,6 @@ info "Empresa: $NOME_EMPRESA | Host: $PROXMOX_HOST"
 info "Último timestamp processado: $LAST_TS"
 [[ "$FORCE_RESCAN" -eq 1 ]] && info "# RESCAN habilitado."
 
-################################
-# VM map
-################################
-build_vm_map () {
-  pvesh get /cluster/resources --output-format json 2>/dev/null \
-  | jq -r '
-    .[] | select(.type=="qemu" or .type=="lxc")
-    | [(.vmid|tostring), .node, .type, (.tags // ""), (.name // "")]
-    | @tsv
-  ' || true
-}
-
-lookup_vm_line () {
-  local vmid="$1"
-  awk -v id="$vmid" -F'\t' '$1==id{print; exit;}' <<< "$VM_MAP"
-}
-
-fetch_tags_from_config () {
-  local node="$1" vtype="$2" vmid="$3"
-  local path
-  case "$vtype" in
-    qemu) path="/nodes/${node}/qemu/${vmid}/config" ;;
-    lxc)  path="/nodes/${node}/lxc/${vmid}/config"  ;;
-    *)    echo "" ; return 0 ;;
-  esac
-  pvesh get "$path" 2>/dev/null | jq -r '.tags // empty' || true
-}
-
-get_vm_display_name () {
-  local vmid="$1"
-  local line node vtype tags name
-  line="$(lookup_vm_line "$vmid")" || true
-  node="$(cut -f2 <<<"$line")"
-  vtype="$(cut -f3 <<<"$line")"
-  tags="$(cut -f4 <<<"$line")"
-  name="$(cut -f5 <<<"$line")"
-
-  if [[ -z "${tags:-}" || "$tags" == "n/a" || "$tags" == "null" ]]; then
-    tags="$(fetch_tags_from_config "$node" "$vtype" "$vmid")"
-  fi
-
-  if [[ -n "${tags:-}" ]]; then
-    echo "$tags"
-  elif [[ -n "${name:-}" ]]; then
-    echo "$name"
-  else
-    echo ""
-  fi
-}
-
 ################################
 # Conversões
 ################################
@@ -274,27 +231,15 @@ extract_vm_name_from_block() {
 }
 
 ################################
-# Envio do registro
+# Envio do registro (via spool local)
 ################################
 send_record () {
-  local json="$1" tmp_body http_code
-  tmp_body="$(mktemp)"
-  http_code="$(
-    curl -sS -m "$CURL_TIMEOUT" \
-      -H "$USER_AGENT" \
-      -H 'Content-Type: application/json' \
-      -o "$tmp_body" \
-      -w '%{http_code}' \
-      -X POST "$DEBIAN_API_URL" \
-      -d "$json" || echo "000"
-  )"
-
-  if [[ "$http_code" != "201" ]]; then
-    dbg "ENVIO FALHOU (HTTP $http_code): $(cat "$tmp_body" || true)"
+  local json="$1"
+  if spool_append "$json"; then
+    dbg "registro gravado no spool"
   else
-    dbg "enviado (HTTP $http_code): $(cat "$tmp_body" || true)"
+    dbg "FALHA ao gravar no spool: $json"
   fi
-  rm -f "$tmp_body"
 }
 
 ################################
@@ -342,11 +287,14 @@ process_log_file(){
     local BLOCK; BLOCK="$(get_block_for_vmid "$VMID")"
     [[ -z "$BLOCK" ]] && continue
 
-    local VM_NAME; VM_NAME="$(get_vm_display_name "$VMID")"
-       if [[ -z "$VM_NAME" || "$VM_NAME" == "$VMID" ]]; then
- 	 n_from_log="$(extract_vm_name_from_block "$BLOCK")"
-  	[[ -n "$n_from_log" ]] && VM_NAME="$n_from_log"
-       fi
+    local VM_NAME; VM_NAME="$(inventory_display_name "$VMID")"
+    if [[ -z "$VM_NAME" || "$VM_NAME" == "$VMID" ]]; then
+      n_from_log="$(extract_vm_name_from_block "$BLOCK")"
+      [[ -n "$n_from_log" ]] && VM_NAME="$n_from_log"
+    elif [[ "$INVENTORY_PUBLISHED" -eq 1 ]]; then
+      # inventário já publicado: o servidor resolve o nome
+      VM_NAME=""
+    fi
     local STATUS;    STATUS="$(extract_status "$BLOCK")"
     read -r START_EPOCH END_EPOCH <<<"$(extract_times_from_block "$BLOCK")"
 
@@ -376,10 +324,10 @@ process_log_file(){
         end_time: $end_time,
         total_size_bytes: $total_size_bytes,
         written_size_bytes: $written_size_bytes
-      }'
+      } | if .vm_name == "" then del(.vm_name) else . end'
     )"
 
-    dbg "POST -> $DEBIAN_API_URL : $(echo "$JSON" | jq -c '.')"
+    dbg "spool -> $INGEST_URL : $(echo "$JSON" | jq -c '.')"
     send_record "$JSON"
   done
 
@@ -391,7 +339,8 @@ process_log_file(){
 ################################
 # MAIN
 ################################
-VM_MAP="$(build_vm_map || true)"
+inventory_load
+inventory_publish "$NOME_EMPRESA" "$PROXMOX_HOST" || true
 
 AGE_EXPR=()
 if [[ -n "${MAX_AGE_DAYS:-}" && "$MAX_AGE_DAYS" =~ ^[0-9]+$ ]]; then
@@ -405,4 +354,7 @@ find "$LOG_DIR" -type f \( -name '*vzdump*' -o -name '*backup*' \) "${AGE_EXPR[@
 
 echo "$RUN_MAX_TS" > "$STATE_FILE"
 
+# Envia o spool (inclui sobras de execuções anteriores)
+spool_flush || true
+
 exit 0
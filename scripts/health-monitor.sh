@@ -1,4 +1,6 @@
 #!/bin/bash
+# Legado (cron). Instalações novas usam o coletor unificado: python3 -m collector
+# (ver collector/ e config/collector.ini.example).
 
 # --- CONFIGURAÇÃO DO CLIENTE ---
 NOME_EMPRESA="Proxmox Matheus"
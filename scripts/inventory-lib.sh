@@ -0,0 +1,143 @@
+#!/usr/bin/env bash
+# Inventário de VMs/CTs compartilhado pelos notifiers.
+#
+# Uso:
+#   source "$(dirname "$0")/inventory-lib.sh"
+#   inventory_load                  # carrega o snapshot em memória
+#   inventory_display_name <vmid>   # tags ou nome (regra do dashboard)
+#   inventory_name <vmid>           # só o nome
+#   inventory_publish               # envia ao servidor se mudou
+#
+# O snapshot ($INVENTORY_FILE, TSV: vmid node type tags name) é gerado por
+# um único "pvesh get /cluster/resources"; as configs das VMs sem tags são
+# buscadas uma vez por refresh (em paralelo), não uma vez por registro.
+# Snapshot vencido continua sendo usado enquanto o refresh roda em
+# segundo plano; só o primeiro uso (sem snapshot) espera pelo pvesh.
+
+INVENTORY_DIR="${INVENTORY_DIR:-/var/cache/proxmox-monitor}"
+INVENTORY_FILE="${INVENTORY_FILE:-$INVENTORY_DIR/inventory.tsv}"
+INVENTORY_TTL="${INVENTORY_TTL:-600}"                 # s
+INVENTORY_CONFIG_JOBS="${INVENTORY_CONFIG_JOBS:-4}"   # pvesh paralelos
+INVENTORY_PUBLISHED=0
+
+declare -A INV_NODE=() INV_TYPE=() INV_TAGS=() INV_NAME=()
+
+_inv_log(){ printf "[inventory] %s\n" "$*" >&2 ; }
+
+# Gera o snapshot novo de forma atômica
+inventory_refresh(){
+  mkdir -p "$INVENTORY_DIR"
+  local tmp="$INVENTORY_FILE.tmp.$$" cfg="$INVENTORY_FILE.cfg.$$"
+  pvesh get /cluster/resources --output-format json 2>/dev/null \
+  | jq -r '
+      .[] | select(.type=="qemu" or .type=="lxc")
+      | [(.vmid|tostring), .node, .type, (.tags // ""), (.name // "")]
+      | @tsv
+    ' > "$tmp" || { rm -f "$tmp"; _inv_log "pvesh falhou; mantendo snapshot anterior"; return 1; }
+
+  # Busca em lote as tags que o /cluster/resources não trouxe
+  awk -F'\t' '$4=="" || $4=="n/a" || $4=="null" {print $1, $2, $3}' "$tmp" \
+  | xargs -r -n3 -P "$INVENTORY_CONFIG_JOBS" bash -c '
+      tags="$(pvesh get "/nodes/$2/$3/$1/config" --output-format json 2>/dev/null | jq -r ".tags // empty" || true)"
+      [[ -n "$tags" ]] && printf "%s\t%s\n" "$1" "$tags"
+      exit 0
+    ' _ > "$cfg" || true
+
+  if [[ -s "$cfg" ]]; then
+    awk -F'\t' -v OFS='\t' 'NR==FNR {t[$1]=$2; next} ($1 in t) {$4=t[$1]} {print}' "$cfg" "$tmp" > "$tmp.2" \
+      && mv "$tmp.2" "$tmp"
+  fi
+  rm -f "$cfg"
+  mv "$tmp" "$INVENTORY_FILE"
+}
+
+_inv_refresh_background(){
+  (
+    exec 7>>"$INVENTORY_DIR/.refresh.lock"
+    flock -n 7 || exit 0
+    inventory_refresh
+  ) >/dev/null 2>&1 &
+  disown 2>/dev/null || true
+}
+
+inventory_load(){
+  local now mtime vmid node vtype tags name
+  mkdir -p "$INVENTORY_DIR"
+  if [[ ! -s "$INVENTORY_FILE" ]]; then
+    inventory_refresh || true
+  else
+    now="$(date +%s)"
+    mtime="$(stat -c %Y "$INVENTORY_FILE" 2>/dev/null || echo 0)"
+    if (( now - mtime > INVENTORY_TTL )); then
+      _inv_refresh_background
+    fi
+  fi
+
+  INV_NODE=(); INV_TYPE=(); INV_TAGS=(); INV_NAME=()
+  [[ -f "$INVENTORY_FILE" ]] || return 0
+  # tab é "espaço" para o read (campos vazios colapsariam e o nome das
+  # VMs sem tags cairia em $tags); lê com separador \x1f
+  while IFS=$'\x1f' read -r vmid node vtype tags name; do
+    [[ -n "$vmid" ]] || continue
+    INV_NODE[$vmid]="$node"
+    INV_TYPE[$vmid]="$vtype"
+    [[ "$tags" == "n/a" || "$tags" == "null" ]] && tags=""
+    INV_TAGS[$vmid]="$tags"
+    INV_NAME[$vmid]="$name"
+  done < <(tr '\t' '\037' < "$INVENTORY_FILE")
+}
+
+inventory_has(){ [[ -n "${INV_TYPE[$1]+x}" ]]; }
+
+inventory_name(){ printf '%s\n' "${INV_NAME[$1]:-}"; }
+
+inventory_display_name(){
+  local vmid="$1"
+  if [[ -n "${INV_TAGS[$vmid]:-}" ]]; then
+    printf '%s\n' "${INV_TAGS[$vmid]}"
+  else
+    printf '%s\n' "${INV_NAME[$vmid]:-}"
+  fi
+}
+
+# Envia o inventário para $INVENTORY_URL só quando o conteúdo mudou.
+# Depois de publicado, os registros podem omitir vm_name: o servidor
+# resolve o nome pelo inventário.
+inventory_publish(){
+  local company="$1" host="$2" hash sent_file code body
+  [[ -s "$INVENTORY_FILE" && -n "${INVENTORY_URL:-}" ]] || return 0
+  hash="$(sha256sum "$INVENTORY_FILE" | awk '{print $1}')"
+  sent_file="$INVENTORY_DIR/published.$(printf '%s' "${INVENTORY_URL#*://}" | tr -c 'A-Za-z0-9._-' '_')"
+  if [[ "$(cat "$sent_file" 2>/dev/null || true)" == "$hash" ]]; then
+    INVENTORY_PUBLISHED=1
+    return 0
+  fi
+
+  body="$(jq -R -s -c \
+    --arg host "$host" --arg company "$company" --arg hash "$hash" '
+      {
+        proxmox_host: $host,
+        company_name: $company,
+        hash: $hash,
+        items: [ split("\n")[] | select(length>0) | split("\t")
+                 | {vmid: .[0], node: .[1], type: .[2], tags: (.[3] // ""), name: (.[4] // "")} ]
+      }' "$INVENTORY_FILE")" || return 1
+
+  local -a auth=()
+  [[ -n "${API_TOKEN:-}" ]] && auth=(-H "Authorization: Bearer $API_TOKEN")
+  code="$(printf '%s' "$body" | gzip -c | curl -sS -m "${SPOOL_CURL_TIMEOUT:-60}" \
+    -H "User-Agent: ${USER_AGENT:-proxmox-monitor-inventory}" \
+    -H 'Content-Type: application/json' \
+    -H 'Content-Encoding: gzip' \
+    "${auth[@]}" \
+    -o /dev/null -w '%{http_code}' \
+    -X POST --data-binary @- "$INVENTORY_URL" 2>/dev/null || echo 000)"
+
+  if [[ "$code" =~ ^2 ]]; then
+    echo "$hash" > "$sent_file"
+    INVENTORY_PUBLISHED=1
+  else
+    _inv_log "publicação do inventário falhou (HTTP $code)"
+    return 1
+  fi
+}
@@ -1,4 +1,6 @@
 #!/usr/bin/env bash
+# Legado (cron). Instalações novas usam o coletor unificado: python3 -m collector
+# (ver collector/ e config/collector.ini.example).
 set -euo pipefail
 
 export PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin
@@ -7,11 +9,16 @@ export LANG=C
 # ==== CONFIGURE AQUI ====
 COMPANY_NAME="Proxmox Paulo Weber"        # nome que aparece no dashboard
 API_URL="http://177.39.36.12:5000/api/replication"
+INGEST_URL="${API_URL%/api/*}/api/ingest"
+INVENTORY_URL="${API_URL%/api/*}/api/inventory"
 PROXMOX_HOST="$(hostname -s)"               
 CURL_TIMEOUT=12
-USER_AGENT="replication-notifier/1.1"
+USER_AGENT="replication-notifier/1.2-spool"
 # ========================
 
+source "$(dirname "$(readlink -f "$0")")/spool-lib.sh"
+source "$(dirname "$(readlink -f "$0")")/inventory-lib.sh"
+
 have() { command -v "$1" >/dev/null 2>&1; }
 
 if ! have pvesr || ! have jq || ! have curl; then
@@ -19,6 +26,19 @@ if ! have pvesr || ! have jq || ! have curl; then
   exit 1
 fi
 
+inventory_load
+inventory_publish "$COMPANY_NAME" "$PROXMOX_HOST" || true
+
+# Schedule por job: o pvesr status não mostra, vem de /cluster/replication
+# (job sem schedule explícito usa o padrão do Proxmox, */15)
+declare -A SCHEDULES=()
+if have pvesh; then
+  while IFS=$'\t' read -r job sched; do
+    [[ -n "$job" ]] && SCHEDULES[$job]="$sched"
+  done < <(pvesh get /cluster/replication --output-format json 2>/dev/null \
+             | jq -r '.[] | [.id, (.schedule // "*/15")] | @tsv' 2>/dev/null || true)
+fi
+
 pvesr status | awk 'NR>1 && NF>=8 {print}' | while read -r JOB ENABLED TARGET LASTSYNC NEXTSYNC DURATION FAILCOUNT STATE REST; do
   VMID="${JOB%%-*}"
 
@@ -39,9 +59,13 @@ pvesr status | awk 'NR>1 && NF>=8 {print}' | while read -r JOB ENABLED TARGET LA
     *)               STATUS="ERROR" ;;
   esac
 
-  VM_NAME="$(qm config "$VMID" 2>/dev/null | awk -F': ' '/^name:/ {print $2; exit}')"
+  # Nome vem do inventário; já publicado, o servidor resolve sozinho
+  VM_NAME=""
+  if [[ "$INVENTORY_PUBLISHED" -ne 1 ]]; then
+    VM_NAME="${INV_NAME[$VMID]:-}"
+  fi
 
-  SCHEDULE=""
+  SCHEDULE="${SCHEDULES[$JOB]:-}"
 
   JSON=$(/usr/bin/jq -n \
     --arg host "$PROXMOX_HOST" \
@@ -57,6 +81,7 @@ pvesr status | awk 'NR>1 && NF>=8 {print}' | while read -r JOB ENABLED TARGET LA
     --argjson dur "$DUR_SEC" \
     --argjson fail "${FAILCOUNT:-0}" \
     '{
+      kind: "replication",
       proxmox_host: $host,
       company_name: $company,
       vmid: $vmid,
@@ -69,16 +94,11 @@ pvesr status | awk 'NR>1 && NF>=8 {print}' | while read -r JOB ENABLED TARGET LA
       last_sync: $last_sync,
       duration_sec: $dur,
       fail_count: $fail
-    }')
-
-  CODE=$(curl -sS -m "$CURL_TIMEOUT" \
-    -H "User-Agent: $USER_AGENT" \
-    -H "Content-Type: application/json" \
-    -o /dev/null -w '%{http_code}' \
-    -X POST "$API_URL" \
-    -d "$JSON" || true)
+    } | if .vm_name == "" then del(.vm_name) else . end')
 
-  if [[ "$CODE" != "201" && "$CODE" != "200" ]]; then
-    echo "WARN: envio replication job=$JOB HTTP $CODE" >&2
+  if ! spool_append "$JSON"; then
+    echo "WARN: falha ao gravar replication job=$JOB no spool" >&2
   fi
 done
+
+spool_flush || true
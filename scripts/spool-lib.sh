@@ -0,0 +1,151 @@
+#!/usr/bin/env bash
+# Spool local durável (NDJSON) compartilhado pelos notifiers.
+#
+# Uso (depois de definir INGEST_URL e, opcionalmente, API_TOKEN):
+#   source "$(dirname "$0")/spool-lib.sh"
+#   spool_append "$JSON"     # grava o registro no disco (nunca faz rede)
+#   spool_flush              # envia o que estiver pendente, se permitido
+#
+# Os registros ficam em $SPOOL_DIR/pending.ndjson até o flush, que os
+# fatia em lotes gzip em $SPOOL_DIR/outbox e envia vários lotes numa só
+# execução do curl (--next reaproveita a mesma conexão keep-alive).
+# Falhas mantêm os lotes no disco e ativam backoff exponencial.
+
+SPOOL_DIR="${SPOOL_DIR:-/var/spool/proxmox-monitor}"
+SPOOL_BATCH_LINES="${SPOOL_BATCH_LINES:-500}"        # registros por lote
+SPOOL_MAX_CHUNKS_PER_RUN="${SPOOL_MAX_CHUNKS_PER_RUN:-20}"
+SPOOL_MIN_INTERVAL="${SPOOL_MIN_INTERVAL:-30}"       # s entre envios ao mesmo host
+SPOOL_BACKOFF_BASE="${SPOOL_BACKOFF_BASE:-30}"       # s
+SPOOL_BACKOFF_MAX="${SPOOL_BACKOFF_MAX:-3600}"       # s
+SPOOL_MAX_BYTES="${SPOOL_MAX_BYTES:-104857600}"      # 100 MiB comprimidos
+SPOOL_CURL_TIMEOUT="${SPOOL_CURL_TIMEOUT:-60}"
+API_TOKEN="${API_TOKEN:-${MONITOR_API_TOKEN:-}}"
+
+_spool_log(){ printf "[spool] %s\n" "$*" >&2 ; }
+
+_spool_init(){
+  mkdir -p "$SPOOL_DIR/outbox"
+  : >> "$SPOOL_DIR/.lock"
+}
+
+# Chave do host de destino (para o limite de taxa por host)
+_spool_host_key(){
+  local h="${INGEST_URL#*://}"
+  h="${h%%/*}"
+  printf '%s' "${h//[^A-Za-z0-9._-]/_}"
+}
+
+spool_append(){
+  local json="$1" line
+  _spool_init
+  line="$(jq -c '.' <<<"$json")" || { _spool_log "registro inválido descartado"; return 1; }
+  (
+    flock -x 9
+    printf '%s\n' "$line" >> "$SPOOL_DIR/pending.ndjson"
+  ) 9>>"$SPOOL_DIR/.lock"
+}
+
+# Move pending.ndjson para o outbox em lotes gzip de SPOOL_BATCH_LINES
+_spool_seal_pending(){
+  local pending="$SPOOL_DIR/pending.ndjson" stamp part
+  [[ -s "$pending" ]] || return 0
+  stamp="$(date +%s)-$$"
+  mv "$pending" "$SPOOL_DIR/outbox/.sealing-$stamp"
+  split -l "$SPOOL_BATCH_LINES" -d -a 5 \
+    "$SPOOL_DIR/outbox/.sealing-$stamp" "$SPOOL_DIR/outbox/.part-$stamp-"
+  for part in "$SPOOL_DIR/outbox/.part-$stamp-"*; do
+    gzip -c "$part" > "$part.gz.tmp" && sync "$part.gz.tmp" \
+      && mv "$part.gz.tmp" "$SPOOL_DIR/outbox/batch-${part##*/.part-}.ndjson.gz"
+    rm -f "$part"
+  done
+  rm -f "$SPOOL_DIR/outbox/.sealing-$stamp"
+}
+
+# Descarta os lotes mais antigos se o outbox passar de SPOOL_MAX_BYTES
+_spool_enforce_cap(){
+  local total f sz
+  total="$(du -sb "$SPOOL_DIR/outbox" 2>/dev/null | awk '{print $1}')"
+  [[ -n "$total" ]] || return 0
+  for f in $(ls -1 "$SPOOL_DIR/outbox"/batch-*.ndjson.gz 2>/dev/null | sort); do
+    (( total <= SPOOL_MAX_BYTES )) && break
+    sz="$(stat -c %s "$f" 2>/dev/null || echo 0)"
+    _spool_log "spool cheio; descartando lote antigo ${f##*/}"
+    rm -f "$f"
+    total=$(( total - sz ))
+  done
+}
+
+_spool_upload(){
+  local now state_backoff state_rate fails next_ts last_ts delay
+  local -a files args codes
+  now="$(date +%s)"
+  state_backoff="$SPOOL_DIR/backoff.$(_spool_host_key)"
+  state_rate="$SPOOL_DIR/last_upload.$(_spool_host_key)"
+
+  read -r fails next_ts 2>/dev/null < "$state_backoff" || true
+  fails="${fails:-0}"; next_ts="${next_ts:-0}"
+  if (( now < next_ts )); then
+    _spool_log "backoff ativo (falhas=$fails); próximo envio em $(( next_ts - now ))s"
+    return 0
+  fi
+
+  last_ts="$(cat "$state_rate" 2>/dev/null || echo 0)"
+  if (( now - last_ts < SPOOL_MIN_INTERVAL )); then
+    return 0
+  fi
+
+  mapfile -t files < <(ls -1 "$SPOOL_DIR/outbox"/batch-*.ndjson.gz 2>/dev/null | sort | head -n "$SPOOL_MAX_CHUNKS_PER_RUN")
+  (( ${#files[@]} > 0 )) || return 0
+
+  local f first=1
+  for f in "${files[@]}"; do
+    (( first )) || args+=(--next)
+    first=0
+    args+=(-sS -m "$SPOOL_CURL_TIMEOUT" -o /dev/null -w '%{http_code}\n'
+           -H "User-Agent: ${USER_AGENT:-proxmox-monitor-spool}"
+           -H 'Content-Type: application/x-ndjson'
+           -H 'Content-Encoding: gzip')
+    [[ -n "$API_TOKEN" ]] && args+=(-H "Authorization: Bearer $API_TOKEN")
+    args+=(--data-binary "@$f" -X POST "$INGEST_URL")
+  done
+
+  echo "$now" > "$state_rate"
+  mapfile -t codes < <(curl "${args[@]}" 2>/dev/null || true)
+
+  local i sent=0
+  for i in "${!files[@]}"; do
+    if [[ "${codes[$i]:-000}" =~ ^2 ]]; then
+      rm -f "${files[$i]}"
+      sent=$(( sent + 1 ))
+    elif [[ "${codes[$i]:-000}" == "400" ]]; then
+      # lote que o servidor rejeita nunca vai passar: não travar a fila
+      _spool_log "lote rejeitado (HTTP 400), descartando ${files[$i]##*/}"
+      rm -f "${files[$i]}"
+    else
+      fails=$(( fails + 1 ))
+      delay=$(( SPOOL_BACKOFF_BASE * (1 << (fails > 16 ? 16 : fails - 1)) ))
+      (( delay > SPOOL_BACKOFF_MAX )) && delay="$SPOOL_BACKOFF_MAX"
+      delay=$(( delay + RANDOM % (delay / 4 + 1) ))
+      echo "$fails $(( now + delay ))" > "$state_backoff"
+      _spool_log "envio falhou (HTTP ${codes[$i]:-000}); $sent lote(s) enviados, nova tentativa em ${delay}s"
+      return 1
+    fi
+  done
+
+  rm -f "$state_backoff"
+  _spool_log "$sent lote(s) enviados para $INGEST_URL"
+}
+
+spool_flush(){
+  _spool_init
+  (
+    flock -x 9
+    _spool_seal_pending
+    _spool_enforce_cap
+  ) 9>>"$SPOOL_DIR/.lock"
+  # upload fora do lock de escrita; lock próprio evita dois envios simultâneos
+  (
+    flock -n 8 || exit 0
+    _spool_upload
+  ) 8>>"$SPOOL_DIR/.upload.lock"
+}
@@ -0,0 +1,405 @@
+import configparser
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Motor de SLA: regras configuradas em seções [sla:<nome>] do config.ini,
+# avaliadas em agenda. Cada regra tem seu horário de vencimento numa fila
+# de prioridade; um tick só avalia as regras vencidas. A avaliação lê as
+# tabelas de "último estado" (backup_last / replication_last), mantidas a
+# cada registro recebido e indexadas pelo que as regras perguntam, então
+# o custo não depende do tamanho do histórico.
+#
+#   [sla:backup-diario]
+#   type = backup               ; backup | replication
+#   company = *                 ; empresa exata ou * (todas)
+#   vmid = *                    ; backup: VM específica ou *
+#   max_age_hours = 26          ; sem backup OK há mais que isso = violação
+#   check_every_minutes = 15
+#
+#   [sla:replicacao]
+#   type = replication
+#   schedule_factor = 2         ; last_sync mais velho que 2x o schedule (>= 1)
+#   max_age_hours = 2           ; usado quando o schedule não é reconhecido
+
+RULE_TYPES = ('backup', 'replication')
+MAX_SLEEP = 60
+
+
+class Rule:
+    def __init__(self, name, section):
+        self.name = name
+        self.type = section.get('type', 'backup').strip().lower()
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"sla:{name}: type deve ser {' ou '.join(RULE_TYPES)}")
+        self.company = section.get('company', '*').strip()
+        self.vmid = section.get('vmid', '*').strip()
+        self.max_age = int(section.getfloat('max_age_hours', 26) * 3600)
+        # < 1 alertaria antes do próprio schedule (e o índice de deadline supõe >= 1)
+        self.schedule_factor = max(1.0, section.getfloat('schedule_factor', 2.0))
+        self.interval = max(60, section.getint('check_every_minutes', 15) * 60)
+
+    def to_dict(self):
+        return {
+            "name": self.name, "type": self.type, "company": self.company,
+            "vmid": self.vmid, "max_age_hours": self.max_age / 3600,
+            "schedule_factor": self.schedule_factor if self.type == 'replication' else None,
+            "check_every_minutes": self.interval // 60,
+        }
+
+
+def load_rules(config_file):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    rules = []
+    for section in config.sections():
+        if section.lower().startswith('sla:'):
+            try:
+                rules.append(Rule(section[4:].strip(), config[section]))
+            except ValueError as e:
+                print(f"[WARN] Regra de SLA ignorada: {e}")
+    return rules
+
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_WEEK_MINUTES = 7 * 24 * 60
+_SCHEDULE_ALIASES = {
+    'minutely': '*:*', 'hourly': '*:00', 'daily': '00:00', 'weekly': 'mon 00:00',
+}
+# sem dia da semana/hora: o calendário não cabe no ciclo semanal
+_SCHEDULE_LONG = {'monthly': 31 * 86400, 'yearly': 366 * 86400, 'annually': 366 * 86400}
+
+
+def _expand_field(spec, size):
+    """Valores de um campo de calendar event (hora 0-23 ou minuto 0-59):
+    lista com "," de *, N, N..M e passos N/S, */S, N..M/S."""
+    values = set()
+    for item in spec.split(','):
+        base, slash, step = item.partition('/')
+        step = int(step) if slash else 1
+        if base == '*':
+            start, end = 0, size - 1
+        elif '..' in base:
+            start, end = (int(x) for x in base.split('..', 1))
+        else:
+            start = int(base)
+            end = size - 1 if slash else start  # N/S: de N em diante
+        if step < 1 or not 0 <= start <= end < size:
+            raise ValueError(item)
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _expand_weekdays(spec):
+    days = set()
+    for item in spec.split(','):
+        first, _, last = item.partition('..')
+        a = WEEKDAYS.index(first[:3])
+        b = WEEKDAYS.index((last or first)[:3])
+        days.update(d % 7 for d in range(a, a + (b - a) % 7 + 1))
+    return days
+
+
+@functools.lru_cache(maxsize=256)
+def schedule_interval_seconds(schedule):
+    """Maior intervalo entre duas execuções de um schedule do pvesr
+    (calendar event: [dias] [hora:]minuto, com listas, faixas e passos);
+    None se não for reconhecido.
+
+    "mon..fri 22:30" dá 3 dias (sexta -> segunda); "*/15" dá 15 min.
+    """
+    s = (schedule or '').strip().lower()
+    if not s:
+        return None
+    if s in _SCHEDULE_LONG:
+        return _SCHEDULE_LONG[s]
+    parts = _SCHEDULE_ALIASES.get(s, s).split()
+    try:
+        days = set(range(7))
+        if parts and parts[0][0].isalpha():
+            days = _expand_weekdays(parts.pop(0))
+        if len(parts) > 1:
+            return None  # data (ano-mês-dia) não é tratada
+        fields = (parts[0] if parts else '0:00').split(':')
+        if len(fields) == 1:
+            fields = ['*'] + fields  # só o minuto: toda hora
+        if len(fields) not in (2, 3):
+            return None
+        hours = _expand_field(fields[0], 24)
+        minutes = _expand_field(fields[1], 60)
+    except ValueError:
+        return None
+    ticks = sorted(d * 1440 + h * 60 + m for d in days for h in hours for m in minutes)
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])] + [ticks[0] + _WEEK_MINUTES - ticks[-1]]
+    return max(gaps) * 60
+
+
+# ----------------------------------------------------------------------------
+# Último estado: chamado a cada registro inserido
+
+def record_backup(cursor, host, vmid, company, vm_name, status, end_time):
+    if not host or not vmid:
+        return
+    success = end_time if status == 'SUCCESS' else 0
+    cursor.execute('''
+        INSERT INTO backup_last
+          (proxmox_host, vmid, company_name, vm_name, last_end, last_status, last_success)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(proxmox_host, vmid) DO UPDATE SET
+          company_name = COALESCE(excluded.company_name, company_name),
+          vm_name      = COALESCE(excluded.vm_name, vm_name),
+          last_status  = CASE WHEN excluded.last_end >= last_end
+                              THEN excluded.last_status ELSE last_status END,
+          last_end     = MAX(last_end, excluded.last_end),
+          last_success = MAX(last_success, excluded.last_success)
+    ''', (host, str(vmid), company, vm_name, end_time, status, success))
+
+
+def record_replication(cursor, host, company, vmid, vm_name, source, target,
+                       status, schedule, last_sync, fail_count):
+    if not host or not vmid:
+        return
+    cursor.execute('''
+        INSERT INTO replication_last
+          (proxmox_host, vmid, source_node, target_node, company_name, vm_name,
+           status, schedule, interval_sec, last_sync, fail_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(proxmox_host, vmid, source_node, target_node) DO UPDATE SET
+          company_name = excluded.company_name,
+          vm_name      = COALESCE(NULLIF(excluded.vm_name, ''), vm_name),
+          status       = excluded.status,
+          schedule     = excluded.schedule,
+          interval_sec = excluded.interval_sec,
+          fail_count   = excluded.fail_count,
+          last_sync    = MAX(last_sync, excluded.last_sync)
+    ''', (host, vmid, source, target, company, vm_name, status, schedule,
+          schedule_interval_seconds(schedule), last_sync, fail_count))
+
+
+# ----------------------------------------------------------------------------
+# Avaliação
+
+def _company_filter(rule, params, col='company_name'):
+    if rule.company in ('', '*'):
+        return ''
+    params.append(rule.company)
+    return f' AND {col} = ?'
+
+
+def _backup_violations(cursor, rule, now):
+    cutoff = now - rule.max_age
+    params = [cutoff]
+    sql = '''
+        SELECT b.proxmox_host, b.vmid, b.company_name, b.vm_name,
+               b.last_success, b.last_status, b.last_end
+        FROM backup_last b
+        WHERE b.last_success < ?
+    ''' + _company_filter(rule, params, 'b.company_name')
+    if rule.vmid not in ('', '*'):
+        sql += ' AND b.vmid = ?'
+        params.append(rule.vmid)
+    # VM que sumiu do inventário publicado pelo host foi removida de propósito;
+    # VM que aparece em outro nó foi migrada e o backup passou a vir de lá.
+    # Inventário sem nó (formato antigo) vale para o próprio host.
+    sql += '''
+        AND (NOT EXISTS (SELECT 1 FROM inventory_hosts h WHERE h.proxmox_host = b.proxmox_host)
+             OR EXISTS (SELECT 1 FROM inventory i
+                        WHERE i.proxmox_host = b.proxmox_host AND i.vmid = b.vmid
+                          AND (i.node = b.proxmox_host OR IFNULL(i.node, '') = '')))
+    '''
+    out = []
+    for r in cursor.execute(sql, params).fetchall():
+        last = r['last_success']
+        detail = (f"sem backup OK há {(now - last) // 3600}h" if last
+                  else "nenhum backup OK registrado")
+        out.append({
+            "subject": f"{r['proxmox_host']}/{r['vmid']}",
+            "company_name": r['company_name'], "proxmox_host": r['proxmox_host'],
+            "vmid": r['vmid'], "vm_name": r['vm_name'],
+            "detail": f"{detail} (último: {r['last_status']})",
+            "last_ok": last or None,
+        })
+    return out
+
+
+def _replication_violations(cursor, rule, now):
+    # limite por job: fator x intervalo do schedule, ou max_age sem schedule.
+    # deadline (last_sync + intervalo, indexado) já passou em todo job
+    # violado, pois o fator é >= 1: só os jobs atrasados são lidos
+    sql = '''
+        SELECT proxmox_host, vmid, source_node, target_node, company_name, vm_name,
+               status, schedule, interval_sec, last_sync, fail_count
+        FROM replication_last
+        WHERE deadline < ?
+          AND last_sync < ? - CASE WHEN interval_sec > 0
+                                   THEN ? * interval_sec ELSE ? END
+    '''
+    params = [now, now, rule.schedule_factor, rule.max_age]
+    sql += _company_filter(rule, params)
+    out = []
+    for r in cursor.execute(sql, params).fetchall():
+        age = now - (r['last_sync'] or 0)
+        out.append({
+            "subject": f"{r['proxmox_host']}/{r['vmid']}/{r['source_node']}->{r['target_node']}",
+            "company_name": r['company_name'], "proxmox_host": r['proxmox_host'],
+            "vmid": r['vmid'], "vm_name": r['vm_name'],
+            "detail": (f"última sincronização há {age // 60} min "
+                       f"(schedule {r['schedule'] or '?'}, status {r['status'] or '?'})"
+                       if r['last_sync'] else "nenhuma sincronização registrada"),
+            "last_ok": r['last_sync'] or None,
+        })
+    return out
+
+
+_EVALUATORS = {'backup': _backup_violations, 'replication': _replication_violations}
+
+
+def evaluate(db, rule, now):
+    """Avalia uma regra e atualiza sla_violations. Devolve (novas, resolvidas)."""
+    c = db.cursor()
+    current = {v['subject']: v for v in _EVALUATORS[rule.type](c, rule, now)}
+    open_rows = {r['subject']: r for r in c.execute(
+        "SELECT * FROM sla_violations WHERE rule = ? AND resolved_at IS NULL", (rule.name,))}
+
+    new = [v for s, v in current.items() if s not in open_rows]
+    resolved = [dict(r) for s, r in open_rows.items() if s not in current]
+    for v in new:
+        c.execute('''
+            INSERT INTO sla_violations
+              (rule, rule_type, subject, company_name, proxmox_host, vmid, vm_name,
+               detail, last_ok, opened_at, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (rule.name, rule.type, v['subject'], v['company_name'], v['proxmox_host'],
+              v['vmid'], v['vm_name'], v['detail'], v['last_ok'], now, now))
+    for s, v in current.items():
+        if s in open_rows:
+            c.execute('UPDATE sla_violations SET detail = ?, checked_at = ? WHERE id = ?',
+                      (v['detail'], now, open_rows[s]['id']))
+    for r in resolved:
+        c.execute('UPDATE sla_violations SET resolved_at = ? WHERE id = ?', (now, r['id']))
+    db.commit()
+    return new, resolved
+
+
+class SlaEngine:
+    """Fila (heapq) de regras por horário de vencimento + jobs extras com
+    intervalo fixo (ex.: checagem de hosts sem heartbeat)."""
+
+    def __init__(self, get_db, config_file, alert=None):
+        self.get_db = get_db
+        self.config_file = config_file
+        self.alert = alert
+        self.rules = {}
+        self.state = {}       # nome -> {"last_run"}
+        self.jobs = {}        # nome -> (intervalo, func)
+        self._heap = []
+        self._seq = itertools.count()
+        self._gen = {}        # regra -> geração da entrada válida na fila
+        self._config_mtime = None
+        self._lock = threading.Lock()
+
+    def add_job(self, name, interval, func):
+        self.jobs[name] = (interval, func)
+        heapq.heappush(self._heap, (int(time.time()), next(self._seq), 'job', name))
+
+    def _reload_if_changed(self, now):
+        try:
+            mtime = os.stat(self.config_file).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._config_mtime and self.rules:
+            return
+        self._config_mtime = mtime
+        rules = {r.name: r for r in load_rules(self.config_file)}
+        # regra nova (ou removida e readicionada) ganha geração nova; entradas
+        # de gerações anteriores ficam na fila e são descartadas no pop
+        for name in rules:
+            if name not in self.rules:
+                self._push_rule(name, now)
+        for name in self.rules:
+            if name not in rules:
+                self._gen.pop(name, None)
+        self.rules = rules
+
+    def _push_rule(self, name, due, gen=None):
+        if gen is None:
+            gen = self._gen[name] = next(self._seq)
+        heapq.heappush(self._heap, (due, next(self._seq), 'rule', (name, gen)))
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def tick(self, now=None):
+        """Roda o que venceu; devolve quantas regras/jobs foram avaliados."""
+        with self._lock:
+            now = now or int(time.time())
+            self._reload_if_changed(now)
+            ran = 0
+            while self._heap and self._heap[0][0] <= now:
+                _due, _seq, kind, key = heapq.heappop(self._heap)
+                if kind == 'job':
+                    interval, func = self.jobs[key]
+                    try:
+                        func()
+                    except Exception as e:
+                        print(f"[WARN] job {key} falhou: {e}")
+                    heapq.heappush(self._heap, (now + interval, next(self._seq), kind, key))
+                else:
+                    name, gen = key
+                    if self._gen.get(name) != gen:
+                        continue  # regra removida (ou readicionada) depois do push
+                    self._run_rule(self.rules[name], now)
+                    self._push_rule(name, now + self.rules[name].interval, gen)
+                ran += 1
+            return ran
+
+    def run_now(self, name=None):
+        """Avalia já uma regra (ou todas), sem mexer na fila."""
+        with self._lock:
+            now = int(time.time())
+            self._reload_if_changed(now)
+            for rule in self.rules.values():
+                if name in (None, rule.name):
+                    self._run_rule(rule, now)
+
+    def _run_rule(self, rule, now):
+        try:
+            new, resolved = evaluate(self.get_db(), rule, now)
+        except Exception as e:
+            print(f"[WARN] regra de SLA {rule.name} falhou: {e}")
+            return
+        st = self.state.setdefault(rule.name, {})
+        st["last_run"] = now
+        if new or resolved:
+            print(f"[INFO] SLA {rule.name}: {len(new)} nova(s) violação(ões), {len(resolved)} resolvida(s)")
+        if self.alert:
+            self._send_alerts(rule, new, resolved)
+
+    def _send_alerts(self, rule, new, resolved):
+        # um e-mail por rodada da regra, não um por VM
+        if new:
+            lines = [f"- {v['company_name'] or 'Cliente Indefinido'} | {v['proxmox_host']} | "
+                     f"{v['vm_name'] or ''} ({v['vmid']}): {v['detail']}" for v in new]
+            self.alert(f"Alerta de SLA: {rule.name} ({len(new)} violação(ões))",
+                       f"A regra {rule.name} ({rule.type}) foi violada:\n\n" + "\n".join(lines))
+        if resolved:
+            lines = [f"- {r['company_name'] or 'Cliente Indefinido'} | {r['proxmox_host']} | "
+                     f"{r['vm_name'] or ''} ({r['vmid']})" for r in resolved]
+            self.alert(f"SLA normalizado: {rule.name} ({len(resolved)})",
+                       f"Voltaram a cumprir a regra {rule.name}:\n\n" + "\n".join(lines))
+
+    def describe(self):
+        due = {}
+        for when, _seq, kind, key in self._heap:
+            if kind == 'rule' and self._gen.get(key[0]) == key[1]:
+                due[key[0]] = when
+        out = []
+        for name, rule in sorted(self.rules.items()):
+            d = rule.to_dict()
+            d["next_due"] = due.get(name)
+            d["last_run"] = self.state.get(name, {}).get("last_run")
+            out.append(d)
+        return out
@@ -0,0 +1,196 @@
+// FileName: /benchmark.js
+/* Mede o dashboard com payloads sintéticos de /api/companies.
+   Usa as mesmas funções da página (prepareCompanies, runInWorker,
+   vgridSetItems, renderSummaryCard). */
+
+function benchRand(seed) {
+  // gerador determinístico: as execuções são comparáveis entre si
+  let x = seed || 1;
+  return () => {
+    x = (x * 1103515245 + 12345) & 0x7fffffff;
+    return x / 0x7fffffff;
+  };
+}
+
+function makeSyntheticCompanies(n) {
+  const rnd = benchRand(n);
+  const now = Math.floor(Date.now() / 1000);
+  const out = [];
+  for (let i = 0; i < n; i++) {
+    const name = `Cliente ${String(i).padStart(5, "0")}`;
+    const recent = [];
+    for (let k = 0; k < RECENT_DOTS; k++) {
+      const end = now - k * 3600 - Math.floor(rnd() * 600);
+      recent.push({
+        id: i * 100 + k,
+        proxmox_host: `pve-${i}`,
+        company_name: name,
+        vmid: String(100 + (k % 8)),
+        vm_name: `vm-${i}-${k % 8}`,
+        status: rnd() < 0.95 ? "SUCCESS" : "FAILED",
+        storage_target: "pbs",
+        start_time: end - 600,
+        end_time: end,
+        total_size_bytes: Math.floor(rnd() * 1e11),
+        written_size_bytes: Math.floor(rnd() * 1e10),
+        duration_seconds: 600,
+        speed_mb_s: 120.5,
+        received_at: null,
+      });
+    }
+    const jobs = [];
+    for (let k = 0, m = Math.floor(rnd() * 4); k < m; k++) {
+      jobs.push({
+        vmid: String(100 + k),
+        vm_name: `vm-${i}-${k}`,
+        source_node: "pve-a",
+        target_node: "pve-b",
+        state: "OK",
+        status: rnd() < 0.97 ? "SUCCESS" : "FAILED",
+        last_sync: now - Math.floor(rnd() * 1800),
+        last_sync_str: null,
+        duration_sec: 12,
+        fail_count: 0,
+        schedule: "*/15",
+      });
+    }
+    const stamp = new Date((now - 120) * 1000).toISOString().slice(0, 19).replace("T", " ");
+    out.push({
+      company_name: name,
+      company_key: name,
+      last_update: recent[0].end_time,
+      last_update_str: null,
+      stats_24h: { ok: 22, fail: 2, total: 24 },
+      recent,
+      health: {
+        [`pve-${i}`]: {
+          received_at: stamp,
+          pools: [
+            { name: "rpool", status: "ONLINE" },
+            { name: "tank", status: rnd() < 0.98 ? "ONLINE" : "DEGRADED" },
+          ],
+        },
+      },
+      replication: {
+        ok: jobs.length,
+        fail: 0,
+        last_sync: jobs.length ? jobs[0].last_sync : null,
+        last_sync_str: null,
+        jobs,
+      },
+    });
+  }
+  return out;
+}
+
+function benchMs(x) {
+  return x == null ? "—" : `${x.toFixed(1)} ms`;
+}
+
+function nextFrame() {
+  return new Promise((r) => requestAnimationFrame(() => r()));
+}
+
+async function runBenchmark(n) {
+  const status = document.getElementById("bench-status");
+  const grid = document.getElementById("summary-grid");
+  status.textContent = `gerando ${n} empresas...`;
+  await nextFrame();
+
+  const text = JSON.stringify(makeSyntheticCompanies(n));
+  const result = { n, size: `${(text.length / 1048576).toFixed(1)} MB` };
+
+  status.textContent = "parse na thread principal...";
+  await nextFrame();
+  let t0 = performance.now();
+  prepareCompanies(JSON.parse(text));
+  result.main = performance.now() - t0;
+
+  status.textContent = "parse no worker...";
+  await nextFrame();
+  t0 = performance.now();
+  const arr = await runInWorker({ type: "parse", text });
+  result.worker = getDataWorker() ? performance.now() - t0 : null;
+
+  window.scrollTo(0, 0);
+  status.textContent = "render com janela...";
+  await nextFrame();
+  t0 = performance.now();
+  indexCompanies(arr);
+  vgridSetItems(grid, arr);
+  void grid.offsetHeight; // força o layout dentro da medição
+  result.windowed = performance.now() - t0;
+  result.cards = grid.querySelectorAll(".client-card").length;
+
+  // rola o grid inteiro em passos de uma tela e mede cada re-render
+  status.textContent = "rolagem...";
+  const gridTop = grid.getBoundingClientRect().top + window.scrollY;
+  const steps = 30;
+  let total = 0;
+  for (let s = 1; s <= steps; s++) {
+    window.scrollTo(0, gridTop + ((grid.offsetHeight - window.innerHeight) * s) / steps);
+    t0 = performance.now();
+    vgridRender();
+    void grid.offsetHeight;
+    total += performance.now() - t0;
+    await nextFrame();
+  }
+  result.scroll = total / steps;
+  window.scrollTo(0, 0);
+  vgridRender(true);
+
+  result.full = null;
+  if (document.getElementById("bench-full").checked) {
+    status.textContent = "render completo...";
+    await nextFrame();
+    const holder = document.createElement("div");
+    holder.className = grid.className;
+    document.body.appendChild(holder);
+    t0 = performance.now();
+    holder.innerHTML = arr.map(renderSummaryCard).join("");
+    void holder.offsetHeight;
+    result.full = performance.now() - t0;
+    holder.remove();
+  }
+
+  result.heap =
+    performance.memory && performance.memory.usedJSHeapSize
+      ? `${(performance.memory.usedJSHeapSize / 1048576).toFixed(0)} MB`
+      : "—";
+
+  const row = document.createElement("tr");
+  row.innerHTML = [
+    result.n,
+    result.size,
+    benchMs(result.main),
+    result.worker == null ? "sem worker" : benchMs(result.worker),
+    benchMs(result.windowed),
+    benchMs(result.scroll),
+    result.cards,
+    benchMs(result.full),
+    result.heap,
+  ]
+    .map((v) => `<td class="py-2 px-3">${v}</td>`)
+    .join("");
+  document.getElementById("bench-results").appendChild(row);
+  status.textContent = "pronto";
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  let running = false;
+  document.querySelectorAll("[data-bench]").forEach((btn) =>
+    btn.addEventListener("click", async () => {
+      if (running) return;
+      running = true;
+      try {
+        await runBenchmark(Number(btn.dataset.bench));
+      } catch (e) {
+        document.getElementById("bench-status").textContent = `erro: ${e.message}`;
+      } finally {
+        running = false;
+      }
+    })
+  );
+  if (companyModal.close)
+    companyModal.close.addEventListener("click", closeCompanyModal);
+});
@@ -0,0 +1,31 @@
+// FileName: /dashboard-worker.js
+/* Worker do dashboard: busca e faz o parse do JSON de /api/companies e
+   pré-formata datas/tamanhos fora da thread principal.
+
+   Mensagens recebidas:
+     {id, type: "fetch", url}   -> busca a URL
+     {id, type: "parse", text}  -> faz o parse de um JSON já em memória
+                                   (usado pela página de benchmark)
+   Resposta: {id, ok, data, ms} ou {id, ok: false, error}. */
+importScripts("format.js");
+
+self.onmessage = async (ev) => {
+  const { id, type, url, text } = ev.data || {};
+  const t0 = performance.now();
+  try {
+    let data;
+    if (type === "fetch") {
+      const res = await fetch(url, { cache: "no-store" });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      data = await res.json();
+    } else if (type === "parse") {
+      data = JSON.parse(text);
+    } else {
+      throw new Error(`mensagem desconhecida: ${type}`);
+    }
+    data = prepareCompanies(Array.isArray(data) ? data : []);
+    self.postMessage({ id, ok: true, data, ms: performance.now() - t0 });
+  } catch (e) {
+    self.postMessage({ id, ok: false, error: String(e && e.message ? e.message : e) });
+  }
+};
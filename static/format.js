@@ -0,0 +1,114 @@
+// FileName: /format.js
+/* Helpers de formatação compartilhados entre a página (script.js) e o
+   worker (dashboard-worker.js, via importScripts). Sem acesso a DOM. */
+const NAIVE_TZ_OFFSET_HOURS = 0;
+
+function fmtBytes(b) {
+  if (b == null || isNaN(b)) return "—";
+  const u = ["B", "KB", "MB", "GB", "TB", "PB"];
+  let i = 0,
+    x = Number(b);
+  while (x >= 1024 && i < u.length - 1) {
+    x /= 1024;
+    i++;
+  }
+  return `${x.toFixed(i ? 2 : 0)} ${u[i]}`;
+}
+
+function parseAsUTCOrISO(raw, offsetHours = NAIVE_TZ_OFFSET_HOURS) {
+  if (!raw) return null;
+  const withOffset = (d) => {
+    if (!(d instanceof Date) || isNaN(d)) return null;
+    const result = new Date(d);
+    return result;
+  };
+  const s = String(raw).trim();
+  if (typeof raw === "number" || /^\d+$/.test(s)) {
+    const timestamp = Number(s);
+    return withOffset(
+      new Date(timestamp < 1e12 ? timestamp * 1000 : timestamp)
+    );
+  }
+  if (/\dT\d.*(Z|[+-]\d{2}:\d{2})$/.test(s)) {
+    const t = Date.parse(s);
+    if (!isNaN(t)) return withOffset(new Date(t));
+  }
+  let m = s.match(/^(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})$/);
+  if (m) {
+    const [, Y, Mo, D, H, Mi, S] = m.map(Number);
+    return withOffset(new Date(Y, Mo - 1, D, H, Mi, S));
+  }
+  m = s.match(/^(\d{2})\/(\d{2})\/(\d{4})[,\s]\s*(\d{2}):(\d{2}):(\d{2})$/);
+  if (m) {
+    let [, D, Mo, Y, H, Mi, S] = m.map(Number);
+    return withOffset(new Date(Y, Mo - 1, D, H, Mi, S));
+  }
+  const parsed = new Date(s);
+  return isNaN(parsed.getTime()) ? null : withOffset(parsed);
+}
+
+function formatDateBR(date) {
+  if (!date || !(date instanceof Date) || isNaN(date.getTime())) return "—";
+  const dia = date.getDate().toString().padStart(2, "0");
+  const mes = (date.getMonth() + 1).toString().padStart(2, "0");
+  const ano = date.getFullYear();
+  const hora = date.getHours().toString().padStart(2, "0");
+  const minuto = date.getMinutes().toString().padStart(2, "0");
+  const segundo = date.getSeconds().toString().padStart(2, "0");
+  return `${dia}/${mes}/${ano} ${hora}:${minuto}:${segundo}`;
+}
+
+function tsToStr(epoch) {
+  if (!epoch) return "—";
+  const date = parseAsUTCOrISO(epoch);
+  return date ? formatDateBR(date) : "—";
+}
+
+function fmtReceived(at) {
+  if (!at) return "";
+  const date = parseAsUTCOrISO(at);
+  return date ? formatDateBR(date) : String(at);
+}
+
+function fmtEpochLocale(epoch, fallback) {
+  return epoch
+    ? new Date(epoch * 1000).toLocaleString("pt-BR")
+    : fallback || "—";
+}
+
+/* Pré-calcula todos os textos de data/tamanho dos cards (campos "_..."),
+   para que o render só concatene strings. Roda no worker; a página usa
+   a mesma função quando Worker não está disponível. */
+function prepareCompanies(arr) {
+  const list = Array.isArray(arr) ? arr : [];
+  for (const c of list) {
+    if (!c || typeof c !== "object") continue;
+    c._key = c.company_name || "";
+
+    let lastStr = "—";
+    if (c.last_update && !isNaN(Number(c.last_update))) {
+      lastStr = formatDateBR(new Date(Number(c.last_update) * 1000));
+    } else if (c.last_update_str) {
+      lastStr = formatDateBR(parseAsUTCOrISO(c.last_update_str));
+    }
+    c._lastStr = lastStr;
+
+    for (const r of c.recent_backups || c.recent || []) {
+      const who = r.vm_name || "ID: " + (r.vmid ?? "");
+      r._tip = `${who} • ${r.status} • ${tsToStr(
+        r.end_time
+      )} • escrito ${fmtBytes(r.written_size_bytes)}`;
+    }
+
+    const repl = c.replication || {};
+    for (const j of Array.isArray(repl.jobs) ? repl.jobs : []) {
+      j._lastStr = fmtEpochLocale(j.last_sync, j.last_sync_str);
+    }
+    repl._lastStr = fmtEpochLocale(repl.last_sync, repl.last_sync_str);
+
+    for (const h of Object.values(c.health || {})) {
+      if (h && h.received_at) h._receivedStr = fmtReceived(h.received_at);
+    }
+  }
+  return list;
+}
@@ -2,7 +2,6 @@
 /* ===== CONFIG ===== */
 const RECENT_DOTS = 12; // <<< quantas bolinhas mostrar
 const STALE_SECS = 24 * 3600; // atraso: 24h sem backup
-const NAIVE_TZ_OFFSET_HOURS = 0;
 const MIN_UPDATE_INTERVAL = 10000;
 const MODAL_ITEMS_PER_PAGE = 10; // quantidade de Itens na páginação do modal
 let lastUpdateTime = 0;
@@ -12,21 +11,12 @@ window._forceDayMonthFor = [
 // --- Proteções contra sobrecarga / duplicação de timers ---
 let LOAD_TIMER = null;
 let inFlight = false;
-let loadSummariesController = null;
 let currentModalPage = 1;
+let modalPageCursors = [null]; // cursor (keyset) de início de cada página já visitada
+// Índices do último /api/companies: nome de exibição -> empresa (modal)
+let companiesByName = new Map();
 
 /* ===== helpers ===== */
-function fmtBytes(b) {
-  if (b == null || isNaN(b)) return "—";
-  const u = ["B", "KB", "MB", "GB", "TB", "PB"];
-  let i = 0,
-    x = Number(b);
-  while (x >= 1024 && i < u.length - 1) {
-    x /= 1024;
-    i++;
-  }
-  return `${x.toFixed(i ? 2 : 0)} ${u[i]}`;
-}
 function fmtSpeed(x) {
   return !x || isNaN(x) || x <= 0 ? "N/A MB/s" : `${Number(x).toFixed(2)} MB/s`;
 }
@@ -46,61 +36,6 @@ function updateTopBadge() {
   el.textContent = `Última atualização: ${formatDateBR(now)}`;
 }
 
-function parseAsUTCOrISO(raw, offsetHours = NAIVE_TZ_OFFSET_HOURS) {
-  if (!raw) return null;
-  const withOffset = (d) => {
-    if (!(d instanceof Date) || isNaN(d)) return null;
-    const result = new Date(d);
-    return result;
-  };
-  const s = String(raw).trim();
-  if (typeof raw === "number" || /^\d+$/.test(s)) {
-    const timestamp = Number(s);
-    return withOffset(
-      new Date(timestamp < 1e12 ? timestamp * 1000 : timestamp)
-    );
-  }
-  if (/\dT\d.*(Z|[+-]\d{2}:\d{2})$/.test(s)) {
-    const t = Date.parse(s);
-    if (!isNaN(t)) return withOffset(new Date(t));
-  }
-  let m = s.match(/^(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})$/);
-  if (m) {
-    const [, Y, Mo, D, H, Mi, S] = m.map(Number);
-    return withOffset(new Date(Y, Mo - 1, D, H, Mi, S));
-  }
-  m = s.match(/^(\d{2})\/(\d{2})\/(\d{4})[,\s]\s*(\d{2}):(\d{2}):(\d{2})$/);
-  if (m) {
-    let [, D, Mo, Y, H, Mi, S] = m.map(Number);
-    return withOffset(new Date(Y, Mo - 1, D, H, Mi, S));
-  }
-  const parsed = new Date(s);
-  return isNaN(parsed.getTime()) ? null : withOffset(parsed);
-}
-
-function formatDateBR(date) {
-  if (!date || !(date instanceof Date) || isNaN(date.getTime())) return "—";
-  const dia = date.getDate().toString().padStart(2, "0");
-  const mes = (date.getMonth() + 1).toString().padStart(2, "0");
-  const ano = date.getFullYear();
-  const hora = date.getHours().toString().padStart(2, "0");
-  const minuto = date.getMinutes().toString().padStart(2, "0");
-  const segundo = date.getSeconds().toString().padStart(2, "0");
-  return `${dia}/${mes}/${ano} ${hora}:${minuto}:${segundo}`;
-}
-
-function tsToStr(epoch) {
-  if (!epoch) return "—";
-  const date = parseAsUTCOrISO(epoch);
-  return date ? formatDateBR(date) : "—";
-}
-
-function fmtReceived(at) {
-  if (!at) return "";
-  const date = parseAsUTCOrISO(at);
-  return date ? formatDateBR(date) : String(at);
-}
-
 function normalizeNaiveTimestamps(rootEl) {
   if (!rootEl) return;
   const walker = document.createTreeWalker(rootEl, NodeFilter.SHOW_TEXT);
@@ -193,21 +128,35 @@ async function openCompanyModal(companyName, page = 1) {
   companyModal.body.innerHTML =
     '<div class="text-center p-4">Carregando dados...</div>';
   companyModal.overlay.style.display = "flex";
+  if (page === 1) modalPageCursors = [null];
   try {
-    // 1. Buscar dados detalhados do cliente com paginação
+    const companyDataFromCache = companiesByName.get(companyName || "");
+    // "Cliente Indefinido" é só o nome de exibição; a busca usa a chave
+    const companyKey = companyDataFromCache
+      ? companyDataFromCache.company_key ?? companyName
+      : companyName;
+
+    // 1. Buscar backups do cliente (paginação por keyset)
+    const cursor = modalPageCursors[page - 1];
     const res = await fetch(
-      `/api/company/${encodeURIComponent(
-        companyName
-      )}/recent?page=${page}&per_page=${MODAL_ITEMS_PER_PAGE}`
+      `/api/backups/search?company=${encodeURIComponent(
+        companyKey
+      )}&limit=${MODAL_ITEMS_PER_PAGE}` +
+        (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "")
     );
     if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
     const data = await res.json();
     const backups = data.backups;
-    const pagination = data.pagination;
+    modalPageCursors[page] = data.next_cursor;
+    const pagination = {
+      current_page: page,
+      total_pages:
+        data.total != null
+          ? Math.max(page, Math.ceil(data.total / MODAL_ITEMS_PER_PAGE))
+          : null,
+      has_next: !!data.next_cursor,
+    };
     // 2. Buscar dados de saúde
-    const companyDataFromCache = (window.__companiesCache || []).find(
-      (x) => (x.company_name || "") === companyName
-    );
     const healthByHost = companyDataFromCache
       ? companyDataFromCache.health
       : {};
@@ -240,9 +189,9 @@ async function openCompanyModal(companyName, page = 1) {
               Host: ${hostname}
               ${
                 h.received_at
-                  ? `<span class="text-xs text-[#9aa] ml-2">(atualizado: ${fmtReceived(
-                      h.received_at
-                    )})</span>`
+                  ? `<span class="text-xs text-[#9aa] ml-2">(atualizado: ${
+                      h._receivedStr || fmtReceived(h.received_at)
+                    })</span>`
                   : ""
               }
             </div>
@@ -288,11 +237,11 @@ async function openCompanyModal(companyName, page = 1) {
           <button id="prev-page" class="px-4 py-2 bg-gray-700 text-white rounded-md disabled:opacity-50" ${
             pagination.current_page === 1 ? "disabled" : ""
           }>Anterior</button>
-          <span>Página ${pagination.current_page} de ${
-        pagination.total_pages
+          <span>Página ${pagination.current_page}${
+        pagination.total_pages ? ` de ${pagination.total_pages}` : ""
       }</span>
           <button id="next-page" class="px-4 py-2 bg-gray-700 text-white rounded-md disabled:opacity-50" ${
-            pagination.current_page === pagination.total_pages ? "disabled" : ""
+            pagination.has_next ? "" : "disabled"
           }>Próximo</button>
         </div>
       `;
@@ -455,15 +404,11 @@ function renderSummaryCard(c) {
   const fail = c.stats_24h.fail || 0;
   const tot = c.stats_24h.total || 0;
 
-  // === DOTS BACKUP ===
+  // === DOTS BACKUP === (textos pré-formatados em prepareCompanies)
   const realDots = recent.map((r) => {
     const statusClass = r.status === "SUCCESS" ? "success" : "fail";
-    const who = r.vm_name || "ID: " + (r.vmid ?? "");
-    const tip = `${who} • ${r.status} • ${tsToStr(
-      r.end_time
-    )} • escrito ${fmtBytes(r.written_size_bytes)}`;
     return `<span class="dot ${statusClass}" data-tip="${escAttr(
-      tip
+      r._tip
     )}"></span>`;
   });
 
@@ -485,12 +430,9 @@ function renderSummaryCard(c) {
   if (jobs.length > 0) {
     replPills = jobs.map((j) => {
       const statusClass = j.status === "SUCCESS" ? "pill-ok" : "pill-fail";
-      const lastStr = j.last_sync
-        ? new Date(j.last_sync * 1000).toLocaleString("pt-BR")
-        : j.last_sync_str || "—";
       const tip = `VM ${j.vmid} (${j.vm_name || "?"}) • ${
         j.status
-      } • ${lastStr}`;
+      } • ${j._lastStr}`;
       return `<span class="pill ${statusClass}" title="${escAttr(tip)}">
                 VM ${j.vmid}: ${j.status}
               </span>`;
@@ -499,9 +441,7 @@ function renderSummaryCard(c) {
     replPills.push(`<span class="pill pill-warn">Sem replicação</span>`);
   }
 
-  const replLast = repl.last_sync
-    ? new Date(repl.last_sync * 1000).toLocaleString("pt-BR")
-    : repl.last_sync_str || "—";
+  const replLast = repl._lastStr || "—";
 
   const replHtml = `
     <div class="summary-section summary-repl">
@@ -526,20 +466,7 @@ function renderSummaryCard(c) {
 
   const warnIcon = lastBackupFailed ? " • ⚠" : isStale ? " • ⏰" : "";
 
-  // última atualização
-  let lastStr = "—";
-  if (c.last_update) {
-    const timestamp = Number(c.last_update);
-    if (!isNaN(timestamp)) {
-      const date = new Date(timestamp * 1000);
-      lastStr = formatDateBR(date);
-    }
-  } else if (c.last_update_str) {
-    const date = parseAsUTCOrISO(c.last_update_str);
-    if (date instanceof Date && !isNaN(date)) {
-      lastStr = formatDateBR(date);
-    }
-  }
+  const lastStr = c._lastStr || "—";
 
   const healthPillsHtml = renderHealthInlineHTML(c.health);
 
@@ -575,9 +502,8 @@ function renderSummaryCard(c) {
 
         ${healthSectionHtml} <!-- VOLTA A USAR A SEÇÃO summary-health -->
 
-        <!-- Botão fixo no canto inferior direito -->
-        <button class="pill pill-cta btn-vermais"
-        onclick="openCompanyModal('${escAttr(c.company_name)}')">
+        <!-- Botão fixo no canto inferior direito (clique tratado no grid) -->
+        <button class="pill pill-cta btn-vermais">
         ▸ Ver mais
         </button>
       </div>
@@ -618,6 +544,183 @@ function hideTooltip() {
   }
 }
 
+/* ===== Worker: fetch + parse + formatação fora da thread principal ===== */
+const SCRIPT_SRC = document.currentScript ? document.currentScript.src : location.href;
+let dataWorker = null;
+let workerSeq = 0;
+const workerPending = new Map();
+
+function getDataWorker() {
+  if (dataWorker === null) {
+    try {
+      dataWorker = new Worker(new URL("dashboard-worker.js", SCRIPT_SRC));
+      dataWorker.onmessage = (ev) => {
+        const { id, ok, data, error } = ev.data || {};
+        const p = workerPending.get(id);
+        if (!p) return; // resposta de uma requisição já substituída
+        workerPending.delete(id);
+        ok ? p.resolve(data) : p.reject(new Error(error));
+      };
+      dataWorker.onerror = () => {
+        dataWorker = false; // falhou ao carregar: usa a thread principal
+        workerPending.forEach((p) => p.reject(new Error("worker indisponível")));
+        workerPending.clear();
+      };
+    } catch (e) {
+      dataWorker = false;
+    }
+  }
+  return dataWorker || null;
+}
+
+// msg: {type: "fetch", url} ou {type: "parse", text}; devolve o array preparado
+function runInWorker(msg) {
+  const w = getDataWorker();
+  if (!w) {
+    return (msg.type === "fetch"
+      ? fetch(msg.url, { cache: "no-store" }).then((r) => r.json())
+      : Promise.resolve(JSON.parse(msg.text))
+    ).then(prepareCompanies);
+  }
+  const id = ++workerSeq;
+  return new Promise((resolve, reject) => {
+    workerPending.set(id, { resolve, reject });
+    w.postMessage({ id, ...msg });
+  });
+}
+
+/* ===== Grid virtualizado =====
+   Só as linhas de cards visíveis (mais uma margem) ficam no DOM; o resto
+   vira dois espaçadores com a altura estimada/medida das linhas. */
+const VGRID_OVERSCAN_PX = 800;
+const VGRID_DEFAULT_ROW_PX = 300;
+const vgrid = {
+  el: null,
+  items: [],
+  cols: 1,
+  gap: 0,
+  rowHeights: [], // medidas reais por linha (undefined = ainda não medida)
+  first: -1,
+  last: -1,
+  raf: 0,
+  force: false,
+};
+
+function vgridColumns(el) {
+  const t = getComputedStyle(el).gridTemplateColumns;
+  return t && t !== "none" ? t.split(" ").filter(Boolean).length : 1;
+}
+
+function vgridEstimate() {
+  let sum = 0,
+    n = 0;
+  for (const h of vgrid.rowHeights) {
+    if (h) {
+      sum += h;
+      n++;
+    }
+  }
+  return n ? sum / n : VGRID_DEFAULT_ROW_PX;
+}
+
+// tops[r] = início da linha r; tops[rows] = altura total + gap
+function vgridTops(rows) {
+  const est = vgridEstimate();
+  const tops = new Array(rows + 1);
+  tops[0] = 0;
+  for (let r = 0; r < rows; r++) {
+    tops[r + 1] = tops[r] + (vgrid.rowHeights[r] || est) + vgrid.gap;
+  }
+  return tops;
+}
+
+function vgridFindRow(tops, y) {
+  let lo = 0,
+    hi = tops.length - 2;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (tops[mid] <= y) lo = mid;
+    else hi = mid - 1;
+  }
+  return Math.max(0, lo);
+}
+
+function vgridSpacer(px) {
+  return px > 0
+    ? `<div class="vgrid-spacer" style="grid-column:1/-1;height:${px}px" aria-hidden="true"></div>`
+    : "";
+}
+
+function vgridRender(force = false) {
+  const el = vgrid.el;
+  if (!el) return;
+  const n = vgrid.items.length;
+  if (!n) {
+    el.innerHTML = '<div class="text-center p-4">Nenhum dado disponível</div>';
+    vgrid.first = vgrid.last = -1;
+    return;
+  }
+  const cols = vgridColumns(el);
+  if (cols !== vgrid.cols) {
+    vgrid.cols = cols;
+    vgrid.rowHeights = []; // outra largura, outras alturas
+    force = true;
+  }
+  vgrid.gap = parseFloat(getComputedStyle(el).rowGap) || 0;
+  const rows = Math.ceil(n / cols);
+  const tops = vgridTops(rows);
+
+  const gridTop = el.getBoundingClientRect().top + window.scrollY;
+  const viewTop = window.scrollY - gridTop - VGRID_OVERSCAN_PX;
+  const viewBottom = window.scrollY + window.innerHeight - gridTop + VGRID_OVERSCAN_PX;
+  const first = vgridFindRow(tops, Math.max(0, viewTop));
+  const last = Math.max(first, vgridFindRow(tops, Math.max(0, viewBottom)));
+  if (!force && first === vgrid.first && last === vgrid.last) return;
+  vgrid.first = first;
+  vgrid.last = last;
+
+  const html = [vgridSpacer(tops[first] - (first > 0 ? vgrid.gap : 0))];
+  const end = Math.min(n, (last + 1) * cols);
+  for (let i = first * cols; i < end; i++) html.push(renderSummaryCard(vgrid.items[i]));
+  html.push(vgridSpacer(tops[rows] - tops[last + 1] - (last + 1 < rows ? vgrid.gap : 0)));
+  el.innerHTML = html.join("");
+
+  // mede as linhas renderizadas; se a estimativa errou, corrige os espaçadores
+  const cards = el.querySelectorAll(".client-card");
+  let changed = false;
+  for (let r = first, k = 0; r <= last && k < cards.length; r++, k += cols) {
+    const h = cards[k].offsetHeight;
+    if (h && Math.abs((vgrid.rowHeights[r] || 0) - h) > 1) {
+      vgrid.rowHeights[r] = h;
+      changed = true;
+    }
+  }
+  if (changed) vgridSchedule(true);
+}
+
+function vgridSchedule(force = false) {
+  if (vgrid.raf) {
+    vgrid.force = vgrid.force || force;
+    return;
+  }
+  vgrid.force = force;
+  vgrid.raf = requestAnimationFrame(() => {
+    vgrid.raf = 0;
+    vgridRender(vgrid.force);
+  });
+}
+
+function vgridSetItems(el, items) {
+  if (vgrid.el !== el || vgrid.items.length !== items.length) vgrid.rowHeights = [];
+  vgrid.el = el;
+  vgrid.items = items;
+  vgridRender(true);
+}
+
+function indexCompanies(arr) {
+  companiesByName = new Map(arr.map((c) => [c.company_name || "", c]));
+}
+
 async function loadSummaries() {
   const now = Date.now();
   if (now - lastUpdateTime < MIN_UPDATE_INTERVAL) {
@@ -627,48 +730,51 @@ async function loadSummaries() {
   if (inFlight) return;
   inFlight = true;
   try {
-    if (loadSummariesController) loadSummariesController.abort();
-    loadSummariesController = new AbortController();
-    const res = await fetch(`/api/companies?limit=${RECENT_DOTS}`, {
-      cache: "no-store",
-      signal: loadSummariesController.signal,
+    const arr = await runInWorker({
+      type: "fetch",
+      url: new URL(`/api/companies?limit=${RECENT_DOTS}`, location.href).href,
     });
-    const data = await res.json();
-    const arr = Array.isArray(data) ? data : [];
-    window.__companiesCache = arr; // Armazena em cache para o modal
-
-    const grid = document.getElementById("summary-grid");
-    grid.innerHTML = ""; // Limpa o grid antes de preencher
-
-    if (!arr.length) {
-      grid.innerHTML = '<div class="text-center p-4">Nenhum dado disponível</div>';
-    } else {
-      arr.forEach(companyData => {
-        grid.innerHTML += renderSummaryCard(companyData);
-      });
-      document.querySelectorAll('.dot').forEach(dot => {
-        dot.addEventListener('mouseover', showTooltip);
-        dot.addEventListener('mouseout', hideTooltip);
-      });
-    }
-
-    normalizeNaiveTimestamps(grid);
+    window.__companiesCache = arr;
+    indexCompanies(arr);
+    vgridSetItems(document.getElementById("summary-grid"), arr);
     updateTopBadge();
   } catch (e) {
-    if (e.name !== "AbortError") {
-      console.error("Erro ao carregar resumo:", e);
-      const grid = document.getElementById("summary-grid");
-      if (grid) {
-        grid.innerHTML =
-          '<div class="text-center p-4 error">Erro ao carregar dados</div>';
-      }
+    console.error("Erro ao carregar resumo:", e);
+    const grid = document.getElementById("summary-grid");
+    if (grid) {
+      vgrid.items = [];
+      grid.innerHTML =
+        '<div class="text-center p-4 error">Erro ao carregar dados</div>';
     }
   } finally {
     inFlight = false;
   }
 }
 
+// Listeners delegados: o grid é re-renderizado a cada rolagem, então
+// nada é ligado card a card
+function bindSummaryGrid(grid) {
+  if (!grid) return;
+  grid.addEventListener("mouseover", (e) => {
+    if (e.target.classList.contains("dot")) showTooltip(e);
+  });
+  grid.addEventListener("mouseout", (e) => {
+    if (e.target.classList.contains("dot")) hideTooltip();
+  });
+  grid.addEventListener("click", (e) => {
+    const btn = e.target.closest(".btn-vermais");
+    if (!btn) return;
+    const card = btn.closest(".client-card");
+    if (card) openCompanyModal(card.dataset.company || "");
+  });
+  window.addEventListener("scroll", () => vgridSchedule(), { passive: true });
+  window.addEventListener("resize", () => vgridSchedule(true));
+}
+
 document.addEventListener("DOMContentLoaded", function () {
+  createGlobalTooltip();
+  bindSummaryGrid(document.getElementById("summary-grid"));
+  if (window.DASHBOARD_NO_AUTOLOAD) return; // página de benchmark
   updateTopBadge();
   document.addEventListener("visibilitychange", () => {
     if (document.hidden) {
@@ -681,7 +787,6 @@ document.addEventListener("DOMContentLoaded", function () {
       loadSummaries();
     }
   });
-  createGlobalTooltip();
   if (companyModal.close)
     companyModal.close.addEventListener("click", closeCompanyModal);
   if (companyModal.overlay)
@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache_utils  # noqa: E402
+import monitor_backup_api as api  # noqa: E402
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Módulo da API apontando para um banco e um config temporários."""
+    cfg = tmp_path / "config.ini"
+    cfg.write_text("")
+    monkeypatch.setattr(api, "DATABASE", str(tmp_path / "backups.db"))
+    monkeypatch.setattr(api, "CONFIG_FILE", str(cfg))
+    monkeypatch.setattr(api, "API_TOKEN", "")
+    monkeypatch.setattr(cache_utils, "_value_cache", {})  # totais em cache de outro banco
+    api.init_db()
+    return api
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def live_url(server):
+    """Servidor HTTP local de verdade (stand-in do monitor) para os agentes."""
+    from werkzeug.serving import make_server
+
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    thread.join()
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import ROOT
+
+PVESH = r"""#!/usr/bin/env bash
+# substituto do pvesh: só o que o coletor consulta
+case "$2" in
+  /cluster/resources)
+    echo '[{"type":"qemu","vmid":100,"node":"pve1","name":"web01","tags":""},
+           {"type":"lxc","vmid":101,"node":"pve1","name":"dns","tags":"infra"},
+           {"type":"storage","id":"local"}]' ;;
+  /nodes/pve1/qemu/100/config) echo '{"tags":"web;prod"}' ;;
+  /cluster/replication) echo '[{"id":"100-0","guest":100,"target":"pve2","schedule":"*/30"}]' ;;
+  *) echo "pvesh: $*" >&2; exit 2 ;;
+esac
+"""
+
+PVESR = r"""#!/usr/bin/env bash
+[[ "$1" == status ]] || exit 2
+echo "JobID      Enabled    Target                           LastSync             NextSync   Duration  FailCount State"
+echo "100-0      Yes        local/pve2              @LAST@  @LAST@       3.2          0 OK"
+"""
+
+ZPOOL = r"""#!/usr/bin/env bash
+cat <<'OUT'
+  pool: rpool
+ state: ONLINE
+config:
+  pool: tank
+ state: DEGRADED
+OUT
+"""
+
+VZDUMP_LOG = """INFO: starting new backup job: vzdump 100 --storage pbs --mode snapshot
+INFO: Starting Backup of VM 100 (qemu)
+INFO: Backup started at {start}
+INFO: VM Name: web01
+INFO: include disk 'scsi0' 'local-zfs:vm-100-disk-0' 32G
+INFO: transferred 1.50 GiB in 10 seconds
+INFO: Finished Backup of VM 100 (00:05:00)
+INFO: Backup finished at {end}
+INFO: Backup job finished successfully
+TASK OK
+"""
+
+
+def _exe(path, text):
+    path.write_text(text)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+@pytest.fixture
+def agent(tmp_path):
+    """Config do coletor com pvesh/pvesr/zpool substitutos e um log do vzdump."""
+    bins = tmp_path / "bin"
+    bins.mkdir()
+    now = int(time.time())
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    last = datetime.fromtimestamp(now - 600).strftime('%Y-%m-%d_%H:%M:%S')
+
+    logs = tmp_path / "tasks" / "A"
+    logs.mkdir(parents=True)
+    (logs / "UPID:pve1:0001:vzdump::root@pam:").write_text(
+        VZDUMP_LOG.format(start=fmt(now - 3900), end=fmt(now - 3600)))
+
+    def write_config(api_url):
+        cfg = tmp_path / "collector.ini"
+        cfg.write_text(f"""
+[collector]
+company_name = ACME
+proxmox_host = pve1
+api_url = {api_url}
+state_dir = {tmp_path / 'state'}
+spool_dir = {tmp_path / 'spool'}
+cache_dir = {tmp_path / 'cache'}
+
+[upload]
+min_interval = 0
+timeout = 5
+
+[source:backup]
+log_dir = {tmp_path / 'tasks'}
+
+[source:health]
+smart = false
+
+[commands]
+pvesh = {_exe(bins / 'pvesh', PVESH)}
+pvesr = {_exe(bins / 'pvesr', PVESR.replace('@LAST@', last))}
+zpool = {_exe(bins / 'zpool', ZPOOL)}
+smartctl = {bins / 'smartctl-ausente'}
+""")
+        return str(cfg)
+
+    def run(api_url):
+        return subprocess.run(
+            [sys.executable, "-m", "collector", "-c", write_config(api_url), "--once"],
+            cwd=ROOT, capture_output=True, text=True, timeout=60,
+            env={k: v for k, v in os.environ.items() if not k.startswith(("COLLECTOR_", "MONITOR_"))})
+
+    run.spool = tmp_path / "spool"
+    run.now = now
+    return run
+
+
+def test_once_uploads_everything(agent, live_url, server):
+    proc = agent(live_url)
+    assert proc.returncode == 0, proc.stderr
+
+    assert not list((agent.spool / "outbox").glob("batch-*"))
+    assert not (agent.spool / "pending.ndjson").exists()
+
+    db = server.get_db()
+    b = db.execute("SELECT * FROM backups").fetchall()
+    assert [(r["vmid"], r["status"], r["storage_target"]) for r in b] == [("100", "SUCCESS", "pbs")]
+    assert b[0]["end_time"] - b[0]["start_time"] == 300
+    assert b[0]["written_size_bytes"] == int(1.5 * 1024 ** 3)
+
+    r = db.execute("SELECT vmid, target_node, status, schedule FROM replication").fetchall()
+    assert [tuple(x) for x in r] == [("100", "pve2", "SUCCESS", "*/30")]
+    # o SLA usa o schedule para o limite do job
+    assert db.execute("SELECT interval_sec FROM replication_last").fetchone()[0] == 1800
+
+    # inventário publicado com as tags buscadas na config da VM
+    inv = {x["vmid"]: x["tags"] for x in db.execute("SELECT vmid, tags FROM inventory")}
+    assert inv == {"100": "web;prod", "101": "infra"}
+
+    health = json.loads(db.execute("SELECT payload_json FROM health_state").fetchone()[0])
+    assert health["pools"] == [{"name": "rpool", "status": "ONLINE"},
+                               {"name": "tank", "status": "DEGRADED"}]
+    assert db.execute("SELECT last_seen FROM host_status WHERE proxmox_host='pve1'").fetchone()[0] >= agent.now
+
+
+def test_server_down_keeps_spool(agent, live_url, server):
+    proc = agent("http://127.0.0.1:9")
+    assert proc.returncode == 0, proc.stderr
+
+    batches = list((agent.spool / "outbox").glob("batch-*.ndjson.gz"))
+    assert len(batches) == 1
+    kinds = sorted(json.loads(ln)["kind"] for ln in gzip.decompress(batches[0].read_bytes()).splitlines())
+    assert kinds == ["backup", "replication"]
+    assert (agent.spool / "backoff.127.0.0.1_9").exists()
+
+    # na próxima execução (servidor de volta, backoff vencido) o lote sai
+    (agent.spool / "backoff.127.0.0.1_9").unlink()
+    proc = agent(live_url)
+    assert proc.returncode == 0, proc.stderr
+    assert not list((agent.spool / "outbox").glob("batch-*"))
+    assert server.get_db().execute("SELECT COUNT(*) FROM backups").fetchone()[0] == 1
@@ -0,0 +1,70 @@
+import json
+import sqlite3
+import time
+
+import db_migrations
+
+
+def _touch(server, host, now):
+    db = server.get_db()
+    server._touch_host(db.cursor(), host, "ACME", now)
+    db.commit()
+
+
+def test_stale_threshold_follows_report_interval(server, monkeypatch):
+    sent = []
+    monkeypatch.setattr(server, "send_alert_email", lambda subject, body: sent.append(subject))
+    t0 = int(time.time()) - 10 * 3600
+    # coletor: heartbeat a cada 5 min; cron legado: de hora em hora
+    for i in range(6):
+        _touch(server, "pve-hb", t0 + i * 300)
+        _touch(server, "pve-cron", t0 + i * 3600)
+    cron_last = t0 + 5 * 3600
+    db = server.get_db()
+
+    assert server.check_stale_hosts(db, now=cron_last + 20 * 60) == ["pve-hb"]
+    assert server.check_stale_hosts(db, now=cron_last + 2 * 3600) == []
+    assert server.check_stale_hosts(db, now=cron_last + 3 * 3600 + 1) == ["pve-cron"]
+    assert len(sent) == 2
+
+
+def test_backfill_skips_hosts_outside_stale_window(tmp_path, server):
+    path = tmp_path / "legacy.db"
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.execute("""CREATE TABLE health (id INTEGER PRIMARY KEY AUTOINCREMENT, proxmox_host TEXT,
+                  company_name TEXT, payload_json TEXT, received_at TEXT)""")
+    fmt = lambda ts: time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+    now = int(time.time())
+    payload = json.dumps({"pools": [{"name": "rpool", "status": "ONLINE"}]})
+    for host, ts in [("antigo", now - 90 * 86400), ("cron", now - 7200), ("cron", now - 60)]:
+        db.execute("INSERT INTO health (proxmox_host, company_name, payload_json, received_at) "
+                   "VALUES (?, 'ACME', ?, ?)", (host, payload, fmt(ts)))
+    db.commit()
+
+    db_migrations.migrate(db, log=lambda *_: None)
+    server._backfill_health_state(db.cursor())
+    db.commit()
+
+    assert {r[0] for r in db.execute("SELECT proxmox_host FROM health_state")} == {"antigo", "cron"}
+    rows = db.execute("SELECT proxmox_host, report_interval FROM host_status").fetchall()
+    assert [tuple(r) for r in rows] == [("cron", 7140)]
+
+
+def test_new_hourly_host_learns_interval_after_first_stale(server, monkeypatch):
+    sent = []
+    monkeypatch.setattr(server, "send_alert_email", lambda subject, body: sent.append(subject))
+    t0 = int(time.time()) - 10 * 3600
+    db = server.get_db()
+    # host novo (sem backfill) no health-monitor.sh de hora em hora; a
+    # checagem roda a cada minuto
+    for minute in range(6 * 60 + 1):
+        now = t0 + minute * 60
+        if minute % 60 == 0:
+            _touch(server, "pve-cron", now)
+        server.check_stale_hosts(db, now=now)
+
+    interval = db.execute("SELECT report_interval FROM host_status").fetchone()[0]
+    assert interval == 3600
+    # só o primeiro silêncio, antes de o intervalo ser conhecido, alerta
+    assert len(sent) == 1
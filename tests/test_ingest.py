@@ -0,0 +1,133 @@
+import gzip
+import io
+import json
+import os
+import subprocess
+import time
+import zlib
+
+import pytest
+
+import ingest_utils
+from ingest_utils import IngestError, iter_ndjson, read_json_body
+
+from conftest import ROOT
+
+
+def _ndjson(*records):
+    return b"".join(json.dumps(r).encode() + b"\n" for r in records)
+
+
+def _backup(vmid, end_time=None):
+    end_time = end_time or int(time.time()) - 60
+    return {
+        "kind": "backup", "proxmox_host": "pve1", "company_name": "ACME",
+        "vmid": str(vmid), "vm_name": f"vm{vmid}", "status": "SUCCESS",
+        "storage_target": "pbs", "start_time": end_time - 300,
+        "end_time": end_time, "total_size_bytes": 10, "written_size_bytes": 5,
+    }
+
+
+def _records(body, encoding):
+    return [rec for _, rec, err in iter_ndjson(io.BytesIO(body), encoding) if err is None]
+
+
+@pytest.mark.parametrize("chunk_size", [5, 64 * 1024])
+def test_plain_and_gzip_bodies(monkeypatch, chunk_size):
+    monkeypatch.setattr(ingest_utils, "CHUNK_SIZE", chunk_size)
+    body = _ndjson({"a": 1}, {"b": 2})
+    assert _records(body, None) == [{"a": 1}, {"b": 2}]
+    assert _records(gzip.compress(body), "gzip") == [{"a": 1}, {"b": 2}]
+    assert _records(zlib.compress(body), "deflate") == [{"a": 1}, {"b": 2}]
+
+
+@pytest.mark.parametrize("chunk_size", [3, 7, 64 * 1024])
+def test_multi_member_gzip(monkeypatch, chunk_size):
+    monkeypatch.setattr(ingest_utils, "CHUNK_SIZE", chunk_size)
+    body = b"".join(gzip.compress(_ndjson({"n": i})) for i in range(3))
+    assert _records(body, "gzip") == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_corrupt_and_truncated_bodies_are_rejected():
+    good = gzip.compress(_ndjson({"a": 1}, {"b": 2}))
+    with pytest.raises(IngestError):
+        list(iter_ndjson(io.BytesIO(good[:-6]), "gzip"))
+    with pytest.raises(IngestError):
+        list(iter_ndjson(io.BytesIO(good[:10] + b"\xff" * 20 + good[30:]), "gzip"))
+    with pytest.raises(IngestError):
+        list(iter_ndjson(io.BytesIO(good + b"lixo"), "gzip"))
+    with pytest.raises(IngestError):
+        list(iter_ndjson(io.BytesIO(b"{}"), "br"))
+
+
+def test_invalid_lines_are_reported():
+    out = list(iter_ndjson(io.BytesIO(b'{"a":1}\nnot json\n\n{"b":2}'), None))
+    assert [(n, rec) for n, rec, _ in out] == [(1, {"a": 1}), (2, None), (4, {"b": 2})]
+    assert out[1][2]
+
+
+def test_read_json_body_gzip():
+    assert read_json_body(io.BytesIO(gzip.compress(b'{"x": 1}')), "gzip") == {"x": 1}
+
+
+def test_ingest_endpoint_multi_member(client, server):
+    body = gzip.compress(_ndjson(_backup(100))) + gzip.compress(_ndjson(_backup(101)))
+    res = client.post("/api/ingest", data=body, headers={
+        "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.get_json()["counts"]["inserted"] == 2
+
+    res = client.post("/api/ingest", data=body[:-4], headers={"Content-Encoding": "gzip"})
+    assert res.status_code == 400
+    db = server.get_db()
+    assert db.execute("SELECT COUNT(*) FROM backups").fetchone()[0] == 2
+
+
+def test_backup_without_host_is_invalid_not_duplicate(client, server):
+    bad = dict(_backup(100), proxmox_host=None)
+    res = client.post("/api/ingest", data=_ndjson(bad, _backup(101)))
+    body = res.get_json()
+    assert res.status_code == 200
+    assert body["counts"]["invalid"] == 1
+    assert body["counts"]["duplicate"] == 0
+    assert body["counts"]["inserted"] == 1
+
+    res = client.post("/api/backup", json=bad)
+    assert res.status_code == 400
+    assert "proxmox_host" in res.get_json()["error"]
+    assert server.get_db().execute("SELECT COUNT(*) FROM backups").fetchone()[0] == 1
+
+
+def test_spool_flush_against_local_server(live_url, server, tmp_path):
+    spool = tmp_path / "spool"
+    script = f"""
+        source {os.path.join(ROOT, 'scripts', 'spool-lib.sh')}
+        for v in 200 201 202; do
+          spool_append "$(jq -nc --arg v "$v" '{json.dumps(_backup(0))} | .vmid=$v')"
+        done
+        spool_flush
+    """
+    env = dict(os.environ, SPOOL_DIR=str(spool), INGEST_URL=f"{live_url}/api/ingest",
+               SPOOL_BATCH_LINES="2", SPOOL_MIN_INTERVAL="0")
+    subprocess.run(["bash", "-c", script], env=env, check=True, timeout=60)
+
+    assert not list((spool / "outbox").glob("batch-*"))
+    db = server.get_db()
+    vmids = [r[0] for r in db.execute("SELECT vmid FROM backups ORDER BY vmid")]
+    assert vmids == ["200", "201", "202"]
+
+
+def test_spool_keeps_batches_when_server_is_down(tmp_path):
+    spool = tmp_path / "spool"
+    script = f"""
+        source {os.path.join(ROOT, 'scripts', 'spool-lib.sh')}
+        spool_append '{json.dumps(_backup(300))}'
+        spool_flush
+    """
+    env = dict(os.environ, SPOOL_DIR=str(spool), INGEST_URL="http://127.0.0.1:9/api/ingest",
+               SPOOL_MIN_INTERVAL="0", SPOOL_CURL_TIMEOUT="5")
+    subprocess.run(["bash", "-c", script], env=env, timeout=60)
+
+    assert len(list((spool / "outbox").glob("batch-*.ndjson.gz"))) == 1
+    fails, next_ts = (spool / "backoff.127.0.0.1_9").read_text().split()
+    assert fails == "1" and int(next_ts) > time.time()
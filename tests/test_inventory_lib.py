@@ -0,0 +1,26 @@
+import os
+import subprocess
+
+from conftest import ROOT
+
+
+def test_inventory_load_keeps_empty_fields(tmp_path):
+    (tmp_path / "inventory.tsv").write_text(
+        "100\tn1\tqemu\t\tmyvm\n"
+        "101\tn2\tlxc\tweb;prod\tct1\n"
+        "102\tn1\tqemu\tn/a\t\n"
+    )
+    script = f"""
+        source {os.path.join(ROOT, 'scripts', 'inventory-lib.sh')}
+        inventory_load
+        for v in 100 101 102; do
+          printf '%s|%s|%s|%s\\n' "${{INV_NODE[$v]}}" "${{INV_TAGS[$v]}}" "${{INV_NAME[$v]}}" "$(inventory_display_name $v)"
+        done
+    """
+    out = subprocess.run(["bash", "-c", script], env=dict(os.environ, INVENTORY_DIR=str(tmp_path)),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.splitlines() == [
+        "n1||myvm|myvm",
+        "n2|web;prod|ct1|web;prod",
+        "n1|||",
+    ]
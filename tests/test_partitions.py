@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+import backup_partitions as partitions
+import db_migrations
+from backup_partitions import month_bounds
+
+
+@pytest.fixture
+def db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "p.db")
+    conn.row_factory = sqlite3.Row
+    db_migrations.migrate(conn, log=lambda *_: None)
+    return conn
+
+
+def _insert(cur, company, end_time, vmid="100", status="SUCCESS"):
+    return partitions.insert_backup(cur, {
+        "proxmox_host": "pve1", "company_name": company, "vmid": vmid, "vm_name": "vm",
+        "status": status, "storage_target": "pbs", "start_time": end_time - 60,
+        "end_time": end_time,
+    })
+
+
+def test_company_catalog_follows_inserts_and_deletes(db):
+    cur = db.cursor()
+    jan, _ = month_bounds("202601")
+    feb, _ = month_bounds("202602")
+    _insert(cur, "ACME", jan + 10)
+    _insert(cur, "ACME", jan + 10)  # duplicata: OR IGNORE
+    _insert(cur, "Beta", feb + 10)
+    _insert(cur, None, feb + 20)
+    assert partitions.list_companies(cur) == ["", "ACME", "Beta"]
+
+    partitions.drop_partition(cur, "202601")
+    assert partitions.list_companies(cur) == ["", "Beta"]
+
+    partitions.delete_range(cur, feb, feb + 15)
+    assert partitions.list_companies(cur) == [""]
+
+    partitions.drop_older_than(cur, feb + 40 * 86400)
+    assert partitions.list_companies(cur) == []
+
+
+def test_catalog_migration_backfills_existing_partitions(db):
+    cur = db.cursor()
+    jan, _ = month_bounds("202601")
+    _insert(cur, "ACME", jan + 10)
+    cur.execute("DELETE FROM backup_companies")
+    db_migrations._m005_company_catalog(cur, log=lambda *_: None)
+    assert partitions.list_companies(db.cursor()) == ["ACME"]
+
+
+
+def test_migration_output_goes_through_log(tmp_path, capsys):
+    conn = sqlite3.connect(tmp_path / "legado.db")
+    conn.execute(f"CREATE TABLE backups ({', '.join(partitions.BACKUP_COLUMNS)})")
+    conn.execute("INSERT INTO backups (id, proxmox_host, status, start_time, end_time) "
+                 "VALUES (1, 'pve1', 'SUCCESS', 100, 160)")
+    conn.commit()
+    lines = []
+    db_migrations.migrate(conn, log=lines.append)
+    assert capsys.readouterr().out == ""
+    assert any("convertida em partições mensais (1 registros)" in line for line in lines)
+
+def test_query_newest_offset_matches_full_ordering(db):
+    cur = db.cursor()
+    ends = []
+    for month in ("202601", "202602", "202603"):
+        start, _ = month_bounds(month)
+        for i in range(7):
+            ends.append(start + i * 3600)
+            _insert(cur, "ACME", start + i * 3600, vmid=str(i))
+    _insert(cur, "Outra", month_bounds("202602")[0] + 99)
+    expected = sorted(ends, reverse=True)
+    for offset in (0, 3, 7, 10, 14, 20, 21, 30):
+        rows = partitions.query_newest(cur, "company_name = ?", ("ACME",), 5, offset=offset)
+        assert [r["end_time"] for r in rows] == expected[offset:offset + 5]
+
+
+def test_company_endpoints_use_catalog(client, server):
+    db = server.get_db()
+    cur = db.cursor()
+    start, _ = month_bounds("202601")
+    for i in range(25):
+        _insert(cur, "ACME", start + i * 86400)
+    db.commit()
+
+    res = client.get("/api/companies?limit=3")
+    assert [c["company_name"] for c in res.get_json()] == ["ACME"]
+    assert len(res.get_json()[0]["recent"]) == 3
+
+    page = client.get("/api/company/ACME/recent?page=2&per_page=10").get_json()
+    assert page["pagination"]["total_items"] == 25
+    assert [b["end_time"] for b in page["backups"]] == [start + i * 86400 for i in range(14, 4, -1)]
+
+    v2 = client.get("/api/v2/summaries").get_json()
+    assert v2["pagination"]["total"] == 1
+    assert v2["data"][0]["total_backups"] == 25
+    assert v2["data"][0]["last_backup"] == start + 24 * 86400
@@ -0,0 +1,198 @@
+"""EXPLAIN QUERY PLAN de todas as consultas que as rotas de leitura
+realmente executam.
+
+Cada rota GET é chamada com as combinações de filtros abaixo; o trace do
+SQLite captura o SQL final (montado por _backup_filters, _company_clause,
+partitions.query_newest etc.) e cada SELECT tem que usar índice, sem
+ordenar em B-tree temporária. Rota GET nova sem entrada em READ_REQUESTS
+faz o teste falhar.
+"""
+import configparser
+import re
+import sqlite3
+import time
+
+import pytest
+
+import backup_partitions as partitions
+import sla_engine
+
+READ_REQUESTS = {
+    "view_backups": ["/"],
+    "benchmark_page": ["/benchmark"],
+    "health_list_page": ["/health"],
+    "list_companies": ["/api/companies?limit=6"],
+    "company_recent": ["/api/company/ACME/recent?page=1", "/api/company/ACME/recent?page=4&per_page=10"],
+    "list_companies_v2": ["/api/v2/summaries?page=1&per_page=10"],
+    "search_backups": [
+        "/api/backups/search?company=ACME",
+        "/api/backups/search?company=",
+        "/api/backups/search?company=ACME&status=FAILED",
+        "/api/backups/search?company=ACME&status=SUCCESS&days=7",
+        "/api/backups/search?company=ACME&storage=pbs",
+        "/api/backups/search?company=ACME&cursor={cursor}",
+        "/api/backups/search?host=pve1",
+        "/api/backups/search?host=pve1&cursor={cursor}",
+        "/api/backups/search?vmid=101",
+        "/api/backups/search?vm_name=vm1",
+        "/api/backups/search?company=ACME&vm_name=vm1&days=7",
+        "/api/backups/search?days=3",
+        "/api/backups/search?since=2026-01-01&until=2026-01-31",
+        "/api/backups/search?status=FAILED&days=3",
+    ],
+    "export_backups": [
+        "/api/export/backups",
+        "/api/export/backups?format=csv&company=ACME",
+        "/api/export/backups?host=pve1&days=30",
+        "/api/export/backups?vmid=101",
+    ],
+    "api_hosts": ["/api/hosts"],
+    "api_health_events": ["/api/health/events", "/api/health/events?host=pve1"],
+    "api_inventory_list": ["/api/inventory", "/api/inventory?host=pve1", "/api/inventory?company=ACME"],
+    "api_sla": ["/api/sla"],
+    "api_sla_violations": [
+        "/api/sla/violations",
+        "/api/sla/violations?open=1",
+        "/api/sla/violations?rule=diario",
+        "/api/sla/violations?company=ACME",
+        "/api/sla/violations?host=pve1",
+    ],
+    "admin_partitions": ["/api/admin/partitions"],
+}
+
+# Tabelas pequenas por natureza (uma linha por host, VM ou job): varrer ou
+# ordenar inteiro é o plano certo. Consultas que só tocam nelas não são
+# checadas.
+SMALL_TABLES = {
+    "backup_partitions",   # uma linha por mês
+    "backup_companies",    # catálogo, listado inteiro
+    "backup_seq",
+    "backups_template",    # sempre vazia (âncora da view)
+    "health_state",        # uma linha por host
+    "host_status",
+    "inventory_hosts",
+    "inventory",           # uma linha por VM/CT; a ordem numérica do vmid exige sort
+    "sqlite_master",
+}
+
+# Exceções pontuais, com o motivo
+ALLOWED = {
+    "FROM health ORDER BY id DESC LIMIT": "SCAN do rowid de trás para frente, para no LIMIT",
+}
+
+_TABLE_RE = re.compile(r"^(?:SCAN|SEARCH) (\w+)")
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: AS \w+)?(.*)$")
+
+
+def _seed(db):
+    cur = db.cursor()
+    now = int(time.time())
+    for i in range(400):
+        end = now - i * 6 * 3600
+        partitions.insert_backup(cur, {
+            "proxmox_host": f"pve{i % 3}", "company_name": ["ACME", "Beta", None][i % 3],
+            "vmid": str(100 + i % 7), "vm_name": f"vm{i % 7}",
+            "status": "FAILED" if i % 11 == 0 else "SUCCESS", "storage_target": "pbs",
+            "start_time": end - 600, "end_time": end,
+        })
+        sla_engine.record_backup(cur, f"pve{i % 3}", str(100 + i % 7), "ACME", "vm", "SUCCESS", end)
+    for i in range(50):
+        cur.execute("""INSERT INTO replication (proxmox_host, company_name, vmid, source_node,
+                       target_node, status, last_sync) VALUES ('pve1', 'ACME', ?, 'pve1', 'pve2',
+                       'SUCCESS', ?)""", (str(100 + i % 5), now - i * 900))
+        cur.execute("""INSERT INTO health (proxmox_host, company_name, payload_json)
+                       VALUES (?, 'ACME', '{}')""", (f"pve{i % 3}",))
+        cur.execute("""INSERT INTO health_events (proxmox_host, company_name, component, name,
+                       old_status, new_status, at) VALUES (?, 'ACME', 'pool', 'rpool', 'ONLINE',
+                       'DEGRADED', ?)""", (f"pve{i % 3}", now - i * 60))
+    db.commit()
+
+
+@pytest.fixture
+def traced(server, monkeypatch):
+    db = server.get_db()
+    _seed(db)
+    statements = []
+    real_get_db = server.get_db
+
+    def get_db():
+        conn = real_get_db()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(server, "get_db", get_db)
+    return statements
+
+
+def _plan_problems(conn, sql):
+    if any(pattern in " ".join(sql.split()) for pattern in ALLOWED):
+        return []
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+    touched = {m.group(1) for m in map(_TABLE_RE.match, plan) if m and m.group(1) in tables}
+    if touched <= SMALL_TABLES:
+        return []
+    problems = []
+    for detail in plan:
+        m = _SCAN_RE.match(detail)
+        if "TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif m and m.group(1) in tables and m.group(1) not in SMALL_TABLES and "INDEX" not in m.group(2):
+            # "SCAN x" de subquery materializada não é tabela
+            problems.append(detail)
+    return problems
+
+
+def _is_read(sql):
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    return head in ("SELECT", "WITH")
+
+
+def test_every_read_route_is_covered(server):
+    get_routes = {r.endpoint for r in server.app.url_map.iter_rules()
+                  if "GET" in r.methods and r.endpoint != "static"}
+    assert get_routes - set(READ_REQUESTS) == set()
+
+
+def test_read_routes_use_indexes(server, client, traced):
+    for endpoint, urls in READ_REQUESTS.items():
+        for url in urls:
+            if "{cursor}" in url:
+                first = client.get(url.replace("&cursor={cursor}", "") + "&limit=5").get_json()
+                url = url.format(cursor=first["next_cursor"])
+            res = client.get(url)
+            assert res.status_code == 200, (url, res.data[:200])
+            res.get_data()  # consome o streaming da exportação
+
+    conn = sqlite3.connect(server.DATABASE)
+    failures = {}
+    for sql in dict.fromkeys(traced):
+        if _is_read(sql):
+            problems = _plan_problems(conn, sql)
+            if problems:
+                failures[" ".join(sql.split())[:300]] = problems
+    assert not failures, "\n\n".join(f"{sql}\n  -> {' | '.join(p)}" for sql, p in failures.items())
+
+
+def test_sla_evaluation_uses_indexes(server, traced):
+    db = server.get_db()
+    config = configparser.ConfigParser()
+    config.read_dict({
+        "sla:todos": {"type": "backup", "max_age_hours": "1"},
+        "sla:acme": {"type": "backup", "company": "ACME"},
+        "sla:vm": {"type": "backup", "vmid": "101"},
+        "sla:repl": {"type": "replication", "max_age_hours": "1"},
+        "sla:repl-acme": {"type": "replication", "company": "ACME"},
+    })
+    rules = [sla_engine.Rule(s[4:], config[s]) for s in config.sections()]
+    now = int(time.time()) + 30 * 86400
+    for rule in rules:
+        sla_engine.evaluate(db, rule, now)
+
+    failures = {}
+    for sql in dict.fromkeys(traced):
+        if _is_read(sql):
+            problems = _plan_problems(db, sql)
+            if problems:
+                failures[" ".join(sql.split())[:300]] = problems
+    assert not failures, "\n\n".join(f"{sql}\n  -> {' | '.join(p)}" for sql, p in failures.items())
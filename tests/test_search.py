@@ -0,0 +1,53 @@
+import time
+
+import backup_partitions as partitions
+
+
+def _seed(server, n=30):
+    db = server.get_db()
+    cur = db.cursor()
+    now = int(time.time())
+    for i in range(n):
+        partitions.insert_backup(cur, {
+            "proxmox_host": f"pve{i % 2}", "company_name": "ACME", "vmid": str(100 + i),
+            "vm_name": f"vm{i}", "status": "SUCCESS", "storage_target": "pbs",
+            "start_time": now - i * 86400 - 3660, "end_time": now - i * 86400 - 3600,
+        })
+    db.commit()
+    return now
+
+
+def test_days_total_is_served_from_cache(client, server):
+    _seed(server)
+    first = client.get("/api/backups/search?company=ACME&days=7").get_json()
+    second = client.get("/api/backups/search?company=ACME&days=7").get_json()
+    assert first["total"] == second["total"] == 7
+    assert second["total_cached"] is True
+
+
+def test_host_filter_pages_with_cursor(client, server):
+    now = _seed(server)
+    seen, cursor = [], None
+    while True:
+        url = "/api/backups/search?host=pve1&limit=4&with_total=0"
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen += [b["end_time"] for b in page["backups"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [now - i * 86400 - 3600 for i in range(1, 30, 2)]
+
+
+def test_vm_name_prefix_filter(client, server):
+    now = _seed(server)
+    # vm1, vm10..vm19; "_" e "%" no prefixo são literais
+    page = client.get("/api/backups/search?vm_name=vm1&limit=5").get_json()
+    assert [b["vm_name"] for b in page["backups"]] == ["vm1", "vm10", "vm11", "vm12", "vm13"]
+    assert page["total"] == 11
+    rest = client.get(f"/api/backups/search?vm_name=vm1&limit=20&cursor={page['next_cursor']}").get_json()
+    assert [b["vm_name"] for b in rest["backups"]] == [f"vm{i}" for i in range(14, 20)]
+    assert rest["next_cursor"] is None
+
+    recent = client.get("/api/backups/search?vm_name=vm1&days=12").get_json()
+    assert [b["end_time"] for b in recent["backups"]] == [now - i * 86400 - 3600 for i in (1, 10, 11)]
+    assert client.get("/api/backups/search?vm_name=vm_").get_json()["total"] == 0
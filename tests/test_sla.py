@@ -0,0 +1,116 @@
+import configparser
+import time
+
+import pytest
+
+import sla_engine
+
+
+def _inventory(db, host, rows):
+    db.execute("INSERT OR REPLACE INTO inventory_hosts (proxmox_host, company_name) VALUES (?, 'ACME')",
+               (host,))
+    db.execute("DELETE FROM inventory WHERE proxmox_host = ?", (host,))
+    for vmid, node in rows:
+        db.execute("INSERT INTO inventory (proxmox_host, vmid, node) VALUES (?, ?, ?)",
+                   (host, vmid, node))
+
+
+def _open_subjects(db, rule):
+    return {r[0] for r in db.execute(
+        "SELECT subject FROM sla_violations WHERE rule = ? AND resolved_at IS NULL", (rule,))}
+
+
+def test_migrated_vm_does_not_violate_on_old_node(server):
+    db = server.get_db()
+    now = int(time.time())
+    c = db.cursor()
+    # VM 100 rodava no pve1 e foi migrada para o pve2; 101 continua no pve1 sem backup
+    sla_engine.record_backup(c, "pve1", "100", "ACME", "web", "SUCCESS", now - 10 * 86400)
+    sla_engine.record_backup(c, "pve2", "100", "ACME", "web", "SUCCESS", now - 3600)
+    sla_engine.record_backup(c, "pve1", "101", "ACME", "db", "SUCCESS", now - 10 * 86400)
+    for host in ("pve1", "pve2"):
+        _inventory(db, host, [("100", "pve2"), ("101", "pve1")])
+    db.commit()
+
+    config = configparser.ConfigParser()
+    config.read_dict({"sla:diario": {"type": "backup"}})
+    rule = sla_engine.Rule("diario", config["sla:diario"])
+    new, _ = sla_engine.evaluate(db, rule, now)
+    assert [v["subject"] for v in new] == ["pve1/101"]
+
+    # inventário antigo, sem nó: vale para o próprio host
+    _inventory(db, "pve1", [("100", None), ("101", None)])
+    sla_engine.evaluate(db, rule, now)
+    assert _open_subjects(db, "diario") == {"pve1/100", "pve1/101"}
+
+
+def test_readded_rule_is_scheduled_once(server, tmp_path):
+    cfg = tmp_path / "sla.ini"
+    with_rule = "[sla:diario]\ntype = backup\ncheck_every_minutes = 10\n"
+    runs = []
+    engine = sla_engine.SlaEngine(server.get_db, str(cfg))
+    engine._run_rule = lambda rule, now: runs.append(now)
+
+    def reload(text, now):
+        cfg.write_text(text)
+        engine._config_mtime = None  # mtime com resolução de segundo
+        return engine.tick(now)
+
+    t0 = 1_000_000
+    assert reload(with_rule, t0) == 1
+    reload("", t0 + 60)               # removida
+    reload(with_rule, t0 + 120)       # readicionada: roda já
+    assert runs == [t0, t0 + 120]
+
+    # a entrada da geração anterior (vencendo em t0 + 600) é descartada
+    assert engine.tick(t0 + 700) == 0
+    assert engine.tick(t0 + 720) == 1
+    assert runs == [t0, t0 + 120, t0 + 720]
+    assert [r["next_due"] for r in engine.describe()] == [t0 + 1320]
+
+
+@pytest.mark.parametrize("schedule, seconds", [
+    ("*/15", 15 * 60),
+    ("5", 3600),                        # só o minuto: toda hora
+    ("0/15", 15 * 60),
+    ("5/20", 20 * 60),
+    ("*:0/30", 30 * 60),
+    ("*/2:00", 2 * 3600),
+    ("8..17:00", 15 * 3600),            # 17h -> 8h do dia seguinte
+    ("2,14:30", 12 * 3600),
+    ("hourly", 3600),
+    ("daily", 86400),
+    ("22:30", 86400),
+    ("sat 04:00", 7 * 86400),
+    ("weekly", 7 * 86400),
+    ("mon..fri 22:30", 3 * 86400),      # sexta -> segunda
+    ("mon,wed,fri 02:00", 3 * 86400),
+    ("sat,sun", 6 * 86400),
+    ("fri..mon 01:00", 4 * 86400),      # faixa que passa do domingo
+    ("", None),
+    ("*-*-01 00:00", None),
+    ("toda hora", None),
+])
+def test_schedule_interval(schedule, seconds):
+    assert sla_engine.schedule_interval_seconds(schedule) == seconds
+
+
+def test_weekday_replication_is_not_late_on_weekend(server):
+    db = server.get_db()
+    c = db.cursor()
+    # última sincronização numa sexta; o limite usa só o maior intervalo do schedule
+    friday = 1_780_000_000
+    sla_engine.record_replication(c, "pve1", "ACME", "100", "web", "pve1", "pve2",
+                                  "SUCCESS", "mon..fri 22:30", friday, 0)
+    sla_engine.record_replication(c, "pve1", "ACME", "101", "db", "pve1", "pve2",
+                                  "SUCCESS", "*/15", friday, 0)
+    db.commit()
+
+    config = configparser.ConfigParser()
+    config.read_dict({"sla:repl": {"type": "replication", "schedule_factor": "1.5"}})
+    rule = sla_engine.Rule("repl", config["sla:repl"])
+    # dois dias depois: o job de dias úteis está no prazo (3 dias x 1.5)
+    new, _ = sla_engine.evaluate(db, rule, friday + 2 * 86400)
+    assert [v["subject"] for v in new] == ["pve1/101/pve1->pve2"]
+    new, _ = sla_engine.evaluate(db, rule, friday + 5 * 86400)
+    assert [v["subject"] for v in new] == ["pve1/100/pve1->pve2"]